@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+benchmark_detect.py - Scaling benchmark of load_data() and the six detectors
+
+For each size, generates (or reuses) a seeded data set with
+synthetic_telemetry.py, then loads it and runs every detector under a
+DetectorProfile in a fresh process, so memory peaks do not carry over from
+one size to the next. Records load throughput, per-detector time, throughput
+(input rows per second), tracemalloc and RSS peaks, and the recall of the
+embedded attack scenarios. With --compact the frames are loaded in compact
+storage (categorical string columns, bool flag columns); --backend runs the
+detectors' grouped aggregations on polars or duckdb (see detection_backends.py).
+
+Usage:
+    python benchmark_detect.py                                   # 10k, 100k and 1M rows
+    python benchmark_detect.py --sizes 10000 50000000 --workdir /data/bench --json bench.json
+    python benchmark_detect.py --compact                         # compact frames
+    python benchmark_detect.py --backend duckdb                  # DuckDB aggregations
+    python benchmark_detect.py --measure telemetry.csv           # one data set, in this process
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from detection_backends import BACKENDS
+from full_detect import load_data, peak_rss_bytes, DetectionEngine, DetectorProfile
+from synthetic_telemetry import DEFAULT_SEED, generate_telemetry, load_truth, scenario_recall, truth_path
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+DEFAULT_WORKDIR = 'benchmark_data'
+
+def dataset_path(workdir, rows, seed):
+    return os.path.join(workdir, f"telemetry_{rows}_{seed}.csv")
+
+def ensure_dataset(workdir, rows, seed=DEFAULT_SEED, now=None):
+    """Path of the data set of `rows` rows, generating it unless it already exists"""
+    path = dataset_path(workdir, rows, seed)
+    if not (os.path.exists(path) and os.path.exists(truth_path(path))):
+        os.makedirs(workdir, exist_ok=True)
+        print(f"Generating {rows:,} rows into {path}...", file=sys.stderr)
+        start = time.perf_counter()
+        generate_telemetry(path, rows, seed, now)
+        print(f"  generated in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return path
+
+def measure(csv_path, trace_memory=False, compact=False, backend='pandas'):
+    """Load one data set and run every detector on it; returns the measurements as a dict"""
+    truth = load_truth(csv_path)
+    
+    # Progress messages go to stderr, stdout carries the JSON result
+    with contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        df = load_data(csv_path, compact=compact)
+        load_seconds = time.perf_counter() - start
+        load_rss = peak_rss_bytes()
+        
+        profile = DetectorProfile(trace_memory=trace_memory)
+        engine = DetectionEngine(df, now=pd.Timestamp(truth['now']).to_pydatetime(), profile=profile,
+                                 backend=backend)
+        results = engine.run()
+    
+    recall = scenario_recall(results, truth)
+    detectors = []
+    for record in profile.records:
+        scores = recall.get(record['detector'], {})
+        detectors.append({
+            'detector': record['detector'],
+            'seconds': record['seconds'],
+            'rows_per_second': record['input_rows'] / record['seconds'] if record['seconds'] else None,
+            'output_rows': record['output_rows'],
+            'tracemalloc_peak_bytes': record['tracemalloc_peak_bytes'],
+            'rss_peak_bytes': record['rss_peak_bytes'],
+            'expected': scores.get('expected', 0),
+            'detected': scores.get('detected', 0),
+            'recall': scores.get('recall'),
+            'stages': record['stages']
+        })
+    
+    return {
+        'rows': len(df),
+        'seed': truth['seed'],
+        'compact': compact,
+        'backend': backend,
+        'frame_bytes': int(df.memory_usage(deep=True).sum()),
+        'load_seconds': load_seconds,
+        'load_rows_per_second': len(df) / load_seconds if load_seconds else None,
+        'load_rss_peak_bytes': load_rss,
+        'detect_seconds': sum(record['seconds'] for record in profile.records),
+        'rss_peak_bytes': peak_rss_bytes(),
+        'detectors': detectors
+    }
+
+def measure_in_subprocess(csv_path, trace_memory=False, compact=False, backend='pandas'):
+    """measure() in a fresh interpreter, so its RSS peak covers this data set only"""
+    command = [sys.executable, os.path.abspath(__file__), '--measure', csv_path]
+    if trace_memory:
+        command.append('--trace-memory')
+    if compact:
+        command.append('--compact')
+    command += ['--backend', backend]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output)
+
+def summary_table(runs):
+    """Text table with one line per (size, detector)"""
+    def megabytes(value):
+        return '-' if value is None else f"{value / 1048576:.0f}"
+    
+    lines = [f"{'rows':>12} {'stage':<16} {'seconds':>9} {'rows/s':>12} {'traced MB':>10} "
+             f"{'RSS MB':>8} {'recall':>8}"]
+    for run in runs:
+        lines.append(f"{run['rows']:>12,} {'load_data':<16} {run['load_seconds']:>9.2f} "
+                     f"{run['load_rows_per_second']:>12,.0f} {'-':>10} {megabytes(run['load_rss_peak_bytes']):>8} "
+                     f"{'-':>8}")
+        for detector in run['detectors']:
+            recall = '-' if detector['recall'] is None else f"{detector['detected']}/{detector['expected']}"
+            rate = '-' if detector['rows_per_second'] is None else f"{detector['rows_per_second']:,.0f}"
+            lines.append(f"{'':>12} {detector['detector']:<16} {detector['seconds']:>9.2f} {rate:>12} "
+                         f"{megabytes(detector['tracemalloc_peak_bytes']):>10} "
+                         f"{megabytes(detector['rss_peak_bytes']):>8} {recall:>8}")
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark of load_data() and the detectors")
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES, metavar='ROWS',
+                        help="data set sizes in rows (default: 10k, 100k and 1M)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="generator seed")
+    parser.add_argument('--now', help="reference time of generated data sets (default: today's midnight)")
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR,
+                        help=f"directory of the generated data sets, reused across runs (default: {DEFAULT_WORKDIR})")
+    parser.add_argument('--trace-memory', action='store_true', help="also record tracemalloc peaks (slower)")
+    parser.add_argument('--compact', action='store_true',
+                        help="load the frames with categorical string and bool flag columns")
+    parser.add_argument('--backend', choices=list(BACKENDS), default='pandas',
+                        help="backend of the detectors' grouped aggregations (default: pandas)")
+    parser.add_argument('--json', metavar='PATH', help="write the measurements as JSON")
+    parser.add_argument('--measure', metavar='CSV', help="measure one generated data set in this process, "
+                                                         "printing the JSON result")
+    args = parser.parse_args()
+    
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.trace_memory, args.compact, args.backend)))
+        return
+    
+    runs = []
+    for rows in args.sizes:
+        path = ensure_dataset(args.workdir, rows, args.seed, args.now)
+        print(f"Measuring {rows:,} rows...", file=sys.stderr)
+        runs.append(measure_in_subprocess(path, args.trace_memory, args.compact, args.backend))
+    
+    print(summary_table(runs))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(runs, f, indent=2)
+        print(f"Measurements written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+detection_backends.py - Grouped aggregation backends for the EDR detectors
+
+The detectors select and shape their rows with pandas and hand their grouped
+aggregations, the bulk of their work on large windows, to a backend:
+
+    pandas  - DataFrame.groupby (the default)
+    polars  - a lazy, multi-threaded Polars group_by (needs polars)
+    duckdb  - an embedded, multi-threaded DuckDB GROUP BY query (needs duckdb)
+
+Every backend implements
+
+    aggregate(events, keys, aggregations, sort=True, dropna=True)
+
+as events.groupby(keys, sort=sort, dropna=dropna, observed=True)
+.agg(**aggregations).reset_index(), for aggregations of the functions in
+AGGREGATIONS, and returns a pandas DataFrame with the same rows, row order
+and dtypes. The alerts built from the summaries are the same on every
+backend. Select one with DetectionEngine(df, backend='duckdb').
+
+Only this grouped aggregate() step is pluggable: the time windows, row
+filters, list explodes and the joins building the alerts stay in pandas on
+every backend, so their cost does not change with the backend.
+"""
+import numpy as np
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Aggregation functions every backend supports
+AGGREGATIONS = ('size', 'count', 'sum', 'mean', 'min', 'max', 'nunique', 'any')
+
+# Row position column of the backend input (first appearance of each group)
+ROW_COLUMN = '_row'
+
+def _quote(name):
+    """SQL identifier of a column name"""
+    return '"' + name.replace('"', '""') + '"'
+
+def _check_aggregations(aggregations):
+    for name, (column, func) in aggregations.items():
+        if func not in AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation {func!r} of {name!r}")
+
+class PandasBackend:
+    """Grouped aggregations with pandas (the reference semantics)"""
+    name = 'pandas'
+    
+    def aggregate(self, events, keys, aggregations, sort=True, dropna=True):
+        _check_aggregations(aggregations)
+        return events.groupby(keys, sort=sort, dropna=dropna, observed=True).agg(**aggregations).reset_index()
+
+class _ExternalBackend:
+    """
+    Shared input and output handling of the non-pandas backends: only the
+    key and aggregated columns are handed over, with a row position column
+    to order the groups by first appearance, and the result is brought back
+    to the row order and dtypes of the pandas result.
+    """
+    name = None
+    module = None
+    
+    def __init__(self):
+        if self.module is None:
+            raise ValueError(f"The {self.name} backend needs the {self.name} package; install it or use 'pandas'")
+    
+    def _input(self, events, keys, aggregations):
+        columns = list(dict.fromkeys(keys + [column for column, _ in aggregations.values()]))
+        frame = pd.DataFrame({column: events[column].array for column in columns})
+        frame[ROW_COLUMN] = np.arange(len(events))
+        return frame
+    
+    def _group(self, frame, keys, aggregations, dropna):
+        """Table of the keys, aggregations and first row position of every group"""
+        raise NotImplementedError
+    
+    def aggregate(self, events, keys, aggregations, sort=True, dropna=True):
+        _check_aggregations(aggregations)
+        reference = PandasBackend().aggregate(events.iloc[:0], keys, aggregations, sort, dropna)
+        if events.empty:
+            return reference
+        
+        table = self._group(self._input(events, keys, aggregations), keys, aggregations, dropna)
+        
+        # Groups in order of first appearance, then sorted by key as groupby(sort=True) does
+        table = table.sort_values(ROW_COLUMN, kind='stable').drop(columns=ROW_COLUMN)
+        for column in keys:
+            dtype = events[column].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                table[column] = pd.Categorical(table[column].astype(object), dtype=dtype)
+            elif dtype != object:
+                table[column] = table[column].astype(dtype)
+            else:
+                table[column] = table[column].astype(object).where(table[column].notna(), np.nan)
+        if sort:
+            table = table.sort_values(keys, kind='stable')
+        table = table.reset_index(drop=True)
+        
+        for column, dtype in reference.dtypes.items():
+            if column not in keys and table[column].dtype != dtype:
+                table[column] = table[column].astype(dtype)
+        return table[list(reference.columns)]
+
+class PolarsBackend(_ExternalBackend):
+    """Grouped aggregations with a lazy Polars query (multi-threaded)"""
+    name = 'polars'
+    module = pl
+    
+    @staticmethod
+    def _expression(column, func):
+        if func == 'size':
+            return pl.len()
+        values = pl.col(column)
+        if func == 'nunique':
+            return values.drop_nulls().n_unique()
+        return getattr(values, func)()
+    
+    def _group(self, frame, keys, aggregations, dropna):
+        query = pl.from_pandas(frame).lazy()
+        if dropna:
+            query = query.drop_nulls(keys)
+        expressions = [self._expression(column, func).alias(name)
+                       for name, (column, func) in aggregations.items()]
+        result = query.group_by(keys).agg(expressions + [pl.col(ROW_COLUMN).min()]).collect()
+        return result.to_pandas()
+
+class DuckDBBackend(_ExternalBackend):
+    """Grouped aggregations with an embedded DuckDB query (multi-threaded)"""
+    name = 'duckdb'
+    module = duckdb
+    
+    def __init__(self):
+        super().__init__()
+        self.connection = duckdb.connect()
+    
+    @staticmethod
+    def _expression(column, func, dtype):
+        column = _quote(column)
+        if func == 'size':
+            return 'count(*)'
+        if func == 'nunique':
+            return f'count(DISTINCT {column})'
+        if func == 'any':
+            return f'coalesce(bool_or({column}), false)'
+        if func == 'mean':
+            return f'avg({column})'
+        if func == 'sum':
+            if dtype == bool:
+                return f'count_if({column})'
+            total = f'coalesce(sum({column}), 0)'
+            return f'CAST({total} AS BIGINT)' if pd.api.types.is_integer_dtype(dtype) else total
+        return f'{func}({column})'
+    
+    def _group(self, frame, keys, aggregations, dropna):
+        columns = [f'{self._expression(column, func, frame[column].dtype if column else None)} AS {_quote(name)}'
+                   for name, (column, func) in aggregations.items()]
+        where = (' WHERE ' + ' AND '.join(f'{_quote(key)} IS NOT NULL' for key in keys)) if dropna else ''
+        query = (f'SELECT {", ".join(_quote(key) for key in keys)}, {", ".join(columns)}, '
+                 f'min({ROW_COLUMN}) AS {ROW_COLUMN} FROM events{where} '
+                 f'GROUP BY {", ".join(_quote(key) for key in keys)}')
+        self.connection.register('events', frame)
+        try:
+            return self.connection.execute(query).df()
+        finally:
+            self.connection.unregister('events')
+
+# Backends by name
+BACKENDS = {
+    'pandas': PandasBackend,
+    'polars': PolarsBackend,
+    'duckdb': DuckDBBackend,
+}
+
+def available_backends():
+    """Names of the backends whose packages are installed"""
+    return [name for name, backend in BACKENDS.items() if name == 'pandas' or backend.module is not None]
+
+def get_backend(backend=None):
+    """Backend instance of a name (pandas by default); backend instances are returned as they are"""
+    if backend is None:
+        return PandasBackend()
+    if not isinstance(backend, str):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[backend]()
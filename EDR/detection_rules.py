@@ -0,0 +1,917 @@
+"""
+detection_rules.py - Declarative detection rules compiled to vectorized plans
+
+A rule describes a detector as a pipeline of steps over the telemetry frame,
+followed by the alert it raises for every remaining row:
+
+    - name: beaconing
+      params: {lookback_days: 60, active_days_threshold: 10}
+      steps:
+        - window: lookback_days                     # rows of the last N days
+        - derive: {day: day(timestamp)}             # computed columns
+        - explode: {column: remote_ips, as: remote_ip}
+        - where: conn_count > 0 and outbound_bytes < 10000
+        - group:
+            by: [hostname, pid, name, day, remote_ip]
+            agg: {connection_count: size(), off_hours: sum(int(between(hour(timestamp), 1, 5)))}
+        - where: connection_count <= 3
+      alert:
+        fields: {severity: High, hostname: '{hostname}', timeline: '{connection_count} connections'}
+        sort: -connection_count
+        limit: 100
+
+Steps are window, where (one condition or a list of them, all required),
+derive, explode, group (by, agg, sort, dropna as in DataFrame.groupby), join
+(a left join of a sub-pipeline `steps` on the `by` columns) and sort.
+Expressions are Python-like strings: column names, rule params, `now`,
+literals, arithmetic, comparisons (with `in`), and/or/not, and the functions
+of ROW_FUNCTIONS, FRAME_FUNCTIONS and AGGREGATES. Aggregates may be nested in
+expressions of a group step (`days(max(last_ts) - min(first_ts))`), and take
+where=, and for first() order= and prefer= keywords; elsewhere they need by=
+and are computed per group without collapsing rows. Alert fields are text
+templates: '{expr}' alone keeps the value as is, any other text formats it.
+A rule may extend another one (`extends: beaconing`) and override its params.
+
+compile_rules() turns a rule set into one plan. The steps of all rules form
+a tree: rules starting with the same steps share their results (windows,
+filtered and exploded frames, group tables), conditions and sub-expressions
+are computed once per frame, only the columns the rules refer to are carried
+through, and shared results are dropped as soon as no remaining rule needs
+them. The six built-in detectors are expressed as rules in
+detection_rules.yaml and raise the same alerts as DetectionEngine.run().
+
+YAML rule files need PyYAML; JSON rule files do not.
+"""
+import ast
+import functools
+import json
+import operator
+import os
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from full_detect import (
+    ATTACK_CHAIN_FLAGS,
+    SENSITIVE_HOST_KEYWORDS,
+    DetectionEngine,
+    classify_recon_commands,
+    is_service_account,
+    initial_access_mask,
+    activity_types
+)
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# The six built-in detectors as rules
+BUILTIN_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'detection_rules.yaml')
+
+# --------------------------------------------------------------------------------------------
+# FUNCTIONS AVAILABLE TO RULE EXPRESSIONS
+# --------------------------------------------------------------------------------------------
+
+def _is_series(value):
+    return isinstance(value, pd.Series)
+
+def _contains(values, text, case=True):
+    values = values.astype(object)
+    if not case:
+        values, text = values.str.lower(), text.lower()
+    return values.str.contains(text, regex=False, na=False).astype(bool)
+
+def _nonempty(values):
+    return values.apply(lambda x: isinstance(x, list) and len(x) > 0).astype(bool)
+
+def _days(delta):
+    return delta.dt.days if _is_series(delta) else delta.days
+
+def _hours(delta):
+    return (delta.dt.total_seconds() if _is_series(delta) else delta.total_seconds()) / 3600
+
+def _date(timestamps):
+    return timestamps.dt.strftime('%Y-%m-%d') if _is_series(timestamps) else str(timestamps.date())
+
+def _where(condition, value, other):
+    if _is_series(value):
+        return value.where(condition, other)
+    return pd.Series(np.where(condition, value, other), index=getattr(condition, 'index', None))
+
+def _recon_category(cmdlines):
+    is_recon, categories = classify_recon_commands(cmdlines)
+    return pd.Series(np.where(is_recon, categories, None), index=cmdlines.index)
+
+def _sensitive_host(hostnames):
+    keywords = SENSITIVE_HOST_KEYWORDS
+    return hostnames.map(
+        lambda x: isinstance(x, str) and any(keyword in x.upper() for keyword in keywords)
+    ).astype(bool)
+
+def _attack_path(first_hosts, hosts, last_hosts, max_middle=3):
+    """initial → middle systems (at most `max_middle`) → final host of each row"""
+    def path(first, systems, last):
+        middle = [host for host in systems if isinstance(host, str) and host != first and host != last]
+        if middle:
+            return f"{first} → {' → '.join(middle[:max_middle])} → {last}"
+        return f"{first} → {last}"
+    return pd.Series([path(*row) for row in zip(first_hosts, hosts, last_hosts)],
+                     index=first_hosts.index, dtype=object)
+
+# Vectorized functions of columns and values: name -> (function, allowed keywords)
+ROW_FUNCTIONS = {
+    'contains': (_contains, {'case'}),
+    'nonempty': (_nonempty, set()),
+    'notna': (lambda values: values.notna(), set()),
+    'isna': (lambda values: values.isna(), set()),
+    'between': (lambda values, low, high: values.between(low, high), set()),
+    'int': (lambda values: values.astype(int) if _is_series(values) else int(values), set()),
+    'round': (lambda values, digits=0: values.round(digits), set()),
+    'where': (_where, set()),
+    'hour': (lambda timestamps: timestamps.dt.hour, set()),
+    'dayofweek': (lambda timestamps: timestamps.dt.dayofweek, set()),
+    'day': (lambda timestamps: timestamps.dt.normalize(), set()),
+    'date': (_date, set()),
+    'days': (_days, set()),
+    'hours': (_hours, set()),
+    'recon_category': (_recon_category, set()),
+    'service_account': (is_service_account, set()),
+    'sensitive_host': (_sensitive_host, set()),
+    'attack_path': (_attack_path, set()),
+}
+
+# Functions of the detection engine (reference time): name -> function(engine, *args)
+ENGINE_FUNCTIONS = {
+    'days_ago': lambda engine, days: engine.lookback_start(days),
+}
+
+# Functions of the whole frame: name -> (function, columns it reads)
+FRAME_FUNCTIONS = {
+    'row_number': (lambda rows: pd.Series(np.arange(len(rows)), index=rows.index), []),
+    'initial_access': (initial_access_mask, ATTACK_CHAIN_FLAGS + ['name', 'cmdline']),
+    'activity_type': (activity_types, ['credential_access', 'registry_persistence_access',
+                                       'script_execution', 'conn_count']),
+}
+
+# Aggregates of a group step (or, with by=, per group without collapsing rows)
+AGGREGATES = {'size', 'count', 'sum', 'mean', 'min', 'max', 'nunique', 'any', 'all',
+              'first', 'unique', 'join', 'join_set'}
+
+# Aggregates computed per group by a Python function of the group's values
+_LIST_AGGREGATES = {
+    'unique': lambda values: list(pd.unique(pd.Series(values, dtype=object).dropna())),
+    'join': lambda values, sep: sep.join(pd.unique(pd.Series(values, dtype=object))),
+    'join_set': lambda values, sep: sep.join(set(pd.unique(pd.Series(values, dtype=object)))),
+}
+
+# --------------------------------------------------------------------------------------------
+# EXPRESSION COMPILER
+# --------------------------------------------------------------------------------------------
+
+class _Scope:
+    """A frame being evaluated, with the values of the sub-expressions computed on it"""
+    def __init__(self, frame, engine, memo=None):
+        self.frame = frame
+        self.engine = engine
+        self.memo = {} if memo is None else memo
+
+class _Node:
+    """
+    A compiled expression. Nodes with equal keys compute the same value, so
+    each is evaluated once per frame.
+    """
+    def __init__(self, key, func, children=(), columns=(), memoize=True):
+        self.key = key
+        self.func = func
+        self.children = list(children)
+        self.columns = set(columns).union(*(child.columns for child in self.children))
+        self.memoize = memoize
+    
+    def evaluate(self, scope):
+        if not self.memoize:
+            return self.func(scope, *[child.evaluate(scope) for child in self.children])
+        if self.key not in scope.memo:
+            scope.memo[self.key] = self.func(scope, *[child.evaluate(scope) for child in self.children])
+        return scope.memo[self.key]
+
+class _Aggregate:
+    """An aggregate call: function, argument, and its where/order/prefer/sep options"""
+    def __init__(self, func, arg, where=None, order=(), prefer=None, sep=', '):
+        self.func = func
+        self.arg = arg
+        self.where = where
+        self.order = list(order)
+        self.prefer = prefer
+        self.sep = sep
+        parts = [child.key for child in (arg, where, prefer) if child is not None]
+        parts += [('-' if descending else '') + col for col, descending in self.order]
+        self.key = f"{func}({';'.join(parts)};{sep!r})"
+        self.columns = set(col for col, _ in self.order).union(
+            *(child.columns for child in (arg, where, prefer) if child is not None)
+        )
+
+def _logical_not(value):
+    return ~value if isinstance(value, (pd.Series, np.ndarray)) else not value
+
+def _isin(value, values):
+    return value.isin(values) if _is_series(value) else value in values
+
+_BINARY_OPERATORS = {
+    ast.Add: ('+', operator.add), ast.Sub: ('-', operator.sub), ast.Mult: ('*', operator.mul),
+    ast.Div: ('/', operator.truediv), ast.FloorDiv: ('//', operator.floordiv), ast.Mod: ('%', operator.mod)
+}
+_COMPARISONS = {
+    ast.Eq: ('==', operator.eq), ast.NotEq: ('!=', operator.ne), ast.Lt: ('<', operator.lt),
+    ast.LtE: ('<=', operator.le), ast.Gt: ('>', operator.gt), ast.GtE: ('>=', operator.ge),
+    ast.In: ('in', _isin), ast.NotIn: ('not in', lambda value, values: _logical_not(_isin(value, values)))
+}
+
+class _ExpressionCompiler:
+    """
+    Compile rule expressions of one rule (its params substituted). Inside a
+    group step, `aggregates` collects the aggregate calls, which compile to
+    columns of the grouped table.
+    """
+    def __init__(self, rule_name, params, aggregates=None):
+        self.rule_name = rule_name
+        self.params = params
+        self.aggregates = aggregates
+    
+    def error(self, message):
+        return ValueError(f"Rule {self.rule_name}: {message}")
+    
+    def compile(self, text):
+        if isinstance(text, (int, float)):
+            return self.constant(text)
+        try:
+            tree = ast.parse(str(text).strip(), mode='eval')
+        except SyntaxError as e:
+            raise self.error(f"invalid expression {text!r}: {e.msg}")
+        return self.node(tree.body)
+    
+    def constant(self, value):
+        return _Node(f"const:{value!r}", lambda scope: value, memoize=False)
+    
+    def literal(self, node):
+        """Value of a literal or param (lists of them included)"""
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name) and node.id in self.params:
+            return self.params[node.id]
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return [self.literal(item) for item in node.elts]
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -self.literal(node.operand)
+        raise self.error(f"expected a literal value, got {ast.unparse(node)!r}")
+    
+    def column_names(self, node, signed=False):
+        """Column names of a by= or order= list (a '-' prefix sorts descending)"""
+        items = node.elts if isinstance(node, (ast.List, ast.Tuple)) else [node]
+        names = []
+        for item in items:
+            descending = isinstance(item, ast.UnaryOp) and isinstance(item.op, ast.USub)
+            if descending and signed:
+                item = item.operand
+            if not isinstance(item, ast.Name) or (descending and not signed):
+                raise self.error(f"expected column names, got {ast.unparse(node)!r}")
+            names.append((item.id, descending) if signed else item.id)
+        return names
+    
+    def node(self, node):
+        if isinstance(node, ast.Constant) or isinstance(node, (ast.List, ast.Tuple)):
+            return self.constant(self.literal(node))
+        
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name in self.params:
+                return self.constant(self.params[name])
+            if name == 'now':
+                return _Node('now', lambda scope: scope.engine.now, memoize=False)
+            return _Node(f"col:{name}", lambda scope: scope.frame[name], columns=[name], memoize=False)
+        
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            symbol, func = _BINARY_OPERATORS[type(node.op)]
+            left, right = self.node(node.left), self.node(node.right)
+            return _Node(f"({left.key}{symbol}{right.key})", lambda scope, a, b: func(a, b), [left, right])
+        
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+            operand = self.node(node.operand)
+            if isinstance(node.op, ast.Not):
+                return _Node(f"not({operand.key})", lambda scope, a: _logical_not(a), [operand])
+            return _Node(f"-({operand.key})", lambda scope, a: -a, [operand])
+        
+        if isinstance(node, ast.BoolOp):
+            operands = [self.node(value) for value in node.values]
+            symbol, func = ('and', operator.and_) if isinstance(node.op, ast.And) else ('or', operator.or_)
+            def combine(scope, *values):
+                result = values[0]
+                for value in values[1:]:
+                    result = func(result, value)
+                return result
+            return _Node(f"{symbol}({','.join(operand.key for operand in operands)})", combine, operands)
+        
+        if isinstance(node, ast.Compare):
+            comparisons = []
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                if type(op) not in _COMPARISONS:
+                    raise self.error(f"unsupported comparison in {ast.unparse(node)!r}")
+                symbol, func = _COMPARISONS[type(op)]
+                a, b = self.node(left), self.node(right)
+                comparisons.append(_Node(f"({a.key} {symbol} {b.key})",
+                                         lambda scope, x, y, func=func: func(x, y), [a, b]))
+                left = right
+            if len(comparisons) == 1:
+                return comparisons[0]
+            return _Node(f"and({','.join(c.key for c in comparisons)})",
+                         lambda scope, *values: functools.reduce(operator.and_, values), comparisons)
+        
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            return self.call(node)
+        
+        raise self.error(f"unsupported expression {ast.unparse(node)!r}")
+    
+    def call(self, node):
+        name = node.func.id
+        keywords = {keyword.arg: keyword.value for keyword in node.keywords}
+        
+        if name in AGGREGATES:
+            return self.aggregate(name, node.args, keywords)
+        
+        if name in ENGINE_FUNCTIONS:
+            func = ENGINE_FUNCTIONS[name]
+            args = [self.literal(arg) for arg in node.args]
+            return _Node(f"{name}({args!r})", lambda scope: func(scope.engine, *args), memoize=False)
+        
+        if name in FRAME_FUNCTIONS:
+            func, columns = FRAME_FUNCTIONS[name]
+            if node.args or keywords:
+                raise self.error(f"{name}() takes no arguments")
+            return _Node(f"{name}()", lambda scope: func(scope.frame), columns=columns)
+        
+        if name not in ROW_FUNCTIONS:
+            raise self.error(f"unknown function {name}()")
+        func, allowed = ROW_FUNCTIONS[name]
+        unknown = set(keywords) - allowed
+        if unknown:
+            raise self.error(f"unknown keyword {sorted(unknown)[0]!r} of {name}()")
+        args = [self.node(arg) for arg in node.args]
+        options = {keyword: self.literal(value) for keyword, value in keywords.items()}
+        key = f"{name}({','.join(arg.key for arg in args)};{sorted(options.items())!r})"
+        return _Node(key, lambda scope, *values: func(*values, **options), args)
+    
+    def aggregate(self, name, args, keywords):
+        allowed = {'where', 'by'} | ({'order', 'prefer'} if name == 'first' else set())
+        unknown = set(keywords) - allowed - ({'sep'} if name in ('join', 'join_set') else set())
+        if unknown:
+            raise self.error(f"unknown keyword {sorted(unknown)[0]!r} of {name}()")
+        
+        if name == 'size':
+            if args:
+                raise self.error("size() takes no arguments")
+            arg = None
+        elif len(args) == 1 or (name in ('join', 'join_set') and len(args) == 2):
+            arg = self.node(args[0])
+        else:
+            raise self.error(f"{name}() takes one column or expression")
+        sep = self.literal(args[1]) if len(args) == 2 else self.literal(keywords.get('sep', ast.Constant(', ')))
+        
+        aggregate = _Aggregate(
+            name, arg,
+            where=self.node(keywords['where']) if 'where' in keywords else None,
+            order=self.column_names(keywords['order'], signed=True) if 'order' in keywords else (),
+            prefer=self.node(keywords['prefer']) if 'prefer' in keywords else None,
+            sep=sep
+        )
+        
+        if 'by' in keywords:
+            by = self.column_names(keywords['by'])
+            key = f"{aggregate.key} by {','.join(by)}"
+            return _Node(key, lambda scope: _aggregate_per_row(scope, aggregate, by),
+                         columns=aggregate.columns | set(by))
+        if self.aggregates is None:
+            raise self.error(f"{name}() outside a group step needs by=")
+        
+        # A column of the grouped table, one per distinct aggregate of the step
+        keys = [existing.key for existing in self.aggregates]
+        if aggregate.key not in keys:
+            self.aggregates.append(aggregate)
+        column = f"_agg{[existing.key for existing in self.aggregates].index(aggregate.key)}"
+        return _Node(f"agg:{aggregate.key}", lambda scope: scope.frame[column], memoize=False)
+
+# --------------------------------------------------------------------------------------------
+# AGGREGATION
+# --------------------------------------------------------------------------------------------
+
+_MASKED = object()
+
+def _as_mask(value, length):
+    """Boolean array of a condition value (missing values are False)"""
+    if isinstance(value, pd.Series):
+        if value.dtype != bool:
+            value = value.fillna(False)
+        return value.to_numpy(dtype=bool)
+    if np.ndim(value) == 0:
+        return np.full(length, bool(value))
+    return np.asarray(value, dtype=bool)
+
+def _as_values(value, frame):
+    """A column of a frame, or a scalar broadcast to one"""
+    if isinstance(value, pd.Series):
+        return value
+    if isinstance(value, np.ndarray):
+        return pd.Series(value, index=frame.index)
+    return pd.Series([value] * len(frame), index=frame.index, dtype=object if isinstance(value, str) else None)
+
+def _first_ranks(scope, aggregate):
+    """
+    Per-row ranks for first(): rows sorted by the rows outside where= last,
+    then the preferred rows first, then the order= columns, then position;
+    the row of minimum rank in a group is its first row. Returns the ranks,
+    the sorted positions and the excluded (outside where=) rows among them.
+    """
+    frame = scope.frame
+    sort_columns = {}
+    ascending = []
+    if aggregate.where is not None:
+        sort_columns['_excluded'] = ~_as_mask(aggregate.where.evaluate(scope), len(frame))
+        ascending.append(True)
+    if aggregate.prefer is not None:
+        sort_columns['_not_preferred'] = ~_as_mask(aggregate.prefer.evaluate(scope), len(frame))
+        ascending.append(True)
+    for i, (col, descending) in enumerate(aggregate.order):
+        sort_columns[f'_order{i}'] = frame[col].to_numpy()
+        ascending.append(not descending)
+    sort_columns['_position'] = np.arange(len(frame))
+    ascending.append(True)
+    
+    order = pd.DataFrame(sort_columns).sort_values(list(sort_columns), ascending=ascending, kind='stable')
+    sorted_positions = order['_position'].to_numpy()
+    ranks = np.empty(len(frame), dtype=np.int64)
+    ranks[sorted_positions] = np.arange(len(frame))
+    excluded = sort_columns['_excluded'][sorted_positions] if aggregate.where is not None else None
+    return ranks, sorted_positions, excluded
+
+def _aggregate_input(scope, aggregate):
+    """Per-row input of a size/count/sum/mean/min/max/nunique/any/all aggregate, where= applied"""
+    frame = scope.frame
+    mask = _as_mask(aggregate.where.evaluate(scope), len(frame)) if aggregate.where is not None else None
+    if aggregate.func == 'size':
+        # Counted as a sum of the rows inside where=
+        return np.ones(len(frame), dtype=np.int64) if mask is None else mask.astype(np.int64)
+    
+    values = _as_values(aggregate.arg.evaluate(scope), frame)
+    if mask is not None:
+        values = values.where(mask, 0) if aggregate.func == 'sum' else values.where(mask)
+        if aggregate.func in ('any', 'all'):
+            values = values.fillna(aggregate.func == 'all').astype(bool)
+    return values.array
+
+def _group_table(scope, by, aggregates, sort=True, dropna=True):
+    """
+    Group the scope's frame by the `by` columns and compute the aggregates,
+    as columns _agg0, _agg1, ... next to the keys
+    """
+    frame = scope.frame
+    inputs = {key: frame[key].array for key in by}
+    named = {}
+    firsts = {}
+    rankings = {}
+    for i, aggregate in enumerate(aggregates):
+        column, name = f'_agg{i}', f'_in{i}'
+        func = aggregate.func
+        
+        if func == 'first':
+            # Aggregates ranking rows the same way share one sort
+            ranking = (getattr(aggregate.where, 'key', None), getattr(aggregate.prefer, 'key', None),
+                       tuple(aggregate.order))
+            if ranking not in rankings:
+                rankings[ranking] = _first_ranks(scope, aggregate)
+            ranks, sorted_positions, excluded = rankings[ranking]
+            inputs[name] = ranks
+            values = _as_values(aggregate.arg.evaluate(scope), frame)
+            firsts[column] = (values, sorted_positions, excluded)
+            named[column] = (name, 'min')
+        elif func in _LIST_AGGREGATES:
+            values = _as_values(aggregate.arg.evaluate(scope), frame)
+            if aggregate.where is not None:
+                values = values.astype(object).where(_as_mask(aggregate.where.evaluate(scope), len(frame)), _MASKED)
+            inputs[name] = values.array
+            
+            def aggregate_list(values, func=func, sep=aggregate.sep):
+                values = [value for value in values if value is not _MASKED]
+                return _LIST_AGGREGATES[func](values) if func == 'unique' else _LIST_AGGREGATES[func](values, sep)
+            named[column] = (name, aggregate_list)
+        else:
+            inputs[name] = _aggregate_input(scope, aggregate)
+            named[column] = (name, 'sum' if func == 'size' else func)
+    
+    events = pd.DataFrame(inputs)
+    table = events.groupby(by, sort=sort, dropna=dropna, observed=True).agg(**named).reset_index()
+    table = table[by + [f'_agg{i}' for i in range(len(aggregates))]]
+    
+    # first(): the value of the row with the lowest rank of each group
+    for column, (values, sorted_positions, excluded) in firsts.items():
+        best = table[column].to_numpy()
+        picked = values.iloc[sorted_positions[best]].reset_index(drop=True)
+        if excluded is not None:
+            picked = picked.where(~excluded[best])
+        table[column] = picked
+    return table
+
+def _aggregate_per_row(scope, aggregate, by):
+    """An aggregate computed per group of the `by` columns, as a value of each row"""
+    frame = scope.frame
+    if aggregate.func in _LIST_AGGREGATES or aggregate.func == 'first':
+        raise ValueError(f"{aggregate.func}() with by= is not supported")
+    events = pd.DataFrame({key: frame[key].array for key in by})
+    events['_in'] = _aggregate_input(scope, aggregate)
+    func = 'sum' if aggregate.func == 'size' else aggregate.func
+    values = events.groupby(by, sort=False, dropna=False, observed=True)['_in'].transform(func)
+    return pd.Series(values.to_numpy(), index=frame.index)
+
+# --------------------------------------------------------------------------------------------
+# RULES AND PLANS
+# --------------------------------------------------------------------------------------------
+
+def load_rules(path):
+    """Rules of a YAML or JSON rule file (a list of rules, or a mapping with a 'rules' list)"""
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError(f"Reading {path} needs PyYAML; install it or use a JSON rule file")
+            document = yaml.safe_load(f)
+        else:
+            document = json.load(f)
+    rules = document.get('rules', []) if isinstance(document, dict) else document
+    if not isinstance(rules, list):
+        raise ValueError(f"{path}: expected a list of rules")
+    return rules
+
+def builtin_rules():
+    """The six built-in detectors as rules"""
+    return load_rules(BUILTIN_RULES_FILE)
+
+def _resolve_extends(rules, base_rules):
+    """Rules with `extends` replaced by the base rule, with the params merged"""
+    by_name = {rule['name']: rule for rule in base_rules if 'name' in rule}
+    resolved = []
+    for rule in rules:
+        seen = set()
+        while 'extends' in rule:
+            base = by_name.get(rule['extends'])
+            if base is None or rule['extends'] in seen:
+                raise ValueError(f"Rule {rule.get('name')}: cannot extend {rule['extends']!r}")
+            seen.add(rule['extends'])
+            merged = {key: value for key, value in base.items() if key != 'name'}
+            merged.update({key: value for key, value in rule.items() if key not in ('extends', 'params')})
+            merged['params'] = {**base.get('params', {}), **rule.get('params', {})}
+            rule = merged
+        resolved.append(rule)
+        by_name.setdefault(rule.get('name'), rule)
+    return resolved
+
+class _Step:
+    """A compiled step: its key (equal keys give equal results), kind and options"""
+    def __init__(self, kind, key, **options):
+        self.kind = kind
+        self.key = key
+        self.options = options
+
+class _CompiledRule:
+    def __init__(self, name, steps, fields, sort, limit):
+        self.name = name
+        self.steps = steps
+        self.fields = fields
+        self.sort = sort
+        self.limit = limit
+
+def _template(compiler, text):
+    """
+    Compile an alert field: '{expr}' alone is the expression's value, other
+    text is formatted with the {expr} placeholders it holds
+    """
+    if not isinstance(text, str):
+        return compiler.constant(text)
+    parts = []
+    position = 0
+    while True:
+        start = text.find('{', position)
+        if start < 0:
+            break
+        depth, end = 0, start
+        for end in range(start, len(text)):
+            depth += {'{': 1, '}': -1}.get(text[end], 0)
+            if depth == 0:
+                break
+        if depth:
+            raise compiler.error(f"unbalanced braces in {text!r}")
+        if start > position:
+            parts.append(text[position:start])
+        parts.append(compiler.compile(text[start + 1:end]))
+        position = end + 1
+    if position < len(text):
+        parts.append(text[position:])
+    
+    if len(parts) == 1 and isinstance(parts[0], _Node):
+        return parts[0]
+    nodes = [part for part in parts if isinstance(part, _Node)]
+    
+    def format_text(scope, *values):
+        values = iter(values)
+        result = ''
+        for part in parts:
+            if isinstance(part, str):
+                result = result + part
+            else:
+                value = next(values)
+                result = result + (value.astype(str) if _is_series(value) else str(value))
+        return result
+    return _Node(f"text:{text}", format_text, nodes)
+
+class RulePlan:
+    """
+    A compiled rule set. The steps of all rules form a tree keyed by each
+    rule's leading steps, so rules share the results of the steps they have
+    in common.
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.names = [rule.name for rule in rules]
+        
+        # Columns any rule reads; frames carry only these
+        self.columns = set()
+        for rule in rules:
+            for step in _walk_steps(rule.steps):
+                self.columns |= step.options.get('columns', set())
+            for node in rule.fields.values():
+                self.columns |= node.columns
+        
+        # Number of rules using each shared result (a prefix of their steps)
+        self.uses = {}
+        for rule in rules:
+            for prefix in set(_prefixes(rule.steps)):
+                self.uses[prefix] = self.uses.get(prefix, 0) + 1
+
+def _walk_steps(steps):
+    for step in steps:
+        yield step
+        if step.kind == 'join':
+            yield from _walk_steps(step.options['steps'])
+
+def _prefixes(steps):
+    """Keys of each leading run of the steps (sub-pipelines of joins included)"""
+    for i, step in enumerate(steps):
+        yield tuple(s.key for s in steps[:i + 1])
+        if step.kind == 'join':
+            yield from _prefixes(step.options['steps'])
+
+def _compile_steps(compiler, specs, rule_name, top_level=True):
+    if not isinstance(specs, list) or not specs:
+        raise ValueError(f"Rule {rule_name}: steps must be a non-empty list")
+    steps = []
+    for i, spec in enumerate(specs):
+        if not isinstance(spec, dict) or len(spec) != 1:
+            raise ValueError(f"Rule {rule_name}: each step is a mapping with one key, got {spec!r}")
+        (kind, body), = spec.items()
+        
+        if kind == 'window':
+            if i:
+                raise ValueError(f"Rule {rule_name}: window must be the first step")
+            days = compiler.compile(body)
+            if days.columns:
+                raise ValueError(f"Rule {rule_name}: window days must be a number or param")
+            days = days.evaluate(_Scope(None, None))
+            steps.append(_Step('window', f"window:{days}", days=days))
+        
+        elif kind == 'where':
+            conditions = [compiler.compile(text) for text in (body if isinstance(body, list) else [body])]
+            columns = set().union(*(condition.columns for condition in conditions))
+            steps.append(_Step('where', f"where:{sorted(c.key for c in conditions)}",
+                               conditions=conditions, columns=columns))
+        
+        elif kind == 'derive':
+            if not isinstance(body, dict):
+                raise ValueError(f"Rule {rule_name}: derive maps column names to expressions")
+            derived = {name: compiler.compile(text) for name, text in body.items()}
+            columns = set().union(*(node.columns for node in derived.values()))
+            steps.append(_Step('derive', f"derive:{[(name, node.key) for name, node in derived.items()]}",
+                               derived=derived, columns=columns))
+        
+        elif kind == 'explode':
+            column, alias = (body, body) if isinstance(body, str) else (body['column'], body.get('as', body['column']))
+            steps.append(_Step('explode', f"explode:{column}->{alias}", column=column, alias=alias,
+                               columns={column}))
+        
+        elif kind == 'group':
+            by = body.get('by') or []
+            by = [by] if isinstance(by, str) else list(by)
+            if not by or not isinstance(body.get('agg'), dict):
+                raise ValueError(f"Rule {rule_name}: group needs by columns and an agg mapping")
+            aggregates = []
+            group_compiler = _ExpressionCompiler(rule_name, compiler.params, aggregates)
+            entries = {name: group_compiler.compile(text) for name, text in body['agg'].items()}
+            sort, dropna = bool(body.get('sort', True)), bool(body.get('dropna', True))
+            columns = set(by).union(*(aggregate.columns for aggregate in aggregates))
+            key = (f"group:{by}:{sort}:{dropna}:{[aggregate.key for aggregate in aggregates]}:"
+                   f"{[(name, node.key) for name, node in entries.items()]}")
+            steps.append(_Step('group', key, by=by, aggregates=aggregates, entries=entries,
+                               sort=sort, dropna=dropna, columns=columns))
+        
+        elif kind == 'join':
+            on = body.get('by') or []
+            on = [on] if isinstance(on, str) else list(on)
+            sub_steps = _compile_steps(compiler, body.get('steps'), rule_name, top_level=False)
+            steps.append(_Step('join', f"join:{on}:{[step.key for step in sub_steps]}", on=on,
+                               steps=sub_steps, columns=set(on)))
+        
+        elif kind == 'sort':
+            order = compiler.column_names(ast.parse(str(body), mode='eval').body, signed=True)
+            steps.append(_Step('sort', f"sort:{order}", order=order, columns={col for col, _ in order}))
+        
+        else:
+            raise ValueError(f"Rule {rule_name}: unknown step {kind!r}")
+    return steps
+
+def compile_rules(rules, base_rules=None):
+    """
+    Compile rule dicts (as read by load_rules()) into a RulePlan. Rules can
+    extend each other and the `base_rules` (the built-in rules by default).
+    """
+    if base_rules is None:
+        base_rules = builtin_rules()
+    rules = _resolve_extends(rules, base_rules)
+    
+    compiled = []
+    names = set()
+    for rule in rules:
+        name = rule.get('name')
+        if not name or name in names:
+            raise ValueError(f"Rule names must be unique and non-empty, got {name!r}")
+        names.add(name)
+        params = rule.get('params') or {}
+        compiler = _ExpressionCompiler(name, params)
+        steps = _compile_steps(compiler, rule.get('steps'), name)
+        
+        alert = rule.get('alert') or {}
+        if not isinstance(alert.get('fields'), dict) or not alert['fields']:
+            raise ValueError(f"Rule {name}: alert needs a fields mapping")
+        fields = {field: _template(compiler, text) for field, text in alert['fields'].items()}
+        sort = compiler.column_names(ast.parse(str(alert['sort']), mode='eval').body, signed=True) \
+            if alert.get('sort') else []
+        compiled.append(_CompiledRule(name, steps, fields, sort, alert.get('limit')))
+    return RulePlan(compiled)
+
+# --------------------------------------------------------------------------------------------
+# EXECUTION
+# --------------------------------------------------------------------------------------------
+
+class RuleDetectionEngine:
+    """
+    Run a compiled rule set (the built-in rules by default) over one loaded
+    frame in one pass: results of steps several rules start with are computed
+    once. run() returns a dict of rule name -> alert DataFrame, like
+    DetectionEngine.run(); for the built-in rules the alerts are the same.
+    """
+    def __init__(self, df, now=None, rules=None, profile=None):
+        self.df = df
+        self.profile = profile
+        self.plan = rules if isinstance(rules, RulePlan) else compile_rules(
+            builtin_rules() if rules is None else rules
+        )
+        
+        # One scan of the columns any rule reads; windows are taken from it
+        projected = df[[col for col in df.columns if col in self.plan.columns]]
+        self.engine = DetectionEngine(projected, now=now, profile=profile)
+        self.now = self.engine.now
+        self.stats = {'steps_run': 0, 'steps_reused': 0}
+        self._frames = {}
+        self._memos = {}
+        self._uses = {}
+    
+    def _source(self, days):
+        """Rows of the lookback window (all rows without one), with the columns rules read"""
+        return self.engine.df if days is None else self.engine.window(days)
+    
+    def _run_step(self, step, frame, memo):
+        """Result of one step over `frame` (whose sub-expression values are in `memo`)"""
+        scope = _Scope(frame, self.engine, memo)
+        if step.kind == 'where':
+            mask = np.ones(len(frame), dtype=bool)
+            for condition in step.options['conditions']:
+                mask &= _as_mask(condition.evaluate(scope), len(frame))
+            return frame[mask], None
+        
+        if step.kind == 'derive':
+            # Same rows, so the values computed so far still hold unless a column is replaced
+            derived = frame.copy(deep=False)
+            memo = {} if set(step.options['derived']) & set(frame.columns) else dict(memo)
+            for name, node in step.options['derived'].items():
+                derived[name] = _as_values(node.evaluate(_Scope(derived, self.engine, memo)), derived)
+            return derived, memo
+        
+        if step.kind == 'explode':
+            column, alias = step.options['column'], step.options['alias']
+            exploded = frame[_nonempty(frame[column]).to_numpy()].explode(column)
+            return exploded.rename(columns={column: alias}) if alias != column else exploded, None
+        
+        if step.kind == 'group':
+            table = _group_table(scope, step.options['by'], step.options['aggregates'],
+                                 step.options['sort'], step.options['dropna'])
+            table_scope = _Scope(table, self.engine)
+            result = table[step.options['by']].copy()
+            for name, node in step.options['entries'].items():
+                result[name] = _as_values(node.evaluate(table_scope), table)
+            return result, None
+        
+        if step.kind == 'join':
+            right = self._run_steps(step.options['steps'])
+            if right is None:
+                right = pd.DataFrame(columns=step.options['on'])
+            return frame.merge(right, on=step.options['on'], how='left'), None
+        
+        if step.kind == 'sort':
+            order = step.options['order']
+            return frame.sort_values([col for col, _ in order], ascending=[not desc for _, desc in order],
+                                     kind='stable'), None
+        raise ValueError(f"Unknown step {step.kind!r}")
+    
+    def _run_steps(self, steps):
+        """Final frame of a pipeline, reusing shared results (None once a step leaves no rows)"""
+        frame = memo = None
+        for i, step in enumerate(steps):
+            prefix = tuple(s.key for s in steps[:i + 1])
+            if prefix in self._frames:
+                self.stats['steps_reused'] += 1
+                frame, memo = self._frames[prefix], self._memos[prefix]
+            else:
+                self.stats['steps_run'] += 1
+                if i == 0:
+                    source = self._source(step.options['days'] if step.kind == 'window' else None)
+                    frame, memo = (source, {}) if step.kind == 'window' else self._run_step(step, source, {})
+                else:
+                    frame, memo = self._run_step(step, frame, memo)
+                memo = {} if memo is None else memo
+                self._frames[prefix], self._memos[prefix] = frame, memo
+            self.engine.stage(step.kind, frame)
+            if frame.empty:
+                return None
+        return frame
+    
+    def _release(self, rule):
+        """Drop the shared results no remaining rule needs"""
+        for prefix in set(_prefixes(rule.steps)):
+            self._uses[prefix] -= 1
+            if self._uses[prefix] == 0:
+                self._frames.pop(prefix, None)
+                self._memos.pop(prefix, None)
+    
+    def _alerts(self, rule, rows):
+        if rows is None:
+            return pd.DataFrame()
+        rows = rows.reset_index(drop=True)
+        scope = _Scope(rows, self.engine)
+        columns = {}
+        for field, node in rule.fields.items():
+            value = node.evaluate(scope)
+            if _is_series(value) and isinstance(value.dtype, pd.CategoricalDtype):
+                value = value.astype(object)
+            columns[field] = value
+        alerts = pd.DataFrame(columns, index=rows.index)
+        if rule.sort:
+            alerts = alerts.sort_values([col for col, _ in rule.sort],
+                                        ascending=[not desc for _, desc in rule.sort])
+        return alerts.head(rule.limit) if rule.limit is not None else alerts
+    
+    def _run_rule(self, df, rule):
+        return self._alerts(rule, self._run_steps(rule.steps))
+    
+    def run(self, names=None):
+        """
+        Run the rules (all of them unless `names` is given).
+        Returns a dict of rule name -> alert DataFrame.
+        """
+        names = list(names or self.plan.names)
+        rules = [rule for rule in self.plan.rules if rule.name in names]
+        rules.sort(key=lambda rule: names.index(rule.name))
+        self._uses = {}
+        for rule in rules:
+            for prefix in set(_prefixes(rule.steps)):
+                self._uses[prefix] = self._uses.get(prefix, 0) + 1
+        
+        results = {}
+        for rule in rules:
+            try:
+                if self.profile is not None:
+                    results[rule.name] = self.profile.run(rule.name, self._run_rule, self.df, rule=rule)
+                else:
+                    results[rule.name] = self._run_rule(self.df, rule)
+            except Exception as e:
+                print(f"Error in {rule.name}: {str(e)}")
+                traceback.print_exc()
+                results[rule.name] = pd.DataFrame()
+            finally:
+                self._release(rule)
+        return results
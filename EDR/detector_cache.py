@@ -0,0 +1,208 @@
+"""
+detector_cache.py - On-disk cache of detector results
+
+Re-running the detectors over unchanged telemetry, or with one threshold
+changed, recomputes every detector from scratch. DetectorResultCache
+memoizes the alerts of the built-in detectors under a key made of
+
+    the detector and its parameters, defaults included (lookback_days,
+    consistency_threshold, min_hosts, ...)
+    a content fingerprint of its input slice: the rows of its lookback
+    window, in order, over the columns it reads (DETECTOR_COLUMNS)
+    where the reference time splits that window further (the baseline and
+    recent periods of the service-account detector)
+
+Nothing else a detector computes depends on the reference time, so a re-run
+over the same window reads the alerts back, with the detection_time of the
+new run. Row hashes are built once per column and engine (hash_rows()), so
+fingerprinting all six detectors costs about one pass over their columns.
+
+Entries are pickles in one directory, evicted least recently used first
+once together they exceed max_bytes. Detectors reading rollups are not
+cached, as their input is not the frame alone. Use it with
+DetectionEngine(df, result_cache=DetectorResultCache(directory)).
+
+Usage:
+    python test_full_detect.py --result-cache DIRECTORY
+"""
+import hashlib
+import json
+import os
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from full_detect import (
+    HASH_MULTIPLIER,
+    DetectionEngine,
+    detect_long_dwell_time,
+    detect_beaconing,
+    detect_weekend_exfiltration,
+    detect_distributed_reconnaissance,
+    detect_service_account_anomaly,
+    detect_cross_system_attack_chain
+)
+from parallel_detect import detector_parameters
+from partitioned_detect import DETECTOR_COLUMNS
+
+# Bump when a change to the detectors changes their alerts, to ignore older entries
+CACHE_VERSION = 1
+
+# Total size of the cached results before the least recently used are evicted
+DEFAULT_MAX_BYTES = 256 << 20
+
+# Suffix of the cache entries
+ENTRY_SUFFIX = '.pkl'
+
+# Name and lookback windows (in days, from the parameters) of each cached detector:
+# the first window is the detector's input, the others split it at the reference time
+CACHED_DETECTORS = {
+    detect_long_dwell_time: ('long_dwell', lambda p: [p['lookback_days']]),
+    detect_beaconing: ('beaconing', lambda p: [p['lookback_days']]),
+    detect_weekend_exfiltration: ('weekend_exfil', lambda p: [p['lookback_days']]),
+    detect_distributed_reconnaissance: ('recon', lambda p: [p['lookback_days']]),
+    detect_service_account_anomaly: ('service_account',
+                                     lambda p: [p['baseline_days'] + p['recent_days'], p['recent_days']]),
+    detect_cross_system_attack_chain: ('attack_chain', lambda p: [p['lookback_days']]),
+}
+
+def window_fingerprint(engine, columns, windows):
+    """
+    Content fingerprint of the rows of a lookback window (the first of
+    `windows`, in days) over `columns`, and of where the other windows start
+    """
+    timestamps = engine.df['timestamp']
+    in_window = (timestamps >= engine.lookback_start(windows[0])).to_numpy()
+    window_timestamps = timestamps[in_window]
+    
+    # The rows of the window are fixed, so the number before a split says where it falls
+    splits = [int((window_timestamps <= engine.lookback_start(days)).sum()) for days in windows[1:]]
+    present = [column for column in columns if column in engine.df.columns]
+    
+    # One combined hash per row, over the columns in order
+    row_hashes = np.zeros(len(engine.df), dtype=np.uint64)
+    for column in present:
+        row_hashes = row_hashes * HASH_MULTIPLIER + engine.row_hashes(column)
+    
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps({'rows': int(in_window.sum()), 'splits': splits, 'columns': present}).encode('utf-8'))
+    digest.update(row_hashes[in_window].tobytes())
+    engine.stage('fingerprint', window_timestamps)
+    return digest.hexdigest()
+
+class DetectorResultCache:
+    """Detector alerts stored on disk by input fingerprint and parameters, with LRU eviction"""
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    def key(self, detector, engine, params):
+        """Cache key of a detector call"""
+        name, windows = CACHED_DETECTORS[detector]
+        arguments = detector_parameters(detector, params)
+        fingerprint = window_fingerprint(engine, DETECTOR_COLUMNS[name], windows(arguments))
+        raw = json.dumps({'version': CACHE_VERSION, 'detector': name, 'params': arguments,
+                          'input': fingerprint}, sort_keys=True, default=str)
+        return f"{name}.{hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]}"
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+    
+    def get(self, key):
+        """Cached alerts of a key (None if absent), marked as the most recently used"""
+        path = self._path(key)
+        try:
+            alerts = pd.read_pickle(path)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Torn or unreadable entries are dropped and recomputed
+            print(f"Discarding unreadable cache entry {path}: {str(e)}")
+            self._remove(path)
+            return None
+        return alerts
+    
+    def put(self, key, alerts):
+        """Store the alerts of a key, then evict down to max_bytes"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        alerts.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        self.evict()
+    
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def entries(self):
+        """(path, size, last use) of the cache entries, least recently used first"""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime_ns))
+        return sorted(entries, key=lambda entry: entry[2])
+    
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                self.stats['evictions'] += 1
+            total -= size
+    
+    def clear(self):
+        """Remove every entry; returns the number removed"""
+        return sum(self._remove(path) for path, _, _ in self.entries())
+    
+    def detector_for(self, detector):
+        """Cached version of a detector function (None if it is not cacheable)"""
+        if detector not in CACHED_DETECTORS:
+            return None
+        
+        def detect(df, engine=None, **params):
+            return self.detect(detector, df, engine, **params)
+        return detect
+    
+    def detect(self, detector, df, engine, **params):
+        """Alerts of a detector, read back from the cache when its input and parameters are unchanged"""
+        if engine is None:
+            engine = DetectionEngine(df, now=params.pop('now', None))
+        name = CACHED_DETECTORS[detector][0]
+        try:
+            key = self.key(detector, engine, params)
+            alerts = self.get(key)
+        except Exception as e:
+            print(f"Error in {name} result cache: {str(e)}")
+            traceback.print_exc()
+            return detector(df, engine=engine, **params)
+        
+        if alerts is not None:
+            self.stats['hits'] += 1
+            if 'detection_time' in alerts.columns:
+                alerts.loc[:, 'detection_time'] = engine.now
+            return alerts
+        
+        self.stats['misses'] += 1
+        alerts = detector(df, engine=engine, **params)
+        try:
+            self.put(key, alerts)
+        except Exception as e:
+            print(f"Error in {name} result cache: {str(e)}")
+        return alerts
@@ -2,78 +2,450 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
+import re
+import sys
+import time
 import traceback
+import tracemalloc
+from functools import cached_property, lru_cache
+from itertools import chain
 
-# Function to load and preprocess the data
-def load_data(file_path):
+from detection_backends import get_backend
+from telemetry_store import TelemetryStore
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Default number of CSV rows parsed per chunk by the streaming loader
+DEFAULT_CHUNKSIZE = 100000
+
+# Columns holding JSON-array encoded lists in the agent CSV export
+LIST_COLUMNS = ['remote_ips', 'dns_queries', 'outbound_bytes', 'inbound_bytes',
+                'registry_writes', 'child_processes', 'loaded_modules']
+
+# Columns that are coerced to numbers (non-numeric values become 0)
+NUMERIC_COLUMNS = ['pid', 'ppid', 'rwx_segments_count', 'anonymous_mem_size',
+                   'conn_count', 'remote_mem_operations']
+
+# 0/1 flag columns, stored as bool in compact mode
+FLAG_COLUMNS = ['exe_signature_valid', 'exe_mismatch', 'is_service', 'token_manipulation',
+                'credential_access', 'registry_persistence_access', 'script_execution',
+                'obfuscated_script']
+
+# Compact mode stores string columns with at most this share of distinct values as categoricals
+COMPACT_MAX_UNIQUE_RATIO = 0.5
+
+# Number of cells decoded per json.loads call by the batch list parser
+JSON_ARRAY_BLOCK_SIZE = 4096
+
+# Command-line substrings (case-insensitive) marking reconnaissance activity
+RECON_COMMANDS = [
+    # Windows commands
+    'net view', 'net use', 'net group', 'net user', 'nslookup', 'ping ', 'ipconfig',
+    'systeminfo', 'whoami', 'get-acl', 'get-aduser', 'get-adgroup', 'quser',
+    # Linux/Mac commands
+    'ifconfig', 'ip a', 'netstat', 'who', 'w ', 'last', 'lsof'
+]
+
+# Reconnaissance command categories, checked in order (the first matching category wins)
+RECON_COMMAND_CATEGORIES = [
+    ('network_discovery', ['net view', 'net use', 'nslookup', 'ping ']),
+    ('permission_enum', ['get-acl', 'icacls', 'cacls']),
+    ('account_enum', ['net group', 'net user', 'get-adgroup', 'get-aduser']),
+]
+
+# Number of distinct command lines whose matches each MultiPatternMatcher remembers
+MATCH_CACHE_SIZE = 65536
+
+# Sequence number standing for "no such row" in per-file/per-host summaries
+NO_SEQUENCE = np.iinfo(np.int64).max
+
+def safe_json_load(x):
     """
-    Load and preprocess the attack_file.csv data
+    Safely convert one '[...]' string to a list. Returns None when the value
+    cannot be parsed, even after swapping single quotes for double quotes.
     """
-    # Load data
-    print(f"Loading data from {file_path}...")
-    df = pd.read_csv(file_path)
+    try:
+        return json.loads(x)
+    except json.JSONDecodeError:
+        # If JSON parsing fails, try to fix common issues
+        try:
+            # Replace single quotes with double quotes
+            return json.loads(x.replace("'", '"'))
+        except ValueError:
+            return None
+
+def _object_array(items, count):
+    """Build a 1-D object array without numpy unpacking nested lists"""
+    return np.fromiter(items, dtype=object, count=count)
+
+def _is_flat_array_text(text):
+    """True when a '[...]' string has no brackets other than its enclosing pair"""
+    return text[-1] == ']' and text.count('[') == 1 and text.count(']') == 1
+
+def _decode_array_block(texts, retries=2):
+    """
+    Decode a block of flat '[...]' strings with as few json.loads calls as
+    possible. Returns the decoded lists (None for malformed cells).
+    
+    Joining flat arrays with commas yields one top-level value per cell unless
+    a string runs across a cell boundary, which can only lose values, so a
+    matching value count proves every cell was decoded on its own.
+    """
+    if not texts:
+        return []
+    
+    try:
+        values = json.loads('[' + ','.join(texts) + ']')
+        if len(values) == len(texts):
+            return values
+        bad = None
+    except json.JSONDecodeError as e:
+        # Locate the cell containing the error from its offset in the joined text
+        starts = np.cumsum([1] + [len(text) + 1 for text in texts[:-1]])
+        bad = int(np.searchsorted(starts, e.pos, side='right')) - 1
+    
+    if bad is None or retries == 0:
+        # Misaligned or too many bad cells, decode the cells one by one
+        return [safe_json_load(text) for text in texts]
+    
+    return (_decode_array_block(texts[:bad], retries - 1) +
+            [safe_json_load(texts[bad])] +
+            _decode_array_block(texts[bad + 1:], retries - 1))
+
+def _decode_text_block(texts, min_split=16):
+    """
+    Decode a block of '[...]' strings (None for malformed cells). A block that
+    looks like flat arrays only is decoded at once; any other block is halved
+    until its parts do, so one nested or malformed cell costs a few more
+    joins instead of a check of every cell, and blocks of at most `min_split`
+    cells are sorted out cell by cell.
+    """
+    joined = ','.join(texts)
+    if "'" in joined:
+        # Single quotes can only be valid after the usual quote swap
+        texts = [text.replace("'", '"') if "'" in text and '"' not in text else text for text in texts]
+        joined = ','.join(texts)
+    
+    n = len(texts)
+    if (joined[-1] == ']' and joined.count('[') == n and joined.count(']') == n and
+            joined.count('],[') == n - 1):
+        return _decode_array_block(texts)
+    
+    if n <= min_split:
+        # Nested or unusual arrays are decoded on their own
+        flat = [_is_flat_array_text(text) for text in texts]
+        flat_values = iter(_decode_array_block([text for text, ok in zip(texts, flat) if ok]))
+        return [next(flat_values) if ok else safe_json_load(text) for text, ok in zip(texts, flat)]
+    
+    middle = n // 2
+    return _decode_text_block(texts[:middle], min_split) + _decode_text_block(texts[middle:], min_split)
+
+class JsonArrayColumn:
+    """
+    A column of JSON-array strings decoded into an Arrow-style list layout.
+    
+    The items of row i are values[offsets[i]:offsets[i + 1]] when is_list[i]
+    is set. Rows that were not '[...]' strings keep their original value in
+    `rows` and have no items; malformed arrays count towards `malformed` and
+    decode to empty lists. Empty lists are shared between rows, so treat the
+    decoded lists as read-only.
+    """
+    def __init__(self, rows, is_list, malformed):
+        self.rows = rows
+        self.is_list = is_list
+        self.malformed = malformed
+    
+    @cached_property
+    def offsets(self):
+        """Start offset of each row's items in `values`, plus the end offset"""
+        lengths = np.zeros(len(self.rows), dtype=np.int64)
+        lists = self.rows[self.is_list]
+        lengths[self.is_list] = np.fromiter(map(len, lists), dtype=np.int64, count=len(lists))
+        return np.concatenate(([0], np.cumsum(lengths)))
+    
+    @cached_property
+    def values(self):
+        """All list items of the column, flattened in row order"""
+        return _object_array(chain.from_iterable(self.rows[self.is_list]), int(self.offsets[-1]))
+    
+    def to_series(self, index=None, non_list=None):
+        """
+        Per-row objects as a Series: lists for decoded rows and the original
+        value otherwise (or `non_list` when given, e.g. [] to force lists).
+        """
+        rows = self.rows
+        if non_list is not None:
+            rows = rows.copy()
+            rows[~self.is_list] = _object_array([non_list], 1)
+        return pd.Series(rows, index=index, dtype=object)
+    
+    def sums(self):
+        """
+        Per-row sum of the list items: 0 for empty lists, NaN for non-list rows
+        """
+        totals = np.full(len(self.rows), np.nan)
+        lengths = np.diff(self.offsets)
+        try:
+            values = self.values.astype('float64')
+        except (TypeError, ValueError):
+            # Non-numeric items, fall back to Python's sum for each list
+            totals[self.is_list] = [sum(items) for items in self.rows[self.is_list]]
+            return totals
+        
+        non_empty = lengths > 0
+        if non_empty.any():
+            totals[non_empty] = np.add.reduceat(values, self.offsets[:-1][non_empty])
+        totals[self.is_list & ~non_empty] = 0
+        return totals
+
+def parse_json_array_column(column, block_size=JSON_ARRAY_BLOCK_SIZE, missing_as_empty=False):
+    """
+    Decode a whole column of JSON-array strings at once.
+    
+    Strings starting with '[' are decoded into lists, joining up to
+    `block_size` cells per json.loads call; anything else is passed through
+    untouched, missing values too unless `missing_as_empty` makes them empty
+    lists. Values that still fail after swapping single quotes for double
+    quotes are counted as malformed and become empty lists.
+    """
+    rows = np.array(column, dtype=object)
+    
+    # Empty arrays are by far the most common value, skip the decoder for them
+    # and let them share a single list
+    is_list = rows == '[]'
+    if missing_as_empty:
+        is_list |= pd.isna(rows)
+    rows[is_list] = _object_array([[]], 1)
     
-    # Remove header/comment rows (rows where hostname starts with '#' or '--')
-    df = df[~df['hostname'].astype(str).str.startswith(('#', '--'))]
+    # Vectorized first-character check, confirmed as real strings afterwards
+    rest = np.flatnonzero(~is_list)
+    arrays = rest[rows[rest].astype('U1') == '[']
+    if pd.api.types.infer_dtype(rows[arrays], skipna=False) != 'string':
+        arrays = arrays[np.fromiter((isinstance(x, str) for x in rows[arrays]), dtype=bool, count=len(arrays))]
+    texts = rows[arrays].tolist()
+    
+    decoded = []
+    for start in range(0, len(texts), block_size):
+        decoded.extend(_decode_text_block(texts[start:start + block_size]))
+    
+    decoded = _object_array(decoded, len(decoded))
+    bad = np.fromiter((items is None for items in decoded), dtype=bool, count=len(decoded))
+    decoded[bad] = _object_array([[]], 1)
+    rows[arrays] = decoded
+    is_list[arrays] = True
+    
+    return JsonArrayColumn(rows, is_list, int(bad.sum()))
+
+def preprocess_data(df):
+    """
+    Normalize a raw frame read from the agent CSV export
+    """
+    # Remove header/comment rows (rows where hostname starts with '#' or '--'); the
+    # result is a frame of its own (a shallow copy), not a slice of the caller's frame
+    df = df[~df['hostname'].astype(str).str.startswith(('#', '--'))].copy(deep=False)
     
     # Handle timestamp conversion
     df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
     
     # Convert string representations of arrays to actual lists where needed
-    for col in ['remote_ips', 'dns_queries', 'outbound_bytes', 'inbound_bytes', 
-               'registry_writes', 'child_processes', 'loaded_modules']:
+    parsed = {}
+    for col in LIST_COLUMNS:
         if col in df.columns:
-            # Replace missing values with empty lists
-            df[col] = df[col].fillna('[]')
-            
-            # Safely convert string representation to actual lists
-            def safe_json_load(x):
-                if not isinstance(x, str):
-                    return x
-                if not x.startswith('['):
-                    return x
-                try:
-                    return json.loads(x)
-                except json.JSONDecodeError:
-                    # If JSON parsing fails, try to fix common issues
-                    try:
-                        # Fix missing commas or quotes
-                        cleaned_x = x.replace("'", '"')  # Replace single quotes with double quotes
-                        return json.loads(cleaned_x)
-                    except:
-                        # If still fails, return as is
-                        print(f"Warning: Could not parse value: {x}")
-                        return []  # Return empty list for safety
-            
-            # Apply the safe conversion function
-            df[col] = df[col].apply(safe_json_load)
+            # Decode the whole column, missing values become empty lists
+            parsed[col] = parse_json_array_column(df[col], missing_as_empty=True)
+            if parsed[col].malformed:
+                print(f"Warning: Could not parse {parsed[col].malformed} values in column {col}")
+            df[col] = parsed[col].to_series(df.index)
     
     # Convert numeric columns
-    numeric_cols = ['pid', 'ppid', 'rwx_segments_count', 'anonymous_mem_size',
-                    'conn_count', 'remote_mem_operations']
-    
-    for col in numeric_cols:
+    for col in NUMERIC_COLUMNS:
         if col in df.columns:
             # Convert to numeric, replacing non-numeric values with 0
             df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
     
     # Special handling for outbound_bytes since it might be treated as both array and numeric
     if 'outbound_bytes' in df.columns:
-        # Convert to numeric only if not already a list
-        df['outbound_bytes'] = df['outbound_bytes'].apply(
-            lambda x: pd.to_numeric(x, errors='coerce') if not isinstance(x, list) else sum(x) if isinstance(x, list) else 0
-        ).fillna(0)
+        # Sum the lists, convert everything else to numeric
+        outbound = parsed['outbound_bytes']
+        totals = outbound.sums()
+        non_list = ~outbound.is_list
+        numbers = pd.to_numeric(pd.Series(outbound.rows[non_list], dtype=object), errors='coerce')
+        totals[non_list] = numbers
+        totals = pd.Series(totals, index=df.index).fillna(0)
+        
+        # Integer byte counts stay integers, as converting value by value would give
+        if (len(totals) and (numbers.empty or pd.api.types.is_integer_dtype(numbers)) and
+                pd.api.types.infer_dtype(outbound.values, skipna=False) in ('integer', 'empty')):
+            totals = totals.astype('int64')
+        df['outbound_bytes'] = totals
     
     # Ensure array fields are properly handled
     list_cols = ['remote_ips', 'dns_queries']
     for col in list_cols:
         if col in df.columns:
             # Ensure column contains lists
-            df[col] = df[col].apply(lambda x: x if isinstance(x, list) else [])
+            df[col] = parsed[col].to_series(df.index, non_list=[])
+    
+    return df
+
+def _flag_column(values):
+    """
+    A column of 0/1 flags (numbers, bools or '0'/'1' strings, NaN for unset)
+    as bool, or None if it holds anything else
+    """
+    if pd.api.types.is_bool_dtype(values):
+        return values
+    try:
+        uniques = values.dropna().unique()
+    except TypeError:
+        # Unhashable cells (lists)
+        return None
+    if not all(isinstance(x, (str, int, float, np.number, np.bool_)) and x in (0, 1, '0', '1') for x in uniques):
+        return None
+    return values.isin([1, '1'])
+
+def _shared_lists(values):
+    """A column of lists with equal (flat) lists sharing one list object"""
+    shared = {}
+    cells = []
+    for x in values.array:
+        if isinstance(x, list) and x:
+            try:
+                x = shared.setdefault(tuple(x), x)
+            except TypeError:
+                # Nested lists
+                pass
+        cells.append(x)
+    return pd.Series(_object_array(cells, len(cells)), index=values.index, name=values.name)
+
+def compact_frame(df, max_unique_ratio=COMPACT_MAX_UNIQUE_RATIO):
+    """
+    Store a normalized frame compactly: string columns with repeated values
+    (hostname, user, name, exe_path, ...) as categoricals, whose groupbys run
+    on integer codes, 0/1 flag columns as bool, and equal lists of the list
+    columns as one shared list. Values compare, sort and group as before;
+    flag columns holding anything but 0/1 values are left unchanged.
+    """
+    df = df.copy(deep=False)
+    for col in df.columns:
+        values = df[col]
+        if col in FLAG_COLUMNS:
+            flags = _flag_column(values)
+            if flags is not None:
+                df[col] = flags
+        elif col in LIST_COLUMNS:
+            if values.dtype == object:
+                df[col] = _shared_lists(values)
+        elif values.dtype == object:
+            if (pd.api.types.infer_dtype(values, skipna=True) == 'string' and
+                    values.nunique() <= max_unique_ratio * len(values)):
+                df[col] = values.astype('category')
+    return df
+
+# Function to load and preprocess the data
+def load_data(file_path, compact=False):
+    """
+    Load and preprocess the attack_file.csv data. With `compact`, string and
+    flag columns are stored compactly (see compact_frame()).
+    """
+    # Load data
+    print(f"Loading data from {file_path}...")
+    df = pd.read_csv(file_path)
+    
+    df = preprocess_data(df)
+    if compact:
+        df = compact_frame(df)
     
     print(f"Data loaded and processed successfully. Shape: {df.shape}")
     return df
 
+def infer_csv_dtypes(file_path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Scan the CSV in chunks and work out the column types a whole-file
+    pd.read_csv would infer, without holding the file in memory.
+    Returns a dict of column -> 'int64', 'float64', 'bool' or 'object'
+    ('bool' columns may still hold NaN, in which case they load as object).
+    """
+    stats = {}
+    
+    for chunk in pd.read_csv(file_path, chunksize=chunksize, dtype=str):
+        for col in chunk.columns:
+            col_stats = stats.setdefault(col, {'values': 0, 'has_na': False, 'numeric': True,
+                                               'integer': True, 'boolean': True})
+            values = chunk[col].dropna()
+            col_stats['values'] += len(values)
+            col_stats['has_na'] = col_stats['has_na'] or len(values) < len(chunk)
+            
+            if values.empty:
+                continue
+            
+            if col_stats['boolean']:
+                col_stats['boolean'] = values.str.lower().isin(['true', 'false']).all()
+            
+            if col_stats['numeric']:
+                numbers = pd.to_numeric(values, errors='coerce')
+                col_stats['numeric'] = numbers.notna().all()
+                if col_stats['numeric'] and col_stats['integer']:
+                    col_stats['integer'] = pd.api.types.is_integer_dtype(numbers)
+    
+    dtypes = {}
+    for col, col_stats in stats.items():
+        if col_stats['values'] == 0:
+            # Empty columns are read as all-NaN floats
+            dtypes[col] = 'float64'
+        elif col_stats['boolean']:
+            dtypes[col] = 'bool'
+        elif col_stats['numeric']:
+            dtypes[col] = 'int64' if col_stats['integer'] and not col_stats['has_na'] else 'float64'
+        else:
+            dtypes[col] = 'object'
+    return dtypes
+
+def _apply_csv_dtypes(chunk, dtypes):
+    """
+    Convert a chunk read as strings to the column types in `dtypes`
+    """
+    for col, dtype in dtypes.items():
+        if col not in chunk.columns or dtype == 'object':
+            continue
+        if dtype == 'bool':
+            # Boolean-like values become Python bools, like read_csv does
+            chunk[col] = chunk[col].map(lambda x: x.lower() == 'true' if isinstance(x, str) else x)
+            if chunk[col].notna().all():
+                chunk[col] = chunk[col].astype(bool)
+        else:
+            chunk[col] = pd.to_numeric(chunk[col]).astype(dtype)
+    return chunk
+
+def load_data_chunked(file_path, chunksize=DEFAULT_CHUNKSIZE, dtypes=None):
+    """
+    Stream and preprocess the attack_file.csv data in bounded-size chunks.
+    Yields normalized frames of at most `chunksize` rows, so peak memory depends
+    on the chunk size rather than the file size. Concatenating the chunks gives
+    the same frame as load_data().
+    
+    Column types are fixed up front so every chunk is typed consistently; pass
+    `dtypes` (as returned by infer_csv_dtypes) to skip the extra scan.
+    """
+    if dtypes is None:
+        dtypes = infer_csv_dtypes(file_path, chunksize)
+    
+    print(f"Streaming data from {file_path} in chunks of {chunksize} rows...")
+    total_rows = 0
+    
+    for chunk in pd.read_csv(file_path, chunksize=chunksize, dtype=str):
+        chunk = _apply_csv_dtypes(chunk, dtypes)
+        chunk = preprocess_data(chunk)
+        
+        total_rows += len(chunk)
+        if not chunk.empty:
+            yield chunk
+    
+    print(f"Data streamed and processed successfully. Rows: {total_rows}, columns: {len(dtypes)}")
+
 # Safe explode function for remote_ips that handles non-list values
 def safe_explode(df, column):
     # Create a copy to avoid modifying the original
@@ -94,327 +466,427 @@ def safe_explode(df, column):
     else:
         return df
 
+def _trie_regex(words):
+    """
+    Regex source matching any of `words`, with common prefixes factored out so
+    the engine walks one trie instead of trying every word. Optional suffixes
+    are greedy, so the longest word starting at a position is matched.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+    
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+    
+    return build(trie)
+
+class MultiPatternMatcher:
+    """
+    Case-insensitive substring matcher for many literal patterns at once.
+    
+    All patterns are compiled into a single regex that is tried at every
+    position of the text, so each text is scanned once whatever the number of
+    patterns. match() returns the ids (positions in `patterns`) of every
+    pattern found anywhere in the text, including patterns that are prefixes
+    of a longer match at the same position (e.g. 'net use' in 'net user').
+    With `whole_words`, a pattern only matches where it neither starts nor
+    ends inside a word, so such a prefix only counts when it ends a word
+    ('net use' no longer matches 'net user'; 'who' matches 'who -a' but not
+    'whoami' or 'nowhere'; 'w ' matches 'w -h' but not 'show '). Results are
+    cached per distinct text.
+    """
+    def __init__(self, patterns, cache_size=MATCH_CACHE_SIZE, whole_words=False):
+        self.patterns = tuple(patterns)
+        self.whole_words = whole_words
+        
+        ids = {}
+        for i, pattern in enumerate(self.patterns):
+            ids.setdefault(pattern.lower(), []).append(i)
+        
+        def ends_word(word, k):
+            # A prefix of a whole-word match ends a word where its last or the next character is not a word character
+            return not whole_words or k == len(word) or not (word[k - 1].isalnum() or word[k - 1] == '_') \
+                or not (word[k].isalnum() or word[k] == '_')
+        
+        # Every pattern id found when the longest match at a position is `word`
+        self._ids = {
+            word: frozenset(chain.from_iterable(ids.get(word[:k], ())
+                                                for k in range(1, len(word) + 1) if ends_word(word, k)))
+            for word in ids
+        }
+        if whole_words:
+            # Start outside a word; end outside a word or on a non-word character
+            self._regex = re.compile(rf'(?<!\w)(?=((?:{_trie_regex(ids)})(?:(?<=\W)|(?!\w))))', re.DOTALL)
+        else:
+            self._regex = re.compile(f'(?=({_trie_regex(ids)}))', re.DOTALL)
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+    
+    def _match(self, text):
+        found = set()
+        for m in self._regex.finditer(text.lower()):
+            found |= self._ids[m.group(1)]
+        return frozenset(found)
+    
+    def ids_of(self, patterns):
+        """Ids of the given patterns (which must be part of the matcher)"""
+        wanted = {pattern.lower() for pattern in patterns}
+        return frozenset(i for i, pattern in enumerate(self.patterns) if pattern.lower() in wanted)
+    
+    def match_values(self, values):
+        """
+        Match a column of texts, scanning each distinct value once.
+        Returns (codes, matches): matches[codes[i]] holds the pattern ids found in
+        row i; missing values get code -1.
+        """
+        codes, uniques = pd.factorize(values)
+        matches = [self.match(value if isinstance(value, str) else str(value)) for value in uniques]
+        return codes, matches
+
+@lru_cache(maxsize=32)
+def compile_matcher(patterns, whole_words=False):
+    """Build (once per tuple of patterns) a MultiPatternMatcher"""
+    return MultiPatternMatcher(patterns, whole_words=whole_words)
+
 # --------------------------------------------------------------------------------------------
 # SCENARIO 1: ADVANCED PERSISTENT THREAT (APT) USING LONG-DWELL DELAYED EXECUTION
 # --------------------------------------------------------------------------------------------
 
-def detect_long_dwell_time(df, days_threshold=30, lookback_days=90):
+def summarize_dwell_files(rows, seq=None, by_day=False, backend=None):
+    """
+    Per-(hostname, exe_path) summary of file creation (pid=0) and process
+    execution (pid>0) events, in order of first appearance.
+    
+    `seq` numbers the rows in stream order (their position by default). The
+    first_seq and exec_seq columns identify the first row and the first
+    execution of each file, and pid/name are those of the first execution, so
+    summaries of separate batches can be merged. With `by_day` the summary is
+    also split by calendar day. `backend` runs the grouping (pandas by default).
+    """
+    seq = np.arange(len(rows)) if seq is None else np.asarray(seq)
+    positions = np.arange(len(rows))
+    
+    # Per-row contributions of file creation (pid=0) and process execution (pid>0) events
+    pid = rows['pid']
+    is_creation = (pid == 0).to_numpy()
+    is_execution = (pid > 0).to_numpy()
+    timestamps = rows['timestamp']
+    
+    # svchost-like names among executions (non-string names never match)
+    names = rows['name'].astype(object)
+    is_svchost = names.str.lower().str.contains('svchost', regex=False, na=False).to_numpy(dtype=bool)
+    
+    events = pd.DataFrame({
+        'hostname': rows['hostname'].to_numpy(),
+        'exe_path': rows['exe_path'].to_numpy(),
+        'first_seen': timestamps.where(is_creation).to_numpy(),
+        'first_active': timestamps.where(is_execution).to_numpy(),
+        'is_suspicious_name': is_svchost & is_execution,
+        'first_row': positions,
+        'first_execution': np.where(is_execution, positions, len(rows))
+    })
+    keys = ['hostname', 'exe_path']
+    if by_day:
+        events['day'] = timestamps.dt.normalize().to_numpy()
+        keys.append('day')
+    
+    # Group by hostname, exe_path to find files created vs execution, in one pass
+    # (groups in order of first appearance, like the unique (hostname, exe_path) pairs)
+    files = get_backend(backend).aggregate(events, keys, {
+        'first_seen': ('first_seen', 'min'),
+        'first_active': ('first_active', 'min'),
+        'is_suspicious_name': ('is_suspicious_name', 'any'),
+        'first_row': ('first_row', 'min'),
+        'first_execution': ('first_execution', 'min')
+    }, sort=False)
+    
+    # Process details from first execution (from the first row for files never executed)
+    executed = files['first_execution'].to_numpy() < len(rows)
+    source = np.where(executed, files['first_execution'], files['first_row'])
+    files['first_seq'] = seq[files['first_row'].to_numpy()]
+    files['exec_seq'] = np.where(executed, seq[source], NO_SEQUENCE)
+    files['pid'] = rows['pid'].to_numpy()[source]
+    files['name'] = rows['name'].to_numpy()[source]
+    return files.drop(columns=['first_row', 'first_execution'])
+
+def dwell_time_alerts(files, now, days_threshold=30):
+    """Long-dwell alerts from a (merged) summarize_dwell_files() table"""
+    # Files in order of first appearance
+    files = files.sort_values('first_seq', kind='stable')
+    
+    # Both file creation and process execution events must exist
+    files = files[files['first_seen'].notna() & files['first_active'].notna()]
+    
+    # Calculate dormant days
+    dormant_days = (files['first_active'] - files['first_seen']).dt.days
+    
+    # Check additional criteria (svchost-like names not in legitimate Windows path); the
+    # path is the group key, so it is the path of every execution in the group
+    is_legitimate_path = files['exe_path'].astype(object).str.contains(
+        'C:\\Windows\\System32\\', regex=False, na=False
+    ).astype(bool)
+    dormant = files[(dormant_days >= days_threshold) & files['is_suspicious_name'] & ~is_legitimate_path]
+    
+    # Convert to DataFrame and sort
+    if dormant.empty:
+        return pd.DataFrame()
+    
+    days_dormant = dormant_days[dormant.index]
+    result_df = pd.DataFrame({
+        'detection_time': now,
+        'severity': 'Critical',
+        'hostname': dormant['hostname'].to_numpy(),
+        'pid': dormant['pid'].to_numpy(),
+        'process_name': dormant['name'].to_numpy(),
+        'detection_type': 'Delayed Execution Pattern',
+        'timeline': ('Process remained dormant for ' + days_dormant.astype(str) +
+                     ' days before activation').to_numpy(),
+        'associated_file': dormant['exe_path'].to_numpy(),
+        'first_seen': dormant['first_seen'].to_numpy(),
+        'first_active': dormant['first_active'].to_numpy(),
+        'days_dormant': days_dormant.to_numpy(),
+        'alert_name': 'Long-Term Dwell Time Detection'
+    })
+    return result_df.sort_values('days_dormant', ascending=False).head(100)
+
+def detect_long_dwell_time(df, days_threshold=30, lookback_days=90, now=None, engine=None):
     """
     Detect processes that remained dormant for a long time before activation.
     Equivalent to "Query 1: Long-Term Dwell Time Detection" in SQL.
     """
     try:
         # Current time for reference
-        now = datetime.now()
-        lookback_date = now - timedelta(days=lookback_days)
+        engine = _engine_for(df, now, engine)
+        now = engine.now
         
         # Filter data to the lookback period
-        recent_data = df[df['timestamp'] >= lookback_date].copy()
-        
-        # Group by hostname, exe_path to find files created vs execution
-        dormant_activations = []
+        recent_data = engine.window(lookback_days)
+        engine.stage('window', recent_data)
         
-        # First, find all unique hostname, exe_path combinations
-        unique_files = recent_data[['hostname', 'exe_path']].dropna().drop_duplicates()
-        
-        for _, file_row in unique_files.iterrows():
-            hostname = file_row['hostname']
-            exe_path = file_row['exe_path']
-            
-            # Filter data for this specific hostname and exe_path
-            file_data = recent_data[(recent_data['hostname'] == hostname) & 
-                                  (recent_data['exe_path'] == exe_path)]
-            
-            # Check if there are both file creation (pid=0) and process execution (pid>0) events
-            file_creation = file_data[file_data['pid'] == 0]
-            process_execution = file_data[file_data['pid'] > 0]
-            
-            if len(file_creation) > 0 and len(process_execution) > 0:
-                # Get first seen (file creation) and first active (process execution) timestamps
-                first_seen = file_creation['timestamp'].min()
-                first_active = process_execution['timestamp'].min()
-                
-                # Calculate dormant days
-                dormant_days = (first_active - first_seen).days
-                
-                # Check additional criteria (svchost-like names not in legitimate Windows path)
-                is_suspicious_name = False
-                for name in process_execution['name']:
-                    if isinstance(name, str) and 'svchost' in name.lower():
-                        is_suspicious_name = True
-                        break
-                
-                is_legitimate_path = False
-                for path in process_execution['exe_path']:
-                    if isinstance(path, str) and 'C:\\Windows\\System32\\' in path:
-                        is_legitimate_path = True
-                        break
-                
-                if dormant_days >= days_threshold and is_suspicious_name and not is_legitimate_path:
-                    # Get process details from first execution
-                    first_execution = process_execution.iloc[0]
-                    
-                    dormant_activations.append({
-                        'detection_time': now,
-                        'severity': 'Critical',
-                        'hostname': hostname,
-                        'pid': first_execution['pid'],
-                        'process_name': first_execution['name'],
-                        'detection_type': 'Delayed Execution Pattern',
-                        'timeline': f'Process remained dormant for {dormant_days} days before activation',
-                        'associated_file': exe_path,
-                        'first_seen': first_seen,
-                        'first_active': first_active,
-                        'days_dormant': dormant_days,
-                        'alert_name': 'Long-Term Dwell Time Detection'
-                    })
-        
-        # Convert to DataFrame and sort
-        if dormant_activations:
-            result_df = pd.DataFrame(dormant_activations)
-            return result_df.sort_values('days_dormant', ascending=False).head(100)
-        else:
-            return pd.DataFrame()
+        # First seen / first active per (hostname, exe_path) in one groupby pass
+        files = summarize_dwell_files(recent_data, backend=engine.backend)
+        engine.stage('summarize', files)
+        return dwell_time_alerts(files, now, days_threshold)
     except Exception as e:
         print(f"Error in detect_long_dwell_time: {str(e)}")
         traceback.print_exc()
         return pd.DataFrame()
 
-def detect_beaconing(df, lookback_days=60, active_days_threshold=10, consistency_threshold=0.8):
+def summarize_beaconing(exploded, backend=None):
+    """
+    Daily connection counts per (hostname, pid, name, remote_ip) from rows of
+    the table exploded by remote IP (with its day key)
+    """
+    network_data = exploded[
+        (exploded['conn_count'] > 0) &
+        (exploded['outbound_bytes'] > 0) &
+        (exploded['outbound_bytes'] < 10000)  # Small traffic bursts
+    ]
+    
+    # Per-connection counters
+    hours = network_data['timestamp'].dt.hour
+    connections = network_data[['hostname', 'pid', 'name', 'day', 'remote_ip']].assign(
+        off_hours_count=hours.between(1, 5).astype(int)
+    )
+    
+    # Aggregate by day: one row per (process, destination, day)
+    return get_backend(backend).aggregate(connections, ['hostname', 'pid', 'name', 'day', 'remote_ip'], {
+        'connection_count': ('off_hours_count', 'size'),
+        'off_hours_count': ('off_hours_count', 'sum')
+    })
+
+def beaconing_alerts(daily_summary, now, active_days_threshold=10, consistency_threshold=0.8):
+    """Beaconing alerts from (merged) summarize_beaconing() daily counts"""
+    # Filter for few connections per day
+    daily_summary = daily_summary[daily_summary['connection_count'] <= 3]
+    
+    if daily_summary.empty:
+        return pd.DataFrame()
+    
+    # Find consistent patterns across many days
+    patterns = daily_summary.groupby(['hostname', 'pid', 'name', 'remote_ip'], observed=True).agg(
+        days_active=('day', 'nunique'),
+        total_off_hours_connections=('off_hours_count', 'sum'),
+        min_day=('day', 'min'),
+        max_day=('day', 'max')
+    ).reset_index()
+    
+    # Calculate consistency across days (active days / total possible days in range)
+    total_days = (patterns['max_day'] - patterns['min_day']).dt.days + 1
+    consistency = patterns['days_active'] / total_days
+    
+    beaconing_patterns = patterns[
+        (patterns['days_active'] > 1) &  # Need at least 2 days to calculate consistency
+        (patterns['days_active'] >= active_days_threshold) &
+        (consistency > consistency_threshold) &
+        (patterns['total_off_hours_connections'] > patterns['days_active'] * 0.5)
+    ]
+    
+    if beaconing_patterns.empty:
+        return pd.DataFrame()
+    
+    result_df = pd.DataFrame({
+        'detection_time': now,
+        'severity': 'High',
+        # Plain strings, also for compact (categorical) frames
+        'hostname': beaconing_patterns['hostname'].astype(object),
+        'pid': beaconing_patterns['pid'],
+        'process_name': beaconing_patterns['name'].astype(object),
+        'detection_type': 'Consistent Temporal Beaconing',
+        'timeline': ('24-hour precise connection intervals over ' +
+                     beaconing_patterns['days_active'].astype(str) + ' days'),
+        'destination': beaconing_patterns['remote_ip'],
+        'traffic_pattern': 'Small 15-second bursts every 24 hours',
+        'days_active': beaconing_patterns['days_active'],
+        'alert_name': 'Temporal Networking Anomaly'
+    }).reset_index(drop=True)
+    return result_df.sort_values('days_active', ascending=False).head(100)
+
+def detect_beaconing(df, lookback_days=60, active_days_threshold=10, consistency_threshold=0.8,
+                     now=None, engine=None):
     """
     Detect consistent temporal beaconing patterns.
     Equivalent to "Query 2: Temporal Networking Anomaly - Consistent Beaconing Detection" in SQL.
     """
     try:
         # Current time for reference
-        now = datetime.now()
-        lookback_date = now - timedelta(days=lookback_days)
-        
-        # Filter data
-        network_data = df[
-            (df['timestamp'] >= lookback_date) &
-            (df['conn_count'] > 0) &
-            (df['outbound_bytes'] > 0) &
-            (df['outbound_bytes'] < 10000)  # Small traffic bursts
-        ].copy()
-        
-        # Only keep rows where remote_ips is not empty
-        network_data = network_data[network_data['remote_ips'].apply(
-            lambda x: isinstance(x, list) and len(x) > 0
-        )]
-        
-        if network_data.empty:
-            return pd.DataFrame()
-        
-        # Extract day and hour from timestamp
-        network_data['day'] = network_data['timestamp'].dt.date
-        network_data['hour'] = network_data['timestamp'].dt.hour
-        
-        # Group by day to find daily patterns
-        daily_connections = []
-        
-        # Safely process remote IPs
-        for _, row in network_data.iterrows():
-            hostname = row['hostname']
-            pid = row['pid']
-            name = row['name']
-            day = row['day']
-            hour = row['hour']
-            
-            # Process each remote IP
-            if isinstance(row['remote_ips'], list):
-                for remote_ip in row['remote_ips']:
-                    daily_connections.append({
-                        'hostname': hostname,
-                        'pid': pid,
-                        'name': name,
-                        'day': day,
-                        'remote_ip': remote_ip,
-                        'connection_count': 1,
-                        'off_hours_count': 1 if 1 <= hour <= 5 else 0
-                    })
-        
-        if not daily_connections:
-            return pd.DataFrame()
-        
-        # Convert to DataFrame
-        daily_df = pd.DataFrame(daily_connections)
-        
-        # Aggregate by day
-        daily_summary = daily_df.groupby(['hostname', 'pid', 'name', 'day', 'remote_ip']).agg({
-            'connection_count': 'sum',
-            'off_hours_count': 'sum'
-        }).reset_index()
-        
-        # Filter for few connections per day
-        daily_summary = daily_summary[daily_summary['connection_count'] <= 3]
-        
-        # Find consistent patterns across many days
-        beaconing_patterns = []
-        
-        for (hostname, pid, name, remote_ip), group in daily_summary.groupby(['hostname', 'pid', 'name', 'remote_ip']):
-            days_active = len(group['day'].unique())
-            total_off_hours_connections = group['off_hours_count'].sum()
-            
-            # Calculate consistency across days (active days / total possible days in range)
-            if days_active > 1:  # Need at least 2 days to calculate consistency
-                min_day = min(group['day'])
-                max_day = max(group['day'])
-                if isinstance(min_day, datetime) and isinstance(max_day, datetime):
-                    total_days = (max_day - min_day).days + 1
-                else:
-                    # Handle if they're date objects
-                    total_days = (max_day - min_day).days + 1
-                
-                consistency = days_active / total_days if total_days > 0 else 0
-                
-                if (days_active >= active_days_threshold and
-                    consistency > consistency_threshold and
-                    total_off_hours_connections > days_active * 0.5):
-                    
-                    beaconing_patterns.append({
-                        'detection_time': now,
-                        'severity': 'High',
-                        'hostname': hostname,
-                        'pid': pid,
-                        'process_name': name,
-                        'detection_type': 'Consistent Temporal Beaconing',
-                        'timeline': f'24-hour precise connection intervals over {days_active} days',
-                        'destination': remote_ip,
-                        'traffic_pattern': 'Small 15-second bursts every 24 hours',
-                        'days_active': days_active,
-                        'alert_name': 'Temporal Networking Anomaly'
-                    })
-        
-        if beaconing_patterns:
-            result_df = pd.DataFrame(beaconing_patterns)
-            return result_df.sort_values('days_active', ascending=False).head(100)
-        else:
-            return pd.DataFrame()
+        engine = _engine_for(df, now, engine)
+        now = engine.now
+        
+        # Daily counts from the shared table of lookback rows exploded by remote IP
+        exploded = engine.exploded_remote_ips(lookback_days)
+        engine.stage('explode', exploded)
+        daily_summary = summarize_beaconing(exploded, engine.backend)
+        engine.stage('summarize', daily_summary)
+        return beaconing_alerts(daily_summary, now, active_days_threshold, consistency_threshold)
     except Exception as e:
         print(f"Error in detect_beaconing: {str(e)}")
         traceback.print_exc()
         return pd.DataFrame()
 
-def detect_weekend_exfiltration(df, lookback_days=60):
+def weekend_traffic_rows(rows):
+    """Rows with outbound traffic and at least one remote IP"""
+    traffic_data = rows[rows['outbound_bytes'] > 0]
+    
+    # Only keep rows where remote_ips is not empty and is a list
+    # (as bool, so that an empty mask still selects rows rather than columns)
+    return traffic_data[traffic_data['remote_ips'].apply(
+        lambda x: isinstance(x, list) and len(x) > 0
+    ).astype(bool)]
+
+def summarize_weekend_traffic(exploded, backend=None):
+    """
+    Daily outbound bytes per (hostname, os_type, pid, name, remote IP) from
+    rows of the table exploded by remote IP (with its day key)
+    """
+    traffic_ips = exploded[exploded['outbound_bytes'] > 0]
+    daily_traffic = traffic_ips[['hostname', 'os_type', 'pid', 'name']].assign(
+        event_date=traffic_ips['day'],
+        is_weekend=traffic_ips['timestamp'].dt.dayofweek.isin([5, 6]).astype(int),  # 5,6 = Sat,Sun
+        remote_ips=traffic_ips['remote_ip'],
+        daily_outbound=traffic_ips['outbound_bytes']
+    )
+    
+    # Group by hostname, process, date to get daily traffic
+    return get_backend(backend).aggregate(
+        daily_traffic, ['hostname', 'os_type', 'pid', 'name', 'event_date', 'is_weekend', 'remote_ips'],
+        {'daily_outbound': ('daily_outbound', 'sum')}
+    )
+
+def weekend_exfiltration_alerts(daily_traffic_agg, process_baseline, now):
+    """
+    Weekend exfiltration alerts from (merged) summarize_weekend_traffic() daily
+    traffic and the per-process baseline (avg_daily_outbound)
+    """
+    # Merge with baseline
+    daily_traffic_agg = daily_traffic_agg.merge(
+        process_baseline, on=['hostname', 'name', 'pid'], how='left'
+    )
+    
+    # Filter for traffic above baseline
+    daily_traffic_agg = daily_traffic_agg[daily_traffic_agg['daily_outbound'] > daily_traffic_agg['avg_daily_outbound'] * 1.5]
+    
+    if daily_traffic_agg.empty:
+        return pd.DataFrame()
+    
+    # Analyze weekend vs. weekday patterns: day counts and traffic volumes per destination
+    by_period = daily_traffic_agg.groupby(['hostname', 'pid', 'name', 'remote_ips', 'is_weekend'], observed=True).agg(
+        days=('event_date', 'nunique'),
+        bytes=('daily_outbound', 'sum')
+    ).unstack('is_weekend', fill_value=0)
+    
+    def period(column, weekend):
+        if (column, weekend) in by_period.columns:
+            return by_period[(column, weekend)]
+        return pd.Series(0, index=by_period.index)
+    
+    weekend_days, weekday_days = period('days', 1), period('days', 0)
+    weekend_bytes, weekday_bytes = period('bytes', 1), period('bytes', 0)
+    total_bytes = weekend_bytes + weekday_bytes
+    
+    # Calculate daily averages
+    weekend_avg = (weekend_bytes / weekend_days).where(weekend_days > 0, 0)
+    weekday_avg = (weekday_bytes / weekday_days).where(weekday_days > 0, 0)
+    
+    # Check criteria
+    suspicious = ((weekend_days > 0) &
+                  (weekend_avg > weekday_avg * 3) &
+                  (total_bytes > 1000000))  # At least 1MB total data
+    suspicious_exfil = total_bytes[suspicious].rename('total_bytes').reset_index()
+    
+    if suspicious_exfil.empty:
+        return pd.DataFrame()
+    
+    result_df = pd.DataFrame({
+        'detection_time': now,
+        'severity': 'Critical',
+        # Plain strings, also for compact (categorical) frames
+        'hostname': suspicious_exfil['hostname'].astype(object),
+        'pid': suspicious_exfil['pid'],
+        'process_name': suspicious_exfil['name'].astype(object),
+        'detection_type': 'Data Exfiltration via Steganography',
+        'timeline': 'Weekend-only outbound data transfer',
+        'data_volume': '~' + (suspicious_exfil['total_bytes'] / 1048576).round(1).astype(str) + 'MB total',
+        'destination': suspicious_exfil['remote_ips'],
+        'total_bytes': suspicious_exfil['total_bytes'],
+        'alert_name': 'Weekend Exfiltration Detection'
+    })
+    return result_df.sort_values('total_bytes', ascending=False).head(100)
+
+def detect_weekend_exfiltration(df, lookback_days=60, now=None, engine=None):
     """
     Detect weekend/holiday data exfiltration patterns.
     Equivalent to "Query 3: Weekend/Holiday Exfiltration Detection" in SQL.
     """
     try:
         # Current time for reference
-        now = datetime.now()
-        lookback_date = now - timedelta(days=lookback_days)
+        engine = _engine_for(df, now, engine)
+        now = engine.now
         
         # Filter relevant data
-        traffic_data = df[
-            (df['timestamp'] >= lookback_date) &
-            (df['outbound_bytes'] > 0)
-        ].copy()
-        
-        # Only keep rows where remote_ips is not empty and is a list
-        traffic_data = traffic_data[traffic_data['remote_ips'].apply(
-            lambda x: isinstance(x, list) and len(x) > 0
-        )]
+        traffic_data = weekend_traffic_rows(engine.window(lookback_days))
+        engine.stage('traffic', traffic_data)
         
         if traffic_data.empty:
             return pd.DataFrame()
         
         # Calculate baseline traffic per process
-        process_baseline = traffic_data.groupby(['hostname', 'name', 'pid'])['outbound_bytes'].mean().reset_index()
-        process_baseline.rename(columns={'outbound_bytes': 'avg_daily_outbound'}, inplace=True)
-        
-        # Add date and determine if it's a weekend
-        traffic_data['event_date'] = traffic_data['timestamp'].dt.date
-        traffic_data['is_weekend'] = traffic_data['timestamp'].dt.dayofweek.isin([5, 6]).astype(int)  # 5,6 = Sat,Sun
-        
-        # Prepare data for daily traffic calculation
-        daily_traffic_entries = []
-        
-        # Process each row
-        for _, row in traffic_data.iterrows():
-            hostname = row['hostname']
-            os_type = row['os_type']
-            pid = row['pid']
-            name = row['name']
-            event_date = row['event_date']
-            is_weekend = row['is_weekend']
-            outbound_bytes = row['outbound_bytes']
-            
-            # Process each remote IP
-            if isinstance(row['remote_ips'], list):
-                for remote_ip in row['remote_ips']:
-                    daily_traffic_entries.append({
-                        'hostname': hostname,
-                        'os_type': os_type,
-                        'pid': pid,
-                        'name': name,
-                        'event_date': event_date,
-                        'is_weekend': is_weekend,
-                        'remote_ips': remote_ip,
-                        'daily_outbound': outbound_bytes
-                    })
-        
-        if not daily_traffic_entries:
-            return pd.DataFrame()
-        
-        # Convert to DataFrame
-        daily_traffic = pd.DataFrame(daily_traffic_entries)
-        
-        # Group by hostname, process, date to get daily traffic
-        daily_traffic_agg = daily_traffic.groupby(['hostname', 'os_type', 'pid', 'name', 'event_date', 'is_weekend', 'remote_ips'])[
-            'daily_outbound'
-        ].sum().reset_index()
-        
-        # Merge with baseline
-        daily_traffic_agg = daily_traffic_agg.merge(
-            process_baseline, on=['hostname', 'name', 'pid'], how='left'
-        )
-        
-        # Filter for traffic above baseline
-        daily_traffic_agg = daily_traffic_agg[daily_traffic_agg['daily_outbound'] > daily_traffic_agg['avg_daily_outbound'] * 1.5]
-        
-        # Analyze weekend vs. weekday patterns
-        suspicious_exfil = []
-        
-        for (hostname, pid, name, remote_ip), group in daily_traffic_agg.groupby(['hostname', 'pid', 'name', 'remote_ips']):
-            # Count weekend and weekday days
-            weekend_days = len(group[group['is_weekend'] == 1]['event_date'].unique())
-            weekday_days = len(group[group['is_weekend'] == 0]['event_date'].unique())
-            
-            # Calculate traffic volumes
-            weekend_bytes = group[group['is_weekend'] == 1]['daily_outbound'].sum()
-            weekday_bytes = group[group['is_weekend'] == 0]['daily_outbound'].sum()
-            total_bytes = weekend_bytes + weekday_bytes
-            
-            # Calculate daily averages
-            weekend_avg = weekend_bytes / weekend_days if weekend_days > 0 else 0
-            weekday_avg = weekday_bytes / weekday_days if weekday_days > 0 else 0
-            
-            # Check criteria
-            if (weekend_days > 0 and 
-                weekend_avg > weekday_avg * 3 and
-                total_bytes > 1000000):  # At least 1MB total data
-                
-                suspicious_exfil.append({
-                    'detection_time': now,
-                    'severity': 'Critical',
-                    'hostname': hostname,
-                    'pid': pid,
-                    'process_name': name,
-                    'detection_type': 'Data Exfiltration via Steganography',
-                    'timeline': 'Weekend-only outbound data transfer',
-                    'data_volume': f'~{round(total_bytes/1048576, 1)}MB total',
-                    'destination': remote_ip,
-                    'total_bytes': total_bytes,
-                    'alert_name': 'Weekend Exfiltration Detection'
-                })
+        process_baseline = engine.backend.aggregate(traffic_data, ['hostname', 'name', 'pid'], {
+            'avg_daily_outbound': ('outbound_bytes', 'mean')
+        })
+        engine.stage('baseline', process_baseline)
         
-        if suspicious_exfil:
-            result_df = pd.DataFrame(suspicious_exfil)
-            return result_df.sort_values('total_bytes', ascending=False).head(100)
-        else:
-            return pd.DataFrame()
+        # Same rows from the shared table exploded by remote IP (the day key comes with it)
+        daily_traffic_agg = summarize_weekend_traffic(engine.exploded_remote_ips(lookback_days), engine.backend)
+        engine.stage('summarize', daily_traffic_agg)
+        return weekend_exfiltration_alerts(daily_traffic_agg, process_baseline, now)
     except Exception as e:
         print(f"Error in detect_weekend_exfiltration: {str(e)}")
         traceback.print_exc()
@@ -424,271 +896,452 @@ def detect_weekend_exfiltration(df, lookback_days=60):
 # SCENARIO 2: CROSS-SYSTEM LATERAL MOVEMENT WITH DISTRIBUTED ATTACK PATTERN
 # --------------------------------------------------------------------------------------------
 
-def detect_distributed_reconnaissance(df, lookback_days=30):
+def classify_recon_commands(cmdlines):
+    """
+    Recon filter and command category of each command line. One matcher
+    covers the recon keywords and the category keywords, and each distinct
+    command line is scanned once. A command line is recon if any keyword
+    occurs in it as whole words (the OR of the SQL reference query, without
+    its substring hits such as 'last' in 'lastlog' or 'w ' in 'show ').
+    Returns (is_recon, categories) arrays.
+    """
+    category_patterns = [pattern for _, patterns in RECON_COMMAND_CATEGORIES for pattern in patterns]
+    matcher = compile_matcher(tuple(RECON_COMMANDS + category_patterns), whole_words=True)
+    recon_ids = matcher.ids_of(RECON_COMMANDS)
+    category_ids = [(category, matcher.ids_of(patterns)) for category, patterns in RECON_COMMAND_CATEGORIES]
+    
+    codes, matches = matcher.match_values(cmdlines)
+    
+    # Classify each distinct command line: recon filter and first matching category
+    is_recon = np.array([not found.isdisjoint(recon_ids) for found in matches] + [False])
+    categories = np.array([
+        next((category for category, ids in category_ids if not found.isdisjoint(ids)), 'other')
+        for found in matches
+    ] + ['other'], dtype=object)
+    
+    # Code -1 (a missing cmdline) picks the trailing entries
+    return is_recon[codes], categories[codes]
+
+def recon_alerts(systems_recon, now):
+    """
+    Reconnaissance alerts from per-(command_category, hostname, user) first and
+    last seen timestamps and distinct command counts
+    """
+    # Filter for systems with at least 2 different commands
+    systems_recon = systems_recon[systems_recon['command_count'] >= 2]
+    
+    # Find connected systems with similar patterns
+    connected_systems = []
+    
+    for category, group in systems_recon.groupby('command_category', observed=True):
+        # Check if there are at least 3 systems and 2 users
+        system_count = len(group['hostname'].unique())
+        user_count = len(group['user'].unique())
+        
+        if system_count >= 3 and user_count >= 2:
+            # Check for time correlation (within 24 hours)
+            min_time = group['first_seen'].min()
+            max_time = group['first_seen'].max()
+            
+            if (max_time - min_time).total_seconds() / 3600 < 24:
+                connected_systems.append({
+                    'detection_time': now,
+                    'severity': 'High',
+                    'detection_type': 'Multi-system Coordinated Reconnaissance',
+                    'affected_systems': ', '.join(group['hostname'].unique()),
+                    'first_detected': group['first_seen'].min(),
+                    'last_detected': group['last_seen'].max(),
+                    'evidence': 'Similar command patterns executed across multiple systems',
+                    'user_accounts': f"{user_count} different user accounts executing similar commands",
+                    'system_count': system_count,
+                    'alert_name': 'Distributed Reconnaissance Campaign'
+                })
+    
+    if connected_systems:
+        result_df = pd.DataFrame(connected_systems)
+        return result_df.sort_values('system_count', ascending=False).head(100)
+    else:
+        return pd.DataFrame()
+
+def detect_distributed_reconnaissance(df, lookback_days=30, now=None, engine=None):
     """
     Detect distributed reconnaissance campaigns across multiple systems.
     Equivalent to "Query 1: Distributed Reconnaissance Campaign" in SQL.
     """
     try:
         # Current time for reference
-        now = datetime.now()
-        lookback_date = now - timedelta(days=lookback_days)
+        engine = _engine_for(df, now, engine)
+        now = engine.now
         
         # Filter relevant data
-        recon_data = df[df['timestamp'] >= lookback_date].copy()
-        
-        # Create function to categorize commands
-        def categorize_command(cmdline):
-            if not isinstance(cmdline, str):
-                return 'other'
-            
-            cmdline = cmdline.lower()
-            if any(cmd in cmdline for cmd in ['net view', 'net use', 'nslookup', 'ping ']):
-                return 'network_discovery'
-            elif any(cmd in cmdline for cmd in ['get-acl', 'icacls', 'cacls']):
-                return 'permission_enum'
-            elif any(cmd in cmdline for cmd in ['net group', 'net user', 'get-adgroup', 'get-aduser']):
-                return 'account_enum'
-            return 'other'
-        
-        # Define recon commands to filter by
-        recon_cmds = [
-            # Windows commands
-            'net view', 'net use', 'net group', 'net user', 'nslookup', 'ping ', 'ipconfig',
-            'systeminfo', 'whoami', 'get-acl', 'get-aduser', 'get-adgroup', 'quser',
-            # Linux/Mac commands
-            'ifconfig', 'ip a', 'netstat', 'who', 'w ', 'last', 'lsof'
-        ]
-        
-        # Create a mask for command matching
-        mask = recon_data['cmdline'].notna()
-        for cmd in recon_cmds:
-            temp_mask = recon_data['cmdline'].astype(str).str.contains(cmd, case=False, na=False)
-            mask = mask & temp_mask
+        recon_data = engine.window(lookback_days)
+        engine.stage('window', recon_data)
+        is_recon, categories = classify_recon_commands(recon_data['cmdline'])
         
         # Apply the filter
-        recon_data = recon_data[mask]
+        recon_data = recon_data[is_recon].copy()
+        engine.stage('classify', recon_data)
         
         if recon_data.empty:
             return pd.DataFrame()
         
         # Add command category
-        recon_data['command_category'] = recon_data['cmdline'].apply(categorize_command)
+        recon_data['command_category'] = categories[is_recon]
         
         # Group systems executing similar commands
-        systems_recon = recon_data.groupby(['command_category', 'hostname', 'user']).agg({
-            'timestamp': ['min', 'max'],
-            'cmdline': 'nunique'
+        systems_recon = engine.backend.aggregate(recon_data, ['command_category', 'hostname', 'user'], {
+            'first_seen': ('timestamp', 'min'),
+            'last_seen': ('timestamp', 'max'),
+            'command_count': ('cmdline', 'nunique')
         })
-        systems_recon.columns = ['first_seen', 'last_seen', 'command_count']
-        systems_recon = systems_recon.reset_index()
+        engine.stage('summarize', systems_recon)
         
-        # Filter for systems with at least 2 different commands
-        systems_recon = systems_recon[systems_recon['command_count'] >= 2]
-        
-        # Find connected systems with similar patterns
-        connected_systems = []
-        
-        for category, group in systems_recon.groupby('command_category'):
-            # Check if there are at least 3 systems and 2 users
-            system_count = len(group['hostname'].unique())
-            user_count = len(group['user'].unique())
-            
-            if system_count >= 3 and user_count >= 2:
-                # Check for time correlation (within 24 hours)
-                min_time = group['first_seen'].min()
-                max_time = group['first_seen'].max()
-                
-                if (max_time - min_time).total_seconds() / 3600 < 24:
-                    connected_systems.append({
-                        'detection_time': now,
-                        'severity': 'High',
-                        'detection_type': 'Multi-system Coordinated Reconnaissance',
-                        'affected_systems': ', '.join(group['hostname'].unique()),
-                        'first_detected': group['first_seen'].min(),
-                        'last_detected': group['last_seen'].max(),
-                        'evidence': 'Similar command patterns executed across multiple systems',
-                        'user_accounts': f"{user_count} different user accounts executing similar commands",
-                        'system_count': system_count,
-                        'alert_name': 'Distributed Reconnaissance Campaign'
-                    })
-        
-        if connected_systems:
-            result_df = pd.DataFrame(connected_systems)
-            return result_df.sort_values('system_count', ascending=False).head(100)
-        else:
-            return pd.DataFrame()
+        return recon_alerts(systems_recon, now)
     except Exception as e:
         print(f"Error in detect_distributed_reconnaissance: {str(e)}")
         traceback.print_exc()
         return pd.DataFrame()
 
-def detect_service_account_anomaly(df, baseline_days=90, recent_days=30):
+def is_service_account(users):
+    """Identify service accounts by naming convention"""
+    # Create a safer version of string contains check
+    def safe_contains(x, pattern):
+        if not isinstance(x, str):
+            return False
+        return pattern in x
+    
+    return users.apply(
+        lambda x: safe_contains(x, 'svc_') or safe_contains(x, '_svc') or safe_contains(x, 'service')
+    ).astype(bool)
+
+def service_account_alerts(baseline_hosts, recent_hosts, now):
+    """
+    Service-account alerts from the (user, hostname) pairs seen in the baseline
+    period and the per-(user, hostname) first/last seen timestamps of the recent
+    period, listed in order of first appearance
+    """
+    if baseline_hosts.empty or recent_hosts.empty:
+        return pd.DataFrame()
+    
+    # Baseline systems for each service account
+    baseline_systems = {}
+    for user, group in baseline_hosts.groupby('user', observed=True):
+        baseline_systems[user] = set(group['hostname'].unique())
+    
+    # Recent activity by service account
+    recent_activity_by_user = {}
+    for user, group in recent_hosts.groupby('user', observed=True):
+        recent_activity_by_user[user] = {
+            'recent_systems': set(group['hostname'].unique()),
+            'first_seen': group['first_seen'].min(),
+            'last_seen': group['last_seen'].max()
+        }
+    
+    # Identify service accounts used on new systems
+    anomalies = []
+    
+    for user, activity in recent_activity_by_user.items():
+        # Check if this user has baseline data
+        if user in baseline_systems:
+            baseline_hosts = baseline_systems[user]
+            recent_systems = activity['recent_systems']
+            new_systems = recent_systems - baseline_hosts
+            
+            # Check if at least 3 new systems
+            if len(new_systems) >= 3:
+                anomalies.append({
+                    'detection_time': now,
+                    'severity': 'Critical',
+                    'detection_type': 'Abnormal Service Account Usage',
+                    'account': user,
+                    'affected_systems': ', '.join(recent_systems),
+                    'timeline': f"{activity['first_seen'].date()} - {activity['last_seen'].date()}",
+                    'abnormal_behavior': f"Account used from {len(new_systems)} workstations never previously accessed in 90-day baseline period",
+                    'new_systems_count': len(new_systems),
+                    'alert_name': 'Service Account Anomaly'
+                })
+    
+    if anomalies:
+        result_df = pd.DataFrame(anomalies)
+        return result_df.sort_values('new_systems_count', ascending=False).head(100)
+    else:
+        return pd.DataFrame()
+
+def detect_service_account_anomaly(df, baseline_days=90, recent_days=30, now=None, engine=None):
     """
     Detect service accounts used on new systems they haven't accessed in the baseline period.
     Equivalent to "Query 2: Service Account Anomaly" in SQL.
     """
     try:
         # Current time for reference
-        now = datetime.now()
-        baseline_end = now - timedelta(days=recent_days)
-        baseline_start = baseline_end - timedelta(days=baseline_days)
-        recent_start = baseline_end
-        
-        # Create a safer version of string contains check
-        def safe_contains(x, pattern):
-            if not isinstance(x, str):
-                return False
-            return pattern in x
-            
-        # Identify service accounts by naming convention
-        df['is_service_account'] = df['user'].apply(
-            lambda x: safe_contains(x, 'svc_') or safe_contains(x, '_svc') or safe_contains(x, 'service')
-        )
-        
-        # Baseline period data for service accounts
-        baseline_data = df[
-            (df['timestamp'] >= baseline_start) &
-            (df['timestamp'] <= baseline_end) &
-            (df['is_service_account'])
-        ]
-        
-        # Recent activity for service accounts
-        recent_data = df[
-            (df['timestamp'] > baseline_end) &
-            (df['is_service_account'])
-        ]
+        engine = _engine_for(df, now, engine)
+        now = engine.now
+        baseline_end = engine.lookback_start(recent_days)
+        
+        # Baseline and recent periods together span the whole lookback window
+        window = engine.window(baseline_days + recent_days)
+        engine.stage('window', window)
+        service_rows = window[is_service_account(window['user'])]
+        engine.stage('service_rows', service_rows)
+        
+        # Baseline period data and recent activity for service accounts
+        baseline_data, recent_data = engine.split(service_rows, baseline_end)
         
         if baseline_data.empty or recent_data.empty:
             return pd.DataFrame()
         
-        # Baseline systems for each service account
-        baseline_systems = {}
-        for user, group in baseline_data.groupby('user'):
-            baseline_systems[user] = set(group['hostname'].unique())
-        
-        # Recent activity by service account
-        recent_activity_by_user = {}
-        for user, group in recent_data.groupby('user'):
-            recent_activity_by_user[user] = {
-                'recent_systems': set(group['hostname'].unique()),
-                'first_seen': group['timestamp'].min(),
-                'last_seen': group['timestamp'].max()
-            }
-        
-        # Identify service accounts used on new systems
-        anomalies = []
-        
-        for user, activity in recent_activity_by_user.items():
-            # Check if this user has baseline data
-            if user in baseline_systems:
-                baseline_hosts = baseline_systems[user]
-                recent_systems = activity['recent_systems']
-                new_systems = recent_systems - baseline_hosts
-                
-                # Check if at least 3 new systems
-                if len(new_systems) >= 3:
-                    anomalies.append({
-                        'detection_time': now,
-                        'severity': 'Critical',
-                        'detection_type': 'Abnormal Service Account Usage',
-                        'account': user,
-                        'affected_systems': ', '.join(recent_systems),
-                        'timeline': f"{activity['first_seen'].date()} - {activity['last_seen'].date()}",
-                        'abnormal_behavior': f"Account used from {len(new_systems)} workstations never previously accessed in 90-day baseline period",
-                        'new_systems_count': len(new_systems),
-                        'alert_name': 'Service Account Anomaly'
-                    })
-        
-        if anomalies:
-            result_df = pd.DataFrame(anomalies)
-            return result_df.sort_values('new_systems_count', ascending=False).head(100)
-        else:
-            return pd.DataFrame()
+        # Hosts per account, recent ones with first/last seen in order of first appearance
+        recent_hosts = engine.backend.aggregate(recent_data, ['user', 'hostname'], {
+            'first_seen': ('timestamp', 'min'),
+            'last_seen': ('timestamp', 'max')
+        }, sort=False, dropna=False)
+        engine.stage('summarize', recent_hosts)
+        return service_account_alerts(baseline_data[['user', 'hostname']], recent_hosts, now)
     except Exception as e:
         print(f"Error in detect_service_account_anomaly: {str(e)}")
         traceback.print_exc()
         return pd.DataFrame()
-def detect_cross_system_attack_chain(df, lookback_days=60, min_hosts=3, min_days=7):
+
+# Flag columns marking initial access and cross-system activity
+ATTACK_CHAIN_FLAGS = ['script_execution', 'obfuscated_script', 'registry_persistence_access',
+                      'exe_mismatch', 'credential_access']
+
+# Hostname keywords of sensitive systems (preferred as the final target of a chain)
+SENSITIVE_HOST_KEYWORDS = ['PAYMENT', 'FINANCE', 'HR', 'ADMIN', 'DB', 'SQL']
+
+# First set flag of a row names its initial access type, and its activity type
+ACCESS_TYPE_RULES = [
+    ('script_execution', 'script_execution'),
+    ('obfuscated_script', 'obfuscated_script'),
+    ('registry_persistence_access', 'registry_persistence'),
+    ('exe_mismatch', 'exe_mismatch'),
+    ('credential_access', 'credential_theft')
+]
+ACTIVITY_TYPE_RULES = [
+    ('credential_access', 'credential_access'),
+    ('registry_persistence_access', 'persistence'),
+    ('script_execution', 'script_execution')
+]
+
+# (process name, command line) keywords of download-and-run initial access
+INITIAL_ACCESS_COMMANDS = [('powershell', 'download'), ('cmd', 'curl'), ('npm', 'install')]
+
+def _is_one(value):
+    """Flag value as tested for initial access: the number 1 (or True) or the string '1'"""
+    return value == 1 or value == '1'
+
+def _parses_as_one(value):
+    """Flag value as tested for access/activity types: anything float() reads as 1"""
+    try:
+        return not pd.isna(value) and float(value) == 1
+    except (ValueError, TypeError):
+        return False
+
+def _map_distinct(values, func):
+    """func(value) -> bool of each cell, evaluated once per distinct value"""
+    try:
+        codes, uniques = pd.factorize(values)
+    except TypeError:
+        # Unhashable cells
+        return values.map(func).to_numpy(dtype=bool)
+    results = np.fromiter((func(x) for x in uniques), dtype=bool, count=len(uniques))
+    # Missing values (code -1) take the last entry
+    return np.append(results, func(np.nan))[codes]
+
+def flag_mask(rows, col, parse=False):
+    """
+    Rows whose flag `col` is set, for any mix of 0/1 numbers, bools and
+    strings: equal to 1 or '1', or with `parse` anything float() reads as 1.
+    A missing column sets no flags.
+    """
+    if col not in rows.columns:
+        return np.zeros(len(rows), dtype=bool)
+    values = rows[col]
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy() == 1
+    return _map_distinct(values, _parses_as_one if parse else _is_one)
+
+def _contains(values, keyword):
+    """Strings containing `keyword`, ignoring case (anything else does not)"""
+    keyword = keyword.lower()
+    return _map_distinct(values, lambda x: isinstance(x, str) and keyword in x.lower())
+
+def initial_access_mask(rows):
+    """Rows that look like initial access (suspicious flags or download/install commands)"""
+    mask = np.zeros(len(rows), dtype=bool)
+    for col in ATTACK_CHAIN_FLAGS:
+        mask |= flag_mask(rows, col)
+    
+    # Command lines are only scanned on rows of a matching process name
+    for name, keyword in INITIAL_ACCESS_COMMANDS:
+        candidates = np.flatnonzero(_contains(rows['name'], name) & ~mask)
+        if len(candidates):
+            mask[candidates] = _contains(rows['cmdline'].iloc[candidates], keyword)
+    return pd.Series(mask, index=rows.index)
+
+def _first_match(rows, rules, extra=()):
+    """Category of the first matching (flag, category) rule of each row, 'other' if none"""
+    conditions = [flag_mask(rows, col, parse=True) for col, _ in rules] + [cond for cond, _ in extra]
+    categories = [category for _, category in rules] + [category for _, category in extra]
+    return pd.Series(np.select(conditions, categories, default='other'), index=rows.index, dtype=object)
+
+def access_types(rows):
+    """Initial access type of each row (first set flag: script, obfuscation, persistence, ...)"""
+    if rows.empty:
+        return pd.Series(index=rows.index, dtype=object)
+    return _first_match(rows, ACCESS_TYPE_RULES)
+
+def activity_types(rows):
+    """Activity type of each row (credential access, persistence, script, network, other)"""
+    if rows.empty:
+        return pd.Series(index=rows.index, dtype=object)
+    network = (rows['conn_count'] > 5).to_numpy()
+    return _first_match(rows, ACTIVITY_TYPE_RULES, extra=[(network, 'network_activity')])
+
+def summarize_attack_chain(cross_system, seq=None, by_day=False, initial_access=None, backend=None):
+    """
+    Per-(user, hostname, activity_type) summary of cross-system activity: the
+    first row's sequence number and the earliest and latest timestamps with the
+    sequence number of the first row reaching each. `seq` numbers the rows in
+    stream order (their position by default). With `by_day` the summary is also
+    split by calendar day, and `initial_access` adds whether any row was an
+    initial access event. `backend` runs the grouping (pandas by default).
+    """
+    seq = np.arange(len(cross_system)) if seq is None else np.asarray(seq)
+    events = pd.DataFrame({
+        'user': cross_system['user'].to_numpy(),
+        'hostname': cross_system['hostname'].to_numpy(),
+        'activity_type': cross_system['activity_type'].to_numpy(),
+        'timestamp': cross_system['timestamp'].to_numpy(),
+        'seq': seq
+    })
+    keys = ['user', 'hostname', 'activity_type']
+    if by_day:
+        events['day'] = cross_system['timestamp'].dt.normalize().to_numpy()
+        keys.append('day')
+    
+    aggregations = {'first_seq': ('seq', 'min')}
+    if initial_access is not None:
+        events['is_initial_access'] = np.asarray(initial_access, dtype=bool)
+        aggregations['is_initial_access'] = ('is_initial_access', 'any')
+    summary = get_backend(backend).aggregate(events, keys, aggregations, sort=False, dropna=False)
+    
+    # Earliest and latest rows (the first in stream order among equal timestamps)
+    first = events.sort_values(['timestamp', 'seq']).drop_duplicates(keys)
+    last = events.sort_values(['timestamp', 'seq'], ascending=[False, True]).drop_duplicates(keys)
+    summary = summary.merge(
+        first[keys + ['timestamp', 'seq']].rename(columns={'timestamp': 'first_ts', 'seq': 'first_ts_seq'}),
+        on=keys, how='left'
+    ).merge(
+        last[keys + ['timestamp', 'seq']].rename(columns={'timestamp': 'last_ts', 'seq': 'last_ts_seq'}),
+        on=keys, how='left'
+    )
+    return summary
+
+def attack_chain_alerts(summary, now, min_hosts=3, min_days=7):
+    """
+    Attack-chain alerts from a (merged) summarize_attack_chain() table of the
+    users involved in initial access
+    """
+    if summary.empty:
+        return pd.DataFrame()
+    
+    # Identify sensitive systems
+    def is_sensitive(hostname):
+        if not isinstance(hostname, str):
+            return False
+        return any(keyword in hostname.upper() for keyword in SENSITIVE_HOST_KEYWORDS)
+    
+    summary = summary.sort_values('first_seq', kind='stable')
+    is_sensitive_host = summary['hostname'].apply(is_sensitive).astype(bool)
+    
+    # Hosts of each user in order of first access
+    accessed_hosts = summary.dropna(subset=['hostname']).groupby('user', observed=True)['hostname'].unique()
+    
+    # First accessed host, and the last accessed one (a sensitive system if any)
+    by_first = summary.sort_values(['first_ts', 'first_ts_seq'])
+    by_last = summary.sort_values(['last_ts', 'last_ts_seq'], ascending=[False, True])
+    first_hosts = by_first.drop_duplicates('user').set_index('user')
+    last_hosts = by_last.drop_duplicates('user').set_index('user')
+    sensitive_last_hosts = by_last[is_sensitive_host[by_last.index]].drop_duplicates('user').set_index('user')
+    
+    # Group by user to find accessed hosts
+    attack_chains = []
+    for user, group in summary.groupby('user', observed=True):
+        unique_hosts = list(accessed_hosts.get(user, []))
+        first_host = first_hosts.loc[user]
+        last_host = sensitive_last_hosts.loc[user] if user in sensitive_last_hosts.index else last_hosts.loc[user]
+        
+        duration_days = 0
+        try:
+            duration_days = (group['last_ts'].max() - group['first_ts'].min()).days
+        except:
+            pass
+        
+        # Filter for campaigns matching criteria
+        if len(unique_hosts) < min_hosts or duration_days < min_days:
+            continue
+        
+        # Build attack path (initial → middle systems → final)
+        middle_systems = [host for host in unique_hosts
+                        if isinstance(host, str) and
+                        host != first_host['hostname'] and
+                        host != last_host['hostname']]
+        
+        # Limit to 3 middle systems for readability
+        if middle_systems:
+            middle_path = ' → '.join(middle_systems[:min(len(middle_systems), 3)])
+            attack_path = f"{first_host['hostname']} → {middle_path} → {last_host['hostname']}"
+        else:
+            attack_path = f"{first_host['hostname']} → {last_host['hostname']}"
+        
+        attack_chains.append({
+            'detection_time': now,
+            'severity': 'Critical',
+            'detection_type': 'Distributed Attack Chain',
+            'user': user,
+            'host_count': len(unique_hosts),
+            'systems': unique_hosts,
+            'initial_access': first_host['hostname'],
+            'initial_timestamp': first_host['first_ts'],
+            'final_target': last_host['hostname'],
+            'final_timestamp': last_host['last_ts'],
+            'attack_path': attack_path,
+            'attack_duration': f"{duration_days} days with extremely low activity on any single endpoint",
+            'alert_name': 'Cross-System Attack Chain Detected'
+        })
+    
+    if attack_chains:
+        result_df = pd.DataFrame(attack_chains)
+        # Changed this line to address the KeyError
+        if 'campaign_duration' in result_df.columns:
+            return result_df.sort_values('campaign_duration', ascending=False).head(100)
+        else:
+            return result_df.head(100)
+    else:
+        return pd.DataFrame()
+
+def detect_cross_system_attack_chain(df, lookback_days=60, min_hosts=3, min_days=7, now=None, engine=None):
     """
     Detect attack chains spanning multiple systems.
     Equivalent to "Query 3: Cross-System Attack Chain Detection" in SQL.
     """
     try:
         # Current time for reference
-        now = datetime.now()
-        lookback_date = now - timedelta(days=lookback_days)
+        engine = _engine_for(df, now, engine)
+        now = engine.now
         
         # Filter recent data
-        recent_data = df[df['timestamp'] >= lookback_date].copy()
+        recent_data = engine.window(lookback_days)
+        engine.stage('window', recent_data)
         
-        # Safely check numeric fields
-        def safe_numeric_check(row, field):
-            try:
-                value = row[field]
-                if pd.isna(value):
-                    return 0
-                # Try to convert to float, but handle non-numeric values
-                try:
-                    return float(value) == 1
-                except (ValueError, TypeError):
-                    return False
-            except:
-                return False
-        
-        # Create safer numeric versions of fields that might not be convertible
-        for col in ['script_execution', 'obfuscated_script', 'registry_persistence_access', 
-                    'exe_mismatch', 'credential_access']:
-            try:
-                # Create new numeric columns without converting the original
-                recent_data[f'{col}_num'] = recent_data[col].apply(
-                    lambda x: 1 if x == 1 or x == '1' or x == True else 0
-                )
-            except:
-                # If column doesn't exist or has issues, create a column of zeros
-                recent_data[f'{col}_num'] = 0
-        
-        # Identify potential initial access events
-        def identify_access_type(row):
-            if safe_numeric_check(row, 'script_execution'):
-                return 'script_execution'
-            elif safe_numeric_check(row, 'obfuscated_script'):
-                return 'obfuscated_script'
-            elif safe_numeric_check(row, 'registry_persistence_access'):
-                return 'registry_persistence'
-            elif safe_numeric_check(row, 'exe_mismatch'):
-                return 'exe_mismatch'
-            elif safe_numeric_check(row, 'credential_access'):
-                return 'credential_theft'
-            return 'other'
-        
-        # Define function to check string contains for process names
-        def safe_str_contains(x, pattern):
-            if not isinstance(x, str):
-                return False
-            return pattern.lower() in x.lower()
-        
-        # Additional criteria for initial access using safer columns
-        initial_access_mask = (
-            (recent_data['script_execution_num'] == 1) |
-            (recent_data['obfuscated_script_num'] == 1) |
-            (recent_data['registry_persistence_access_num'] == 1) |
-            (recent_data['exe_mismatch_num'] == 1) |
-            (recent_data['credential_access_num'] == 1) |
-            (recent_data['name'].apply(lambda x: safe_str_contains(x, 'powershell')) & 
-             recent_data['cmdline'].apply(lambda x: safe_str_contains(x, 'download'))) |
-            (recent_data['name'].apply(lambda x: safe_str_contains(x, 'cmd')) & 
-             recent_data['cmdline'].apply(lambda x: safe_str_contains(x, 'curl'))) |
-            (recent_data['name'].apply(lambda x: safe_str_contains(x, 'npm')) & 
-             recent_data['cmdline'].apply(lambda x: safe_str_contains(x, 'install')))
-        )
-        
-        initial_access = recent_data[initial_access_mask].copy()
+        initial_access = recent_data[initial_access_mask(recent_data)].copy()
+        engine.stage('initial_access', initial_access)
         
         if initial_access.empty:
             return pd.DataFrame()
-            
-        initial_access['access_type'] = initial_access.apply(identify_access_type, axis=1)
+        
+        initial_access['access_type'] = access_types(initial_access)
         
         # Get users involved in initial access
         initial_access_users = set(initial_access['user'].dropna().unique())
@@ -696,154 +1349,340 @@ def detect_cross_system_attack_chain(df, lookback_days=60, min_hosts=3, min_days
         if not initial_access_users:
             return pd.DataFrame()
         
-        # Track user activities across systems after initial access
-        def identify_activity_type(row):
-            if safe_numeric_check(row, 'credential_access'):
-                return 'credential_access'
-            elif safe_numeric_check(row, 'registry_persistence_access'):
-                return 'persistence'
-            elif safe_numeric_check(row, 'script_execution'):
-                return 'script_execution'
-            elif row['conn_count'] > 5:
-                return 'network_activity'
-            return 'other'
-        
         # Find cross-system activity for users involved in initial access
         cross_system = recent_data[recent_data['user'].isin(initial_access_users)].copy()
         
         if cross_system.empty:
             return pd.DataFrame()
-            
-        cross_system['activity_type'] = cross_system.apply(identify_activity_type, axis=1)
-        
-        # Group by user to find accessed hosts
-        user_activity = {}
-        for user, group in cross_system.groupby('user'):
-            unique_hosts = group['hostname'].dropna().unique()
-            activity_types = group['activity_type'].dropna().unique()
-            first_access = group['timestamp'].min()
-            last_access = group['timestamp'].max()
-            
-            duration_days = 0
-            try:
-                duration_days = (last_access - first_access).days
-            except:
-                pass
-                
-            user_activity[user] = {
-                'accessed_hosts': list(unique_hosts),
-                'activity_types': list(activity_types),
-                'first_access': first_access,
-                'last_access': last_access,
-                'campaign_duration': duration_days,
-                'host_count': len(unique_hosts)
-            }
-        
-        # Filter for campaigns matching criteria
-        host_progression = []
-        for user, activity in user_activity.items():
-            if activity['host_count'] >= min_hosts and activity['campaign_duration'] >= min_days:
-                host_progression.append({
-                    'user': user,
-                    'accessed_hosts': activity['accessed_hosts'],
-                    'activity_types': activity['activity_types'],
-                    'first_access': activity['first_access'],
-                    'last_access': activity['last_access'],
-                    'campaign_duration': activity['campaign_duration'],
-                    'host_count': activity['host_count']
-                })
-        
-        if not host_progression:
-            return pd.DataFrame()
-            
-        host_progression_df = pd.DataFrame(host_progression)
-        
-        # Identify sensitive systems
-        sensitive_keywords = ['PAYMENT', 'FINANCE', 'HR', 'ADMIN', 'DB', 'SQL']
         
-        def is_sensitive(hostname):
-            if not isinstance(hostname, str):
-                return False
-            return any(keyword in hostname.upper() for keyword in sensitive_keywords)
+        cross_system['activity_type'] = activity_types(cross_system)
+        engine.stage('activity', cross_system)
         
-        cross_system['is_sensitive'] = cross_system['hostname'].apply(is_sensitive)
-        
-        # Build attack chains
-        attack_chains = []
-        
-        for _, row in host_progression_df.iterrows():
-            user = row['user']
-            user_systems = cross_system[cross_system['user'] == user]
-            
-            if user_systems.empty:
-                continue
-                
-            # Find first accessed host
-            first_timestamp_idx = user_systems['timestamp'].idxmin()
-            if first_timestamp_idx is None:
-                continue
-                
-            first_host = user_systems.loc[first_timestamp_idx]
-            
-            # Try to find sensitive systems as final target, otherwise use last accessed
-            sensitive_systems = user_systems[user_systems['is_sensitive']]
-            
-            if not sensitive_systems.empty:
-                last_timestamp_idx = sensitive_systems['timestamp'].idxmax()
-                if last_timestamp_idx is not None:
-                    last_host = sensitive_systems.loc[last_timestamp_idx]
-                else:
-                    # Fallback to the last timestamp in user_systems
-                    last_timestamp_idx = user_systems['timestamp'].idxmax()
-                    if last_timestamp_idx is None:
-                        continue
-                    last_host = user_systems.loc[last_timestamp_idx]
-            else:
-                # Use the last accessed host
-                last_timestamp_idx = user_systems['timestamp'].idxmax()
-                if last_timestamp_idx is None:
-                    continue
-                last_host = user_systems.loc[last_timestamp_idx]
-            
-            # Build attack path (initial → middle systems → final)
-            middle_systems = [host for host in row['accessed_hosts'] 
-                            if isinstance(host, str) and 
-                            host != first_host['hostname'] and 
-                            host != last_host['hostname']]
-                            
-            # Limit to 3 middle systems for readability
-            if middle_systems:
-                middle_path = ' → '.join(middle_systems[:min(len(middle_systems), 3)])
-                attack_path = f"{first_host['hostname']} → {middle_path} → {last_host['hostname']}"
-            else:
-                attack_path = f"{first_host['hostname']} → {last_host['hostname']}"
-            
-            attack_chains.append({
-                'detection_time': now,
-                'severity': 'Critical',
-                'detection_type': 'Distributed Attack Chain',
-                'user': user,
-                'host_count': row['host_count'],
-                'systems': row['accessed_hosts'],
-                'initial_access': first_host['hostname'],
-                'initial_timestamp': first_host['timestamp'],
-                'final_target': last_host['hostname'],
-                'final_timestamp': last_host['timestamp'],
-                'attack_path': attack_path,
-                'attack_duration': f"{row['campaign_duration']} days with extremely low activity on any single endpoint",
-                'alert_name': 'Cross-System Attack Chain Detected'
-            })
-        
-        if attack_chains:
-            result_df = pd.DataFrame(attack_chains)
-            # Changed this line to address the KeyError
-            if 'campaign_duration' in result_df.columns:
-                return result_df.sort_values('campaign_duration', ascending=False).head(100)
-            else:
-                return result_df.head(100)
-        else:
-            return pd.DataFrame()
+        # First/last access per user, host and activity type
+        summary = summarize_attack_chain(cross_system, backend=engine.backend)
+        engine.stage('summarize', summary)
+        return attack_chain_alerts(summary, now, min_hosts, min_days)
     except Exception as e:
         print(f"Error in detect_cross_system_attack_chain: {str(e)}")
         traceback.print_exc()
         return pd.DataFrame()
+
+# --------------------------------------------------------------------------------------------
+# INSTRUMENTATION: STAGE TIMINGS, ROW COUNTS AND MEMORY PEAKS
+# --------------------------------------------------------------------------------------------
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far (None where unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class DetectorProfile:
+    """
+    Stage timings, row counts and memory peaks of detector runs.
+    
+    run() calls a detector and records its wall-clock time, input and output
+    row counts and the process peak RSS afterwards; with `trace_memory` it also
+    records the tracemalloc peak of the call (slower). Detectors mark the end
+    of each stage through DetectionEngine.stage(); the time after the last
+    mark is recorded as the 'alerts' stage.
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+        self._current = None
+        self._last_mark = None
+    
+    def run(self, name, detector, df, **kwargs):
+        """Call detector(df, **kwargs) and record its profile"""
+        record = {
+            'detector': name,
+            'input_rows': len(df),
+            'output_rows': None,
+            'seconds': None,
+            'stages': [],
+            'tracemalloc_peak_bytes': None,
+            'rss_peak_bytes': None
+        }
+        self.records.append(record)
+        
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self.trace_memory:
+            tracemalloc.reset_peak()
+        
+        self._current = record
+        start = self._last_mark = time.perf_counter()
+        try:
+            result = detector(df, **kwargs)
+            self.stage('alerts', result)
+            record['output_rows'] = len(result)
+            return result
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if self.trace_memory:
+                record['tracemalloc_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            record['rss_peak_bytes'] = peak_rss_bytes()
+            self._current = None
+    
+    def stage(self, name, rows):
+        """End a stage of the running detector: time since the previous mark and rows produced"""
+        if self._current is None:
+            return
+        now = time.perf_counter()
+        self._current['stages'].append({
+            'stage': name,
+            'rows': len(rows),
+            'seconds': now - self._last_mark
+        })
+        self._last_mark = now
+    
+    def to_dict(self):
+        return {
+            'detectors': self.records,
+            'total_seconds': sum(record['seconds'] or 0 for record in self.records)
+        }
+    
+    def to_json(self, indent=2):
+        return json.dumps(self.to_dict(), indent=indent)
+    
+    def summary_table(self):
+        """Text table with one line per detector followed by its stages"""
+        def megabytes(value):
+            return '-' if value is None else f"{value / 1048576:.1f}"
+        
+        def count(value):
+            return '-' if value is None else f"{value:,}"
+        
+        lines = [f"{'detector / stage':<28} {'rows in':>12} {'rows out':>12} {'seconds':>9} "
+                 f"{'traced MB':>10} {'RSS MB':>9}"]
+        for record in self.records:
+            seconds = '-' if record['seconds'] is None else f"{record['seconds']:.3f}"
+            lines.append(f"{record['detector']:<28} {count(record['input_rows']):>12} "
+                         f"{count(record['output_rows']):>12} {seconds:>9} "
+                         f"{megabytes(record['tracemalloc_peak_bytes']):>10} "
+                         f"{megabytes(record['rss_peak_bytes']):>9}")
+            for stage in record['stages']:
+                lines.append(f"  {stage['stage']:<26} {'':>12} {count(stage['rows']):>12} "
+                             f"{stage['seconds']:>9.3f}")
+        return '\n'.join(lines)
+
+# --------------------------------------------------------------------------------------------
+# DETECTION ENGINE: RUN ALL DETECTORS OVER SHARED INTERMEDIATES
+# --------------------------------------------------------------------------------------------
+
+# Columns carried into the exploded remote_ip table
+EXPLODED_COLUMNS = ['hostname', 'os_type', 'pid', 'name', 'timestamp', 'conn_count', 'outbound_bytes']
+
+def explode_remote_ips(rows, day_keys=None):
+    """
+    Rows with at least one remote IP, exploded to one row per (row, remote_ip)
+    with the row's day key (midnight timestamp)
+    """
+    if day_keys is None:
+        day_keys = rows['timestamp'].dt.normalize()
+    has_ips = rows['remote_ips'].apply(lambda x: isinstance(x, list) and len(x) > 0).astype(bool)
+    columns = [col for col in EXPLODED_COLUMNS if col in rows.columns]
+    
+    exploded = rows.loc[has_ips, columns + ['remote_ips']].assign(day=day_keys[has_ips])
+    return exploded.explode('remote_ips').rename(columns={'remote_ips': 'remote_ip'})
+
+# Multiplier combining the hashes of several values into one
+HASH_MULTIPLIER = np.uint64(0x100000001b3)
+
+def _hash_list_rows(values):
+    """Hashes of a column of lists, combining the hashes of their items in order"""
+    items = pd.Series(values.to_numpy(), copy=False).explode()
+    rows = items.index.to_numpy()
+    item_hashes = hash_rows(items.reset_index(drop=True))
+    
+    # Every row has at least one item (empty lists explode to a missing value)
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    offsets = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    return np.add.reduceat(item_hashes * np.power(HASH_MULTIPLIER, offsets.astype(np.uint64)), starts)
+
+def hash_rows(values):
+    """
+    Stable 64-bit hash of every value of a column (equal for an object column
+    and its categorical version); lists are hashed by their items, empty
+    lists like missing values
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories.to_numpy(dtype=object)
+    elif values.dtype == object:
+        try:
+            codes, uniques = pd.factorize(values.to_numpy())
+        except TypeError:
+            return _hash_list_rows(values)
+    else:
+        return pd.util.hash_array(values.to_numpy())
+    # Hash the distinct values once; missing values (code -1) take the hash of the appended None
+    value_hashes = pd.util.hash_array(np.append(uniques, None), categorize=False)
+    return value_hashes[codes]
+
+def time_ordered(df):
+    """
+    Rows of a frame in timestamp order (stable, so rows with equal timestamps
+    keep their order; rows without a timestamp last). A frame that is already
+    in time order (or has no timestamp column) is returned as it is.
+    """
+    if 'timestamp' not in df.columns:
+        return df
+    timestamps = df['timestamp']
+    valid = int(timestamps.notna().sum())
+    if timestamps.iloc[:valid].is_monotonic_increasing and timestamps.iloc[valid:].isna().all():
+        return df
+    order = np.argsort(timestamps.to_numpy(), kind='stable')  # NaT sorts last
+    return df.take(order).reset_index(drop=True)
+
+class DetectionEngine:
+    """
+    Run several detectors over one loaded frame, sharing their common work.
+    
+    The reference time is fixed once, and intermediates every detector used to
+    rebuild on its own (lookback-window slices, per-day keys, the table of
+    rows exploded by remote_ip) are built lazily and memoized. The shared
+    frames are read-only; detectors copy whatever subset they modify.
+    
+    With a DetectorProfile, run() records per-detector timings, row counts
+    and memory peaks, and the stages detectors mark with stage(). `backend`
+    ('pandas', 'polars' or 'duckdb', see detection_backends.py) runs the
+    detectors' grouped aggregations. With `rollups` (a RollupStore, see
+    telemetry_rollups.py) the built-in detectors read the days of their
+    window that have precomputed daily summaries from those. With
+    `result_cache` (a DetectorResultCache, see detector_cache.py) the alerts
+    of the built-in detectors are read back when their input window and
+    parameters are unchanged. Given a TelemetryStore (see telemetry_store.py)
+    instead of a frame, lookback windows are binary-searched views of the
+    time-sorted telemetry.
+    
+    The detectors read the telemetry in time order (see time_ordered()), so
+    the rows a tie resolves to (e.g. a file's first execution among several
+    in one second) do not depend on how the frame was assembled, and the
+    rollups, which summarize each day on its own, give the same alerts.
+    """
+    def __init__(self, df, now=None, profile=None, backend='pandas', rollups=None, result_cache=None):
+        self.store = df if isinstance(df, TelemetryStore) else None
+        self.df = df.df if self.store is not None else time_ordered(df)
+        self.now = datetime.now() if now is None else now
+        self.profile = profile
+        self.backend = get_backend(backend)
+        self.rollups = rollups
+        self.result_cache = result_cache
+        self.detectors = {}
+        self._cache = {}
+    
+    def _memoize(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+    
+    def lookback_start(self, days):
+        """Start of a lookback window of `days` days ending at the reference time"""
+        return self.now - timedelta(days=days)
+    
+    def window(self, lookback_days):
+        """Rows with a timestamp inside the lookback window"""
+        def build():
+            if self.store is not None:
+                return self.store.window(self.lookback_start(lookback_days))
+            return self.df[self.df['timestamp'] >= self.lookback_start(lookback_days)]
+        return self._memoize(('window', lookback_days), build)
+    
+    def split(self, rows, at):
+        """Rows of a window with a timestamp up to `at` (inclusive), and those after it"""
+        if self.store is not None:
+            return self.store.split(rows, at)
+        is_before = rows['timestamp'] <= at
+        return rows[is_before], rows[~is_before]
+    
+    def day_keys(self, lookback_days):
+        """Calendar day (midnight timestamp) of each row in the lookback window"""
+        return self._memoize(('day_keys', lookback_days),
+                             lambda: self.window(lookback_days)['timestamp'].dt.normalize())
+    
+    def exploded_remote_ips(self, lookback_days):
+        """
+        Rows of the lookback window with at least one remote IP, exploded to one
+        row per (row, remote_ip) with the row's day key
+        """
+        return self._memoize(('exploded_remote_ips', lookback_days),
+                             lambda: explode_remote_ips(self.window(lookback_days), self.day_keys(lookback_days)))
+    
+    def row_hashes(self, column):
+        """Stable hash of every row of a column of the frame (see hash_rows())"""
+        return self._memoize(('row_hashes', column), lambda: hash_rows(self.df[column]))
+    
+    def stage(self, name, rows):
+        """Mark the end of a detector stage that produced `rows` (no-op unless profiling)"""
+        if self.profile is not None:
+            self.profile.stage(name, rows)
+    
+    def with_rollups(self, detector):
+        """A detector function reading the engine's rollups, if it has rollups for it"""
+        if self.rollups is None:
+            return detector
+        return self.rollups.detector_for(detector) or detector
+    
+    def detector_for(self, detector):
+        """
+        The function run for a detector: reading the engine's rollups if it has
+        rollups for it, otherwise with its results cached if the engine has a
+        result cache
+        """
+        run = self.with_rollups(detector)
+        if run is not detector or self.result_cache is None:
+            return run
+        return self.result_cache.detector_for(detector) or detector
+    
+    def register(self, name, detector, **params):
+        """Register a detector function (called as detector(df, **params, engine=self))"""
+        self.detectors[name] = (detector, params)
+        return self
+    
+    def register_defaults(self):
+        """Register the six built-in detectors with their default parameters"""
+        for name, detector in DEFAULT_DETECTORS:
+            self.register(name, detector)
+        return self
+    
+    def run(self, names=None):
+        """
+        Run the registered detectors (all of them unless `names` is given).
+        Returns a dict of detector name -> alert DataFrame.
+        """
+        if not self.detectors:
+            self.register_defaults()
+        
+        results = {}
+        for name in (names or list(self.detectors)):
+            detector, params = self.detectors[name]
+            detector = self.detector_for(detector)
+            try:
+                if self.profile is not None:
+                    results[name] = self.profile.run(name, detector, self.df, engine=self, **params)
+                else:
+                    results[name] = detector(self.df, engine=self, **params)
+            except Exception as e:
+                print(f"Error in {name}: {str(e)}")
+                results[name] = pd.DataFrame()
+        return results
+
+def _engine_for(df, now=None, engine=None):
+    """Engine whose shared intermediates a detector call should use"""
+    return DetectionEngine(df, now=now) if engine is None else engine
+
+# Built-in detectors in the order they are reported
+DEFAULT_DETECTORS = [
+    ('long_dwell', detect_long_dwell_time),
+    ('beaconing', detect_beaconing),
+    ('weekend_exfil', detect_weekend_exfiltration),
+    ('recon', detect_distributed_reconnaissance),
+    ('service_account', detect_service_account_anomaly),
+    ('attack_chain', detect_cross_system_attack_chain),
+]
@@ -0,0 +1,442 @@
+"""
+incremental_detect.py - Incremental (stateful) detectors over a sliding window
+
+The detectors in full_detect.py recompute everything from the lookback window
+(30-120 days) on each call. The classes here keep compact per-key, per-day
+state instead: update(batch) folds a batch of newly normalized telemetry into
+the state, expire(before_ts) drops the days that left the window, and
+alerts(now) evaluates the detector from the state alone.
+
+State per detector:
+    dwell time        first seen / first active / first execution per (hostname, exe_path, day)
+    beaconing         connection and off-hours counts per (hostname, pid, name, remote_ip, day)
+    weekend exfil     outbound bytes per (process, remote_ip, day) and per-process byte sums
+    reconnaissance    first/last seen per (category, hostname, user, cmdline, day)
+    service account   first/last seen per (user, hostname, day)
+    attack chain      first/last access per (user, hostname, activity_type, day)
+
+update() also keeps the rows it folds in, projected to the detector's
+COLUMNS, by day. The day containing now - lookback_days is summarized again
+from its rows at or after that time, so alerts(now) are exactly those of the
+full detector run at `now` over the same telemetry, at any time of day.
+expire(before_ts) drops the state and rows of the days before the one
+containing before_ts. Tables folded in with fold() (e.g. precomputed rollups)
+come without rows: their days count from midnight.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from full_detect import (
+    NO_SEQUENCE,
+    ATTACK_CHAIN_FLAGS,
+    explode_remote_ips,
+    summarize_dwell_files,
+    dwell_time_alerts,
+    summarize_beaconing,
+    beaconing_alerts,
+    weekend_traffic_rows,
+    summarize_weekend_traffic,
+    weekend_exfiltration_alerts,
+    classify_recon_commands,
+    recon_alerts,
+    is_service_account,
+    service_account_alerts,
+    initial_access_mask,
+    activity_types,
+    summarize_attack_chain,
+    attack_chain_alerts
+)
+
+# Columns of the state tables numbering rows in stream order
+SEQUENCE_COLUMNS = ['first_seq', 'exec_seq', 'first_ts_seq', 'last_ts_seq']
+
+def shift_sequence(table, offset):
+    """
+    A state table with its sequence numbers moved `offset` rows on, or by
+    an array of per-row offsets (NO_SEQUENCE stays)
+    """
+    for col in SEQUENCE_COLUMNS:
+        if np.any(offset) and col in table.columns:
+            values = table[col].to_numpy()
+            table = table.assign(**{col: np.where(values == NO_SEQUENCE, values, values + offset)})
+    return table
+
+def _first_rows(table, keys, order, ascending=True):
+    """First row of each key group after sorting by `order` (NaN keys form groups)"""
+    return table.sort_values(order, ascending=ascending, kind='stable').drop_duplicates(keys)
+
+def merge_dwell_files(files, keys):
+    """Merge summarize_dwell_files() tables (e.g. of several batches or days) over `keys`"""
+    merged = files.groupby(keys, sort=False, observed=True).agg(
+        first_seen=('first_seen', 'min'),
+        first_active=('first_active', 'min'),
+        is_suspicious_name=('is_suspicious_name', 'any'),
+        first_seq=('first_seq', 'min')
+    ).reset_index()
+    
+    # Process details come from the first execution overall
+    executions = _first_rows(files, keys, 'exec_seq')[keys + ['exec_seq', 'pid', 'name']]
+    return merged.merge(executions, on=keys, how='left')
+
+def merge_attack_chain(summary, keys):
+    """Merge summarize_attack_chain() tables (e.g. of several batches or days) over `keys`"""
+    aggregations = {'first_seq': ('first_seq', 'min')}
+    if 'is_initial_access' in summary.columns:
+        aggregations['is_initial_access'] = ('is_initial_access', 'any')
+    merged = summary.groupby(keys, sort=False, dropna=False, observed=True).agg(**aggregations).reset_index()
+    
+    # Earliest and latest access overall (the first in stream order among equal timestamps)
+    first = _first_rows(summary, keys, ['first_ts', 'first_ts_seq'])
+    last = _first_rows(summary, keys, ['last_ts', 'last_ts_seq'], ascending=[False, True])
+    return merged.merge(
+        first[keys + ['first_ts', 'first_ts_seq']], on=keys, how='left'
+    ).merge(
+        last[keys + ['last_ts', 'last_ts_seq']], on=keys, how='left'
+    )
+
+class IncrementalDetector:
+    """
+    Base class of the incremental detectors.
+    
+    Subclasses summarize a batch into one or more per-day tables (each with a
+    'day' column) and merge tables of the same kind; the base class appends
+    batches, numbers their rows in stream order and expires old days.
+    """
+    # Default lookback window, in days
+    lookback_days = 60
+    
+    # Columns the detector reads (None keeps every column of the rows)
+    COLUMNS = None
+    
+    def __init__(self, lookback_days=None, **params):
+        if lookback_days is not None:
+            self.lookback_days = lookback_days
+        self.params = params
+        self.rows_seen = 0
+        self.state = {}
+        # Rows of update() batches per day, numbered in stream order, to cut a window's first day
+        self.day_rows = {}
+    
+    def _summarize(self, batch, seq):
+        """Per-day tables of one batch, as a dict of table name -> DataFrame"""
+        raise NotImplementedError
+    
+    def _merge(self, name, table):
+        """Merge duplicate (key, day) entries of a state table"""
+        raise NotImplementedError
+    
+    def _alerts(self, state, now):
+        """Alerts from the state tables restricted to the window days"""
+        raise NotImplementedError
+    
+    def summarize(self, batch):
+        """
+        Per-day tables of a batch of normalized telemetry, its rows numbered
+        from 0 (see fold())
+        """
+        batch = batch[batch['timestamp'].notna()]
+        if batch.empty:
+            return {}
+        return self._summarize(batch, np.arange(len(batch)))
+    
+    def fold(self, tables, rows):
+        """
+        Fold per-day tables summarizing the next `rows` rows of the stream
+        (e.g. of summarize(), or precomputed rollups) into the state. Their
+        sequence numbers count from the first of those rows.
+        """
+        for name, table in tables.items():
+            table = shift_sequence(table, self.rows_seen)
+            if name in self.state:
+                table = self._merge(name, pd.concat([self.state[name], table], ignore_index=True))
+            self.state[name] = table
+        self.rows_seen += rows
+        return self
+    
+    def update(self, batch):
+        """
+        Fold a batch of normalized telemetry (see preprocess_data()) into the
+        state, keeping its rows for the windows starting on their day
+        """
+        batch = batch[batch['timestamp'].notna()]
+        columns = batch.columns if self.COLUMNS is None else [col for col in self.COLUMNS if col in batch.columns]
+        rows = batch[columns].set_axis(pd.RangeIndex(self.rows_seen, self.rows_seen + len(batch)))
+        day_keys = rows['timestamp'].dt.normalize()
+        for day, positions in day_keys.groupby(day_keys.to_numpy()).indices.items():
+            self.day_rows.setdefault(pd.Timestamp(day), []).append(rows.iloc[positions])
+        return self.fold(self.summarize(batch), len(batch))
+    
+    def expire(self, before_ts):
+        """Drop the state and rows of the days before the day containing `before_ts`"""
+        cutoff = pd.Timestamp(before_ts).normalize()
+        for name, table in self.state.items():
+            self.state[name] = table[table['day'] >= cutoff].reset_index(drop=True)
+        for day in [day for day in self.day_rows if day < cutoff]:
+            del self.day_rows[day]
+        return self
+    
+    def window_start(self, now, lookback_days=None):
+        """First day of the lookback window ending at `now`"""
+        days = self.lookback_days if lookback_days is None else lookback_days
+        return pd.Timestamp(now - timedelta(days=days)).normalize()
+    
+    def first_day_tables(self, start):
+        """
+        Per-day tables of the rows kept for the day containing `start`, from
+        `start` on (None when that day has no rows kept)
+        """
+        day = pd.Timestamp(start).normalize()
+        if day not in self.day_rows:
+            return None
+        parts = self.day_rows[day]
+        if len(parts) > 1:
+            parts[:] = [pd.concat(parts)]
+        rows = parts[0][parts[0]['timestamp'] >= start]
+        return self._summarize(rows, rows.index.to_numpy()) if len(rows) else {}
+    
+    def alerts(self, now=None):
+        """Evaluate the detector over the lookback window ending at `now`"""
+        now = datetime.now() if now is None else now
+        start = pd.Timestamp(now - timedelta(days=self.lookback_days))
+        first_day = start.normalize()
+        state = {name: table[table['day'] >= first_day] for name, table in self.state.items()}
+        
+        # The window starts within its first day: only that day's rows from the start count
+        first_tables = self.first_day_tables(start) if start > first_day else None
+        if first_tables is not None:
+            state = {name: pd.concat([table[table['day'] > first_day]] +
+                                     ([first_tables[name]] if name in first_tables else []), ignore_index=True)
+                     for name, table in state.items()}
+        if not state:
+            return pd.DataFrame()
+        return self._alerts(state, now)
+    
+    def state_rows(self):
+        """Number of rows held in the state tables"""
+        return sum(len(table) for table in self.state.values())
+
+class IncrementalDwellTime(IncrementalDetector):
+    """Long-dwell detection (see detect_long_dwell_time) from per-file daily summaries"""
+    lookback_days = 90
+    COLUMNS = ['hostname', 'timestamp', 'exe_path', 'pid', 'name']
+    
+    def _summarize(self, batch, seq):
+        return {'files': summarize_dwell_files(batch, seq, by_day=True)}
+    
+    def _merge(self, name, table):
+        return merge_dwell_files(table, ['hostname', 'exe_path', 'day'])
+    
+    def _alerts(self, state, now):
+        files = merge_dwell_files(state['files'], ['hostname', 'exe_path'])
+        return dwell_time_alerts(files, now, **self.params)
+
+class IncrementalBeaconing(IncrementalDetector):
+    """Beaconing detection (see detect_beaconing) from daily connection counts"""
+    lookback_days = 60
+    COLUMNS = ['hostname', 'timestamp', 'pid', 'name', 'conn_count', 'outbound_bytes', 'remote_ips']
+    KEYS = ['hostname', 'pid', 'name', 'day', 'remote_ip']
+    
+    def _summarize(self, batch, seq):
+        return {'daily': summarize_beaconing(explode_remote_ips(batch))}
+    
+    def _merge(self, name, table):
+        return table.groupby(self.KEYS, observed=True)[['connection_count', 'off_hours_count']].sum().reset_index()
+    
+    def _alerts(self, state, now):
+        return beaconing_alerts(state['daily'], now, **self.params)
+
+class IncrementalWeekendExfiltration(IncrementalDetector):
+    """Weekend exfiltration detection (see detect_weekend_exfiltration) from daily traffic"""
+    lookback_days = 60
+    COLUMNS = ['hostname', 'timestamp', 'os_type', 'pid', 'name', 'outbound_bytes', 'remote_ips']
+    TRAFFIC_KEYS = ['hostname', 'os_type', 'pid', 'name', 'day', 'is_weekend', 'remote_ips']
+    PROCESS_KEYS = ['hostname', 'name', 'pid']
+    
+    def _summarize(self, batch, seq):
+        traffic = summarize_weekend_traffic(explode_remote_ips(batch)).rename(columns={'event_date': 'day'})
+        
+        # Per-process byte sums and row counts, for the baseline average
+        rows = weekend_traffic_rows(batch)
+        processes = rows.assign(day=rows['timestamp'].dt.normalize()).groupby(
+            self.PROCESS_KEYS + ['day'], observed=True
+        )['outbound_bytes'].agg(outbound_sum='sum', outbound_count='count').reset_index()
+        return {'traffic': traffic, 'processes': processes}
+    
+    def _merge(self, name, table):
+        if name == 'traffic':
+            return table.groupby(self.TRAFFIC_KEYS, observed=True)['daily_outbound'].sum().reset_index()
+        return table.groupby(self.PROCESS_KEYS + ['day'], observed=True)[
+            ['outbound_sum', 'outbound_count']
+        ].sum().reset_index()
+    
+    def _alerts(self, state, now):
+        if state['processes'].empty:
+            return pd.DataFrame()
+        
+        # Baseline traffic per process over the window
+        totals = state['processes'].groupby(self.PROCESS_KEYS, observed=True)[
+            ['outbound_sum', 'outbound_count']
+        ].sum()
+        process_baseline = (totals['outbound_sum'] / totals['outbound_count']).rename('avg_daily_outbound').reset_index()
+        
+        daily_traffic_agg = state['traffic'].rename(columns={'day': 'event_date'})
+        return weekend_exfiltration_alerts(daily_traffic_agg, process_baseline, now)
+
+class IncrementalReconnaissance(IncrementalDetector):
+    """Distributed reconnaissance detection (see detect_distributed_reconnaissance)"""
+    lookback_days = 30
+    COLUMNS = ['hostname', 'timestamp', 'user', 'cmdline']
+    KEYS = ['command_category', 'hostname', 'user', 'cmdline', 'day']
+    
+    def _summarize(self, batch, seq):
+        is_recon, categories = classify_recon_commands(batch['cmdline'])
+        recon_data = batch[is_recon]
+        commands = recon_data[['hostname', 'user', 'cmdline', 'timestamp']].assign(
+            command_category=categories[is_recon],
+            day=recon_data['timestamp'].dt.normalize()
+        )
+        return {'commands': commands.groupby(self.KEYS, observed=True)['timestamp'].agg(
+            first_seen='min', last_seen='max'
+        ).reset_index()}
+    
+    def _merge(self, name, table):
+        return table.groupby(self.KEYS, observed=True).agg(
+            first_seen=('first_seen', 'min'),
+            last_seen=('last_seen', 'max')
+        ).reset_index()
+    
+    def _alerts(self, state, now):
+        systems_recon = state['commands'].groupby(['command_category', 'hostname', 'user'], observed=True).agg(
+            first_seen=('first_seen', 'min'),
+            last_seen=('last_seen', 'max'),
+            command_count=('cmdline', 'nunique')
+        ).reset_index()
+        return recon_alerts(systems_recon, now)
+
+class IncrementalServiceAccount(IncrementalDetector):
+    """
+    Service-account anomaly detection (see detect_service_account_anomaly).
+    
+    First/last seen timestamps per (user, hostname, day) place a host in the
+    baseline and/or recent period exactly, even on the day the periods meet.
+    """
+    lookback_days = 120
+    COLUMNS = ['hostname', 'timestamp', 'user']
+    KEYS = ['user', 'hostname', 'day']
+    
+    def __init__(self, baseline_days=90, recent_days=30):
+        super().__init__(lookback_days=baseline_days + recent_days)
+        self.recent_days = recent_days
+    
+    def _summarize(self, batch, seq):
+        is_service = is_service_account(batch['user']).to_numpy()
+        rows = batch[is_service]
+        hosts = pd.DataFrame({
+            'user': rows['user'].to_numpy(),
+            'hostname': rows['hostname'].to_numpy(),
+            'day': rows['timestamp'].dt.normalize().to_numpy(),
+            'timestamp': rows['timestamp'].to_numpy(),
+            'seq': seq[is_service]
+        })
+        return {'hosts': hosts.groupby(self.KEYS, sort=False, dropna=False, observed=True).agg(
+            first_seen=('timestamp', 'min'),
+            last_seen=('timestamp', 'max'),
+            first_seq=('seq', 'min')
+        ).reset_index()}
+    
+    def _merge(self, name, table):
+        return table.groupby(self.KEYS, sort=False, dropna=False, observed=True).agg(
+            first_seen=('first_seen', 'min'),
+            last_seen=('last_seen', 'max'),
+            first_seq=('first_seq', 'min')
+        ).reset_index()
+    
+    def _alerts(self, state, now):
+        hosts = state['hosts']
+        baseline_end = now - timedelta(days=self.recent_days)
+        
+        # Only the window start cuts into the first day; the periods meet at baseline_end
+        start = now - timedelta(days=self.lookback_days)
+        hosts = hosts[hosts['last_seen'] >= start]
+        baseline_hosts = hosts[hosts['first_seen'] <= baseline_end][['user', 'hostname']]
+        recent = hosts[hosts['last_seen'] > baseline_end]
+        
+        recent_hosts = recent.groupby(['user', 'hostname'], sort=False, dropna=False, observed=True).agg(
+            first_seen=('first_seen', 'min'),
+            last_seen=('last_seen', 'max'),
+            first_seq=('first_seq', 'min')
+        ).reset_index().sort_values('first_seq', kind='stable')
+        return service_account_alerts(baseline_hosts, recent_hosts, now)
+
+class IncrementalAttackChain(IncrementalDetector):
+    """Cross-system attack chain detection (see detect_cross_system_attack_chain)"""
+    lookback_days = 60
+    COLUMNS = ['hostname', 'timestamp', 'user', 'name', 'cmdline', 'conn_count'] + ATTACK_CHAIN_FLAGS
+    KEYS = ['user', 'hostname', 'activity_type']
+    
+    def _summarize(self, batch, seq):
+        has_user = batch['user'].notna().to_numpy()
+        rows = batch[has_user].assign(activity_type=lambda rows: activity_types(rows))
+        return {'activity': summarize_attack_chain(
+            rows, seq[has_user], by_day=True, initial_access=initial_access_mask(rows)
+        )}
+    
+    def _merge(self, name, table):
+        return merge_attack_chain(table, self.KEYS + ['day'])
+    
+    def _alerts(self, state, now):
+        activity = state['activity']
+        
+        # Users involved in initial access within the window
+        users = activity.loc[activity['is_initial_access'], 'user'].unique()
+        if len(users) == 0:
+            return pd.DataFrame()
+        
+        summary = merge_attack_chain(activity[activity['user'].isin(users)], self.KEYS)
+        return attack_chain_alerts(summary, now, **self.params)
+
+# Incremental detectors in the order of full_detect.DEFAULT_DETECTORS
+INCREMENTAL_DETECTORS = [
+    ('long_dwell', IncrementalDwellTime),
+    ('beaconing', IncrementalBeaconing),
+    ('weekend_exfil', IncrementalWeekendExfiltration),
+    ('recon', IncrementalReconnaissance),
+    ('service_account', IncrementalServiceAccount),
+    ('attack_chain', IncrementalAttackChain),
+]
+
+class IncrementalDetectionEngine:
+    """Feed batches to every incremental detector and collect their alerts"""
+    def __init__(self, detectors=None):
+        if detectors is None:
+            detectors = {name: detector_class() for name, detector_class in INCREMENTAL_DETECTORS}
+        self.detectors = detectors
+    
+    def update(self, batch):
+        for detector in self.detectors.values():
+            detector.update(batch)
+        return self
+    
+    def expire(self, before_ts=None, now=None):
+        """
+        Expire old state: before `before_ts` if given, otherwise before each
+        detector's own lookback window ending at `now`
+        """
+        now = datetime.now() if now is None else now
+        for detector in self.detectors.values():
+            detector.expire(detector.window_start(now) if before_ts is None else before_ts)
+        return self
+    
+    def run(self, now=None, names=None):
+        """Alerts of the detectors (all of them unless `names` is given) at `now`"""
+        now = datetime.now() if now is None else now
+        results = {}
+        for name in (names or list(self.detectors)):
+            try:
+                results[name] = self.detectors[name].alerts(now)
+            except Exception as e:
+                print(f"Error in {name}: {str(e)}")
+                results[name] = pd.DataFrame()
+        return results
@@ -0,0 +1,387 @@
+"""
+ingest_service.py - Streaming ingest of agent telemetry into the incremental detectors
+
+An asyncio service accepting newline-delimited JSON telemetry, one record per
+line in the column schema of synthetic_data.csv (list columns as JSON arrays
+or as the JSON strings of the CSV export):
+
+    NDJSON stream   TCP (--port) or a Unix socket (--unix), one connection per agent
+    HTTP            POST /telemetry (--http-port) with an NDJSON body
+
+Records are micro-batched, by size (batch_size records) or age (batch_interval
+seconds since the first record of the batch), normalized with the same rules
+as load_data() (preprocess_data()) and folded into the incremental detectors
+(incremental_detect.py), which report alerts every detect_interval seconds.
+
+Backpressure: records wait in a bounded queue (max_queue records). When the
+detectors fall behind, the queue fills up and the connections stop being
+read, so agents are throttled by TCP flow control (HTTP requests wait for
+room before they are answered) instead of the process buffering a burst.
+Connections are read a line at a time (HTTP bodies a chunk at a time, each
+line queued as soon as it is complete), so a connection holds at most one
+line of max_line_bytes beyond the queue, and at most max_http_requests
+HTTP requests are read at once (the others wait unread). Longer lines are
+rejected.
+
+Usage:
+    python ingest_service.py [--host HOST] [--port PORT] [--unix PATH] [--http-port PORT]
+                             [--batch-size N] [--batch-interval SECONDS] [--max-queue N]
+                             [--max-http-requests N] [--detect-interval SECONDS]
+"""
+import argparse
+import asyncio
+import json
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from full_detect import LIST_COLUMNS, preprocess_data
+from incremental_detect import IncrementalDetectionEngine
+from partitioned_detect import DETECTOR_COLUMNS
+
+# Records per micro-batch, and the longest a record waits for its batch to fill up
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_BATCH_INTERVAL = 1.0
+
+# Records waiting for a batch (the bound that throttles agents)
+DEFAULT_MAX_QUEUE = 20000
+
+# Seconds between detection runs
+DEFAULT_DETECT_INTERVAL = 60.0
+
+# Longest accepted NDJSON line, and HTTP request body
+DEFAULT_MAX_LINE_BYTES = 1 << 20
+MAX_HTTP_BODY_BYTES = 16 << 20
+
+# HTTP requests read at once, and the size of the body reads
+DEFAULT_MAX_HTTP_REQUESTS = 64
+HTTP_READ_CHUNK_BYTES = 64 << 10
+
+# Seconds open connections get to finish when the service stops
+DEFAULT_DRAIN_TIMEOUT = 30.0
+
+# Queue item ending the batcher
+_STOP = object()
+
+def records_to_frame(records):
+    """
+    Normalized telemetry frame of JSON records, as load_data() normalizes the
+    CSV export: list columns sent as JSON arrays are encoded as in the CSV,
+    and the detector columns a record leaves out are empty
+    """
+    df = pd.DataFrame.from_records(records)
+    for col in dict.fromkeys(col for columns in DETECTOR_COLUMNS.values() for col in columns):
+        if col not in df.columns:
+            df[col] = None
+    for col in LIST_COLUMNS:
+        if col in df.columns:
+            df[col] = [json.dumps(x) if isinstance(x, (list, dict)) else x for x in df[col]]
+    return preprocess_data(df)
+
+def print_alerts(results):
+    """Default alert sink: one line per detector with alerts"""
+    for name, alerts in results.items():
+        if len(alerts):
+            print(f"[{datetime.now().isoformat(timespec='seconds')}] {name}: {len(alerts)} alerts")
+
+class IngestService:
+    """
+    Accept NDJSON telemetry, micro-batch it through a bounded queue and fold
+    the batches into an IncrementalDetectionEngine.
+    
+    `on_alerts(results)` receives the detector results of every detection
+    run; `clock()` gives the reference time of detection (datetime.now by
+    default). Counters are kept in `stats`.
+    """
+    def __init__(self, engine=None, batch_size=DEFAULT_BATCH_SIZE, batch_interval=DEFAULT_BATCH_INTERVAL,
+                 max_queue=DEFAULT_MAX_QUEUE, detect_interval=DEFAULT_DETECT_INTERVAL,
+                 max_line_bytes=DEFAULT_MAX_LINE_BYTES, max_http_requests=DEFAULT_MAX_HTTP_REQUESTS,
+                 on_alerts=print_alerts, clock=datetime.now):
+        self.engine = engine if engine is not None else IncrementalDetectionEngine()
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_queue = max_queue
+        self.detect_interval = detect_interval
+        self.max_line_bytes = max_line_bytes
+        self.max_http_requests = max_http_requests
+        self.on_alerts = on_alerts
+        self.clock = clock
+        self.results = {}
+        self.stats = {'records': 0, 'rejected': 0, 'batches': 0, 'rows': 0, 'detections': 0,
+                      'queue_high_water': 0}
+        self._queue = None
+        self._http_slots = None
+        self._servers = []
+        self._connections = set()
+        self._batcher = None
+        # One worker: batches are folded into the detector state in order
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._last_detection = None
+    
+    # ----------------------------------------------------------------------------------------
+    # Intake
+    # ----------------------------------------------------------------------------------------
+    
+    async def submit(self, record):
+        """Queue one record, waiting while the queue is full"""
+        await self._queue.put(record)
+        self.stats['records'] += 1
+        self.stats['queue_high_water'] = max(self.stats['queue_high_water'], self._queue.qsize())
+    
+    async def submit_line(self, line):
+        """Queue the record of one NDJSON line (blank lines are skipped); False if rejected"""
+        line = line.strip()
+        if not line:
+            return True
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            self.stats['rejected'] += 1
+            return False
+        await self.submit(record)
+        return True
+    
+    async def handle_stream(self, reader, writer):
+        """One NDJSON connection: read records until the agent closes it"""
+        self._connections.add(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError as e:
+                    # Last record without a trailing newline
+                    await self.submit_line(e.partial)
+                    break
+                except asyncio.LimitOverrunError:
+                    self.stats['rejected'] += 1
+                    print(f"Warning: NDJSON line over {self.max_line_bytes} bytes, closing connection")
+                    break
+                await self.submit_line(line)
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.discard(asyncio.current_task())
+            writer.close()
+    
+    async def submit_body(self, reader, length):
+        """
+        Queue the records of an NDJSON request body of `length` bytes, read a
+        chunk at a time; returns the (accepted, rejected) record counts, or
+        None when a line is longer than max_line_bytes
+        """
+        accepted = rejected = 0
+        remaining = length
+        partial = b''
+        while remaining > 0:
+            chunk = await reader.read(min(remaining, HTTP_READ_CHUNK_BYTES))
+            if not chunk:
+                raise asyncio.IncompleteReadError(partial, remaining)
+            remaining -= len(chunk)
+            *lines, partial = (partial + chunk).split(b'\n')
+            if not remaining:
+                # Last record without a trailing newline
+                lines.append(partial)
+                partial = b''
+            if len(partial) > self.max_line_bytes or any(len(line) > self.max_line_bytes for line in lines):
+                self.stats['rejected'] += 1
+                return None
+            for line in lines:
+                if not line.strip():
+                    continue
+                if await self.submit_line(line):
+                    accepted += 1
+                else:
+                    rejected += 1
+        return accepted, rejected
+    
+    async def _serve_http(self, reader, writer):
+        """Read one HTTP request, queue the records of its body and answer it"""
+        request_line = await reader.readline()
+        headers = {}
+        while True:
+            header = await reader.readline()
+            if header in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        
+        method, path = (request_line.decode('latin-1').split() + ['', ''])[:2]
+        length = int(headers.get('content-length', 0) or 0)
+        if method != 'POST' or path.split('?')[0] != '/telemetry':
+            status, body = '404 Not Found', {'error': 'POST /telemetry'}
+        elif length > MAX_HTTP_BODY_BYTES:
+            status, body = '413 Payload Too Large', {'error': f'body over {MAX_HTTP_BODY_BYTES} bytes'}
+        else:
+            counts = await self.submit_body(reader, length)
+            if counts is None:
+                status, body = '413 Payload Too Large', {'error': f'line over {self.max_line_bytes} bytes'}
+            else:
+                status, body = '202 Accepted', {'accepted': counts[0], 'rejected': counts[1]}
+        
+        content = json.dumps(body).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(content)}\r\nConnection: close\r\n\r\n".encode('latin-1') + content)
+        await writer.drain()
+    
+    async def handle_http(self, reader, writer):
+        """POST /telemetry with an NDJSON body (one request per connection)"""
+        self._connections.add(asyncio.current_task())
+        try:
+            # Requests beyond max_http_requests wait here, unread
+            async with self._http_slots:
+                await self._serve_http(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.discard(asyncio.current_task())
+            writer.close()
+    
+    # ----------------------------------------------------------------------------------------
+    # Micro-batching and detection
+    # ----------------------------------------------------------------------------------------
+    
+    def _process(self, records, detect):
+        """Normalize and fold a batch into the detectors, then run them if due (worker thread)"""
+        batch = records_to_frame(records) if records else None
+        if batch is not None:
+            self.engine.update(batch)
+        if detect:
+            now = self.clock()
+            self.engine.expire(now=now)
+            self.results = self.engine.run(now)
+        return 0 if batch is None else len(batch)
+    
+    async def _flush(self, records, force_detect=False):
+        loop = asyncio.get_running_loop()
+        due = (self._last_detection is None or
+               time.monotonic() - self._last_detection >= self.detect_interval)
+        detect = force_detect or due
+        try:
+            rows = await loop.run_in_executor(self._executor, self._process, records, detect)
+        except Exception as e:
+            print(f"Error in ingest batch: {str(e)}")
+            traceback.print_exc()
+            return
+        if records:
+            self.stats['batches'] += 1
+            self.stats['rows'] += rows
+        if detect:
+            self._last_detection = time.monotonic()
+            self.stats['detections'] += 1
+            if self.on_alerts is not None:
+                self.on_alerts(self.results)
+    
+    async def _run_batcher(self):
+        """Collect queued records into batches of batch_size, or older than batch_interval"""
+        records = []
+        deadline = None
+        while True:
+            if not self._queue.empty():
+                record = self._queue.get_nowait()
+            else:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    record = None
+            
+            if record is _STOP:
+                await self._flush(records, force_detect=True)
+                return
+            if record is not None:
+                if not records:
+                    deadline = time.monotonic() + self.batch_interval
+                records.append(record)
+            if records and (len(records) >= self.batch_size or time.monotonic() >= deadline):
+                await self._flush(records)
+                records = []
+                deadline = None
+    
+    # ----------------------------------------------------------------------------------------
+    # Lifecycle
+    # ----------------------------------------------------------------------------------------
+    
+    async def start(self, host='127.0.0.1', port=None, unix_path=None, http_port=None):
+        """Start the batcher and the listeners; returns the bound (host, port) of each TCP listener"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._http_slots = asyncio.Semaphore(self.max_http_requests)
+        self._batcher = asyncio.create_task(self._run_batcher())
+        addresses = {}
+        if port is not None:
+            server = await asyncio.start_server(self.handle_stream, host, port, limit=self.max_line_bytes)
+            self._servers.append(server)
+            addresses['stream'] = server.sockets[0].getsockname()[:2]
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_stream, unix_path, limit=self.max_line_bytes)
+            self._servers.append(server)
+            addresses['unix'] = unix_path
+        if http_port is not None:
+            server = await asyncio.start_server(self.handle_http, host, http_port, limit=self.max_line_bytes)
+            self._servers.append(server)
+            addresses['http'] = server.sockets[0].getsockname()[:2]
+        return addresses
+    
+    async def stop(self, drain_timeout=DEFAULT_DRAIN_TIMEOUT):
+        """
+        Stop accepting connections, let the open ones finish (for up to
+        drain_timeout seconds), fold the queued records in and run the
+        detectors once more
+        """
+        for server in self._servers:
+            server.close()
+        self._servers = []
+        if self._connections:
+            _, pending = await asyncio.wait(set(self._connections), timeout=drain_timeout)
+            for task in pending:
+                task.cancel()
+        if self._batcher is not None:
+            await self._queue.put(_STOP)
+            await self._batcher
+            self._batcher = None
+        self._executor.shutdown()
+        return self.results
+
+async def serve(args):
+    service = IngestService(batch_size=args.batch_size, batch_interval=args.batch_interval,
+                            max_queue=args.max_queue, max_http_requests=args.max_http_requests,
+                            detect_interval=args.detect_interval)
+    addresses = await service.start(args.host, args.port, args.unix, args.http_port)
+    for kind, address in addresses.items():
+        print(f"Listening for {kind} telemetry on {address}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.stop()
+        print(f"Ingested {service.stats['rows']} rows in {service.stats['batches']} batches "
+              f"({service.stats['rejected']} records rejected)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream NDJSON agent telemetry into the incremental detectors")
+    parser.add_argument('--host', default='127.0.0.1', help="listen address (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, help="NDJSON stream port")
+    parser.add_argument('--unix', metavar='PATH', help="NDJSON stream Unix socket")
+    parser.add_argument('--http-port', type=int, help="HTTP port (POST /telemetry)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="records per micro-batch")
+    parser.add_argument('--batch-interval', type=float, default=DEFAULT_BATCH_INTERVAL,
+                        help="seconds a record waits for its batch to fill up")
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE,
+                        help="records waiting for a batch before agents are throttled")
+    parser.add_argument('--max-http-requests', type=int, default=DEFAULT_MAX_HTTP_REQUESTS,
+                        help="HTTP requests read at once (the others wait unread)")
+    parser.add_argument('--detect-interval', type=float, default=DEFAULT_DETECT_INTERVAL,
+                        help="seconds between detection runs")
+    args = parser.parse_args()
+    if args.port is None and args.unix is None and args.http_port is None:
+        parser.error("give at least one of --port, --unix and --http-port")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
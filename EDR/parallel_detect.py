@@ -0,0 +1,304 @@
+"""
+parallel_detect.py - Run the detectors in a process pool, sharded by hostname
+
+Rows are hash-partitioned by hostname, so every per-host group a detector
+builds (files, processes, destinations, user/host pairs) lives in exactly one
+shard. Each worker summarizes its shards with the same helpers the serial
+detectors use (see full_detect.py), and a reduce step in the parent merges
+the shard summaries and applies the fleet-level logic: recon correlation
+across hosts, service-account baselines and attack chains across a user's
+hosts. The steps take the detectors' parameters (their defaults, overridden
+per detector), and rows are numbered by their position in the time-ordered
+frame, so ordering and tie-breaks, and thus the alerts, are identical to
+DetectionEngine.run() with the same parameters.
+
+The frame is written once as an uncompressed Feather (Arrow IPC) file under
+/dev/shm and memory-mapped by the workers, which only copy their own rows.
+Without pyarrow the shards are pickled to the workers instead.
+"""
+import inspect
+import os
+import tempfile
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from full_detect import (
+    DetectionEngine,
+    DEFAULT_DETECTORS,
+    time_ordered,
+    summarize_dwell_files,
+    dwell_time_alerts,
+    summarize_beaconing,
+    beaconing_alerts,
+    weekend_traffic_rows,
+    summarize_weekend_traffic,
+    weekend_exfiltration_alerts,
+    classify_recon_commands,
+    recon_alerts,
+    is_service_account,
+    service_account_alerts,
+    initial_access_mask,
+    activity_types,
+    summarize_attack_chain,
+    attack_chain_alerts
+)
+from telemetry_cache import frame_to_table, table_to_frame
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+# Shared-memory filesystem for the memory-mapped frame (the default temp dir otherwise)
+SHARED_MEMORY_DIR = '/dev/shm'
+
+# Shards per worker process (smaller shards even out skewed hosts)
+SHARDS_PER_WORKER = 2
+
+def shard_ids(hostnames, n_shards):
+    """Shard of each row, from a stable hash of its hostname (missing hostnames go to shard 0)"""
+    codes, uniques = pd.factorize(hostnames)
+    hashes = pd.util.hash_array(np.asarray(uniques, dtype=object))
+    shard_of_host = (hashes % np.uint64(n_shards)).astype(np.int64)
+    return np.where(codes >= 0, shard_of_host[codes], 0)
+
+def _concat(tables):
+    """Concatenate the non-empty shard tables (None if there are none)"""
+    tables = [table for table in tables if table is not None and not table.empty]
+    if not tables:
+        return None
+    return pd.concat(tables, ignore_index=True)
+
+# --------------------------------------------------------------------------------------------
+# MAP (PER SHARD) AND REDUCE (FLEET) STEPS
+# --------------------------------------------------------------------------------------------
+
+def _map_long_dwell(engine, params):
+    window = engine.window(params['lookback_days'])
+    return {'files': summarize_dwell_files(window, window.index.to_numpy())}
+
+def _reduce_long_dwell(parts, now, params):
+    files = _concat(part['files'] for part in parts)
+    if files is None:
+        return pd.DataFrame()
+    return dwell_time_alerts(files, now, params['days_threshold'])
+
+def _map_beaconing(engine, params):
+    return {'daily': summarize_beaconing(engine.exploded_remote_ips(params['lookback_days']))}
+
+def _reduce_beaconing(parts, now, params):
+    daily_summary = _concat(part['daily'] for part in parts)
+    if daily_summary is None:
+        return pd.DataFrame()
+    return beaconing_alerts(daily_summary, now, params['active_days_threshold'], params['consistency_threshold'])
+
+def _map_weekend_exfil(engine, params):
+    traffic_data = weekend_traffic_rows(engine.window(params['lookback_days']))
+    if traffic_data.empty:
+        return {'baseline': None, 'traffic': None}
+    
+    # Processes are keyed by hostname, so the per-shard baseline is the fleet baseline
+    process_baseline = traffic_data.groupby(['hostname', 'name', 'pid'], observed=True)[
+        'outbound_bytes'
+    ].mean().reset_index()
+    process_baseline.rename(columns={'outbound_bytes': 'avg_daily_outbound'}, inplace=True)
+    return {'baseline': process_baseline,
+            'traffic': summarize_weekend_traffic(engine.exploded_remote_ips(params['lookback_days']))}
+
+def _reduce_weekend_exfil(parts, now, params):
+    process_baseline = _concat(part['baseline'] for part in parts)
+    daily_traffic_agg = _concat(part['traffic'] for part in parts)
+    if process_baseline is None or daily_traffic_agg is None:
+        return pd.DataFrame()
+    return weekend_exfiltration_alerts(daily_traffic_agg, process_baseline, now)
+
+def _map_recon(engine, params):
+    recon_data = engine.window(params['lookback_days'])
+    is_recon, categories = classify_recon_commands(recon_data['cmdline'])
+    recon_data = recon_data[is_recon].assign(command_category=categories[is_recon])
+    
+    systems_recon = recon_data.groupby(['command_category', 'hostname', 'user'], observed=True).agg(
+        first_seen=('timestamp', 'min'),
+        last_seen=('timestamp', 'max'),
+        command_count=('cmdline', 'nunique')
+    ).reset_index()
+    return {'systems': systems_recon}
+
+def _reduce_recon(parts, now, params):
+    systems_recon = _concat(part['systems'] for part in parts)
+    if systems_recon is None:
+        return pd.DataFrame()
+    
+    # Correlate across hosts, in the (sorted) order of the serial groupby
+    systems_recon = systems_recon.sort_values(['command_category', 'hostname', 'user'], kind='stable')
+    return recon_alerts(systems_recon.reset_index(drop=True), now)
+
+def _map_service_account(engine, params):
+    baseline_end = engine.lookback_start(params['recent_days'])
+    window = engine.window(params['baseline_days'] + params['recent_days'])
+    service_rows = window[is_service_account(window['user'])]
+    
+    baseline_data, recent_data = engine.split(service_rows, baseline_end)
+    baseline_hosts = baseline_data[['user', 'hostname']]
+    recent_hosts = recent_data.assign(seq=recent_data.index).groupby(
+        ['user', 'hostname'], sort=False, dropna=False, observed=True
+    ).agg(
+        first_seen=('timestamp', 'min'),
+        last_seen=('timestamp', 'max'),
+        first_seq=('seq', 'min')
+    ).reset_index()
+    return {'baseline': baseline_hosts.drop_duplicates(), 'recent': recent_hosts}
+
+def _reduce_service_account(parts, now, params):
+    baseline_hosts = _concat(part['baseline'] for part in parts)
+    recent_hosts = _concat(part['recent'] for part in parts)
+    if baseline_hosts is None or recent_hosts is None:
+        return pd.DataFrame()
+    
+    # Account baselines span shards; hosts in order of first appearance fleet-wide
+    recent_hosts = recent_hosts.sort_values('first_seq', kind='stable')
+    return service_account_alerts(baseline_hosts, recent_hosts, now)
+
+def _map_attack_chain(engine, params):
+    window = engine.window(params['lookback_days'])
+    rows = window[window['user'].notna()]
+    if rows.empty:
+        return {'summary': None}
+    
+    # Initial-access users are only known fleet-wide, so summarize every user here
+    rows = rows.assign(activity_type=activity_types(rows))
+    return {'summary': summarize_attack_chain(rows, rows.index.to_numpy(),
+                                              initial_access=initial_access_mask(rows))}
+
+def _reduce_attack_chain(parts, now, params):
+    summary = _concat(part['summary'] for part in parts)
+    if summary is None:
+        return pd.DataFrame()
+    
+    # Users involved in initial access on any host
+    users = summary.loc[summary['is_initial_access'], 'user'].dropna().unique()
+    if len(users) == 0:
+        return pd.DataFrame()
+    return attack_chain_alerts(summary[summary['user'].isin(users)], now, params['min_hosts'], params['min_days'])
+
+# Sharded detectors (map, reduce) in the order of full_detect.DEFAULT_DETECTORS
+SHARDED_DETECTORS = [
+    ('long_dwell', _map_long_dwell, _reduce_long_dwell),
+    ('beaconing', _map_beaconing, _reduce_beaconing),
+    ('weekend_exfil', _map_weekend_exfil, _reduce_weekend_exfil),
+    ('recon', _map_recon, _reduce_recon),
+    ('service_account', _map_service_account, _reduce_service_account),
+    ('attack_chain', _map_attack_chain, _reduce_attack_chain),
+]
+_MAP_STEPS = {name: map_step for name, map_step, _ in SHARDED_DETECTORS}
+_REDUCE_STEPS = {name: reduce_step for name, _, reduce_step in SHARDED_DETECTORS}
+
+def detector_parameters(detector, params):
+    """Parameters a detector is called with, defaults included (without df, now and engine)"""
+    arguments = inspect.signature(detector).bind(None, **params)
+    arguments.apply_defaults()
+    return {name: value for name, value in list(arguments.arguments.items())[1:]
+            if name not in ('now', 'engine')}
+
+# --------------------------------------------------------------------------------------------
+# WORKERS
+# --------------------------------------------------------------------------------------------
+
+def _shard_frame(source, rows):
+    """
+    Rows of a shard, indexed by their position in the full frame. `source` is
+    the memory-mapped Feather file of the frame, or the shard itself.
+    """
+    if isinstance(source, str):
+        table = feather.read_table(source, memory_map=True)
+        shard = table_to_frame(table.take(pa.array(rows)))
+    else:
+        shard = source
+    shard.index = pd.Index(rows)
+    return shard
+
+def _map_shard(task):
+    """Worker entry point: the map step of each detector over one shard"""
+    source, rows, now, params = task
+    engine = DetectionEngine(_shard_frame(source, rows), now=now)
+    
+    parts = {}
+    for name, detector_params in params.items():
+        try:
+            parts[name] = _MAP_STEPS[name](engine, detector_params)
+        except Exception as e:
+            # Reported once by the reduce step
+            parts[name] = e
+    return parts
+
+class ParallelDetectionEngine:
+    """
+    Run the built-in detectors over one loaded frame in a process pool,
+    sharded by hostname. `params` maps detector names to the parameters to
+    run them with instead of the defaults. run() returns the same alerts as
+    DetectionEngine(df, now).run() with the detectors registered with those
+    parameters.
+    """
+    def __init__(self, df, now=None, n_workers=None, n_shards=None, params=None):
+        # Shards of the time-ordered frame stay in time order, keeping their row positions
+        self.df = time_ordered(df)
+        self.now = datetime.now() if now is None else now
+        self.params = {name: detector_parameters(detector, (params or {}).get(name, {}))
+                       for name, detector in DEFAULT_DETECTORS}
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.n_shards = n_shards or self.n_workers * SHARDS_PER_WORKER
+    
+    def _tasks(self, source, names):
+        """One task per non-empty shard: (source, row positions, now, parameters by detector)"""
+        ids = shard_ids(self.df['hostname'], self.n_shards)
+        for shard in range(self.n_shards):
+            rows = np.flatnonzero(ids == shard)
+            if len(rows):
+                shard_source = source if source is not None else self.df.iloc[rows].copy()
+                yield shard_source, rows, self.now, {name: self.params[name] for name in names}
+    
+    def _map(self, source, names):
+        tasks = list(self._tasks(source, names))
+        if self.n_workers <= 1:
+            return [_map_shard(task) for task in tasks]
+        with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+            return list(executor.map(_map_shard, tasks))
+    
+    def _map_all(self, names):
+        if pa is None:
+            return self._map(None, names)
+        
+        # Share the frame through one memory-mapped file instead of pickling it
+        directory = SHARED_MEMORY_DIR if os.path.isdir(SHARED_MEMORY_DIR) else None
+        with tempfile.TemporaryDirectory(prefix='edr_shards_', dir=directory) as tmp_dir:
+            path = os.path.join(tmp_dir, 'frame.feather')
+            feather.write_feather(frame_to_table(self.df), path, compression='uncompressed')
+            return self._map(path, names)
+    
+    def run(self, names=None):
+        """
+        Run the detectors (all of them unless `names` is given).
+        Returns a dict of detector name -> alert DataFrame.
+        """
+        names = list(names or _REDUCE_STEPS)
+        shard_parts = self._map_all(names)
+        
+        results = {}
+        for name in names:
+            parts = [part[name] for part in shard_parts]
+            errors = [part for part in parts if isinstance(part, Exception)]
+            try:
+                if errors:
+                    raise errors[0]
+                results[name] = _REDUCE_STEPS[name](parts, self.now, self.params[name])
+            except Exception as e:
+                print(f"Error in {name}: {str(e)}")
+                traceback.print_exc()
+                results[name] = pd.DataFrame()
+        return results
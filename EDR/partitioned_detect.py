@@ -0,0 +1,235 @@
+"""
+partitioned_detect.py - Out-of-core detection over partitioned telemetry
+
+Telemetry exported as one CSV file (or several) per day and host bucket,
+
+    telemetry/date=2025-04-30/host-bucket=3/part-0000.csv
+
+is run through the incremental detectors (incremental_detect.py) one day
+at a time, so memory holds the partitions of a single day plus the compact
+per-day detector state rather than the whole lookback window (small days
+are folded in together, up to `batch_rows` rows at a time):
+
+    pruning     a partition is read only if its day falls inside the lookback
+                window of at least one detector; a 90-day-old partition is
+                read for the service-account baseline alone
+    projection  only the columns of the detectors that need the partition
+                are parsed (DETECTOR_COLUMNS), e.g. user, hostname and
+                timestamp for the service-account baseline
+
+Each detector sees exactly the rows of its lookback window, and the rows
+of a day in time order like DetectionEngine reads them (rows with equal
+timestamps in the order they are read: by host bucket and path), so the
+alerts are those of DetectionEngine.run() over the same telemetry. Files
+outside the date=/host-bucket= layout are never pruned; they are read
+first and folded in on their own, so their rows only come in time order
+with the rest if they hold the oldest days. partition_csv() splits an
+agent CSV export into this layout.
+
+Usage:
+    python partitioned_detect.py SOURCE [--now TIMESTAMP]
+    python partitioned_detect.py --split CSV DIRECTORY [--host-buckets N]
+"""
+import argparse
+import glob
+import os
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from full_detect import DEFAULT_CHUNKSIZE, preprocess_data, time_ordered
+from incremental_detect import INCREMENTAL_DETECTORS
+from parallel_detect import shard_ids
+
+# Telemetry file suffixes of a partition directory
+PARTITION_SUFFIXES = ('.csv', '.csv.gz')
+
+# Path components naming the partition keys
+PARTITION_KEY_PATTERN = re.compile(r'^(date|host-bucket)=(.+)$')
+
+# Host buckets written by partition_csv() by default
+DEFAULT_HOST_BUCKETS = 8
+
+# Columns each detector reads (hostname and timestamp are always read)
+DETECTOR_COLUMNS = {name: detector_class.COLUMNS for name, detector_class in INCREMENTAL_DETECTORS}
+
+# A telemetry file and the partition keys of its path (None when absent)
+Partition = namedtuple('Partition', ['path', 'date', 'host_bucket'])
+
+def _partition_keys(path):
+    """(date, host bucket) named by the date=/host-bucket= components of a path"""
+    keys = {}
+    for part in os.path.normpath(path).split(os.sep):
+        match = PARTITION_KEY_PATTERN.match(part)
+        if match:
+            keys[match.group(1)] = match.group(2)
+    
+    date = pd.to_datetime(keys.get('date'), errors='coerce')
+    host_bucket = pd.to_numeric(keys.get('host-bucket'), errors='coerce')
+    return (None if pd.isna(date) else date.normalize(),
+            None if pd.isna(host_bucket) else int(host_bucket))
+
+def discover_partitions(source):
+    """
+    Telemetry files of a partition directory, or of the files and directories
+    matching a glob, in reading order: by day, host bucket and path
+    """
+    matches = [source] if os.path.isdir(source) else sorted(glob.glob(source, recursive=True))
+    if not matches:
+        raise ValueError(f"No telemetry partitions found at {source!r}")
+    
+    paths = []
+    for match in matches:
+        if os.path.isdir(match):
+            for root, dirs, files in os.walk(match):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                paths.extend(os.path.join(root, f) for f in files if f.endswith(PARTITION_SUFFIXES))
+        elif match.endswith(PARTITION_SUFFIXES):
+            paths.append(match)
+    
+    partitions = [Partition(path, *_partition_keys(path)) for path in dict.fromkeys(paths)]
+    partitions.sort(key=lambda p: (p.date is not None, p.date or pd.Timestamp.min,
+                                   -1 if p.host_bucket is None else p.host_bucket, p.path))
+    return partitions
+
+def read_partition(path, columns=None):
+    """Normalized telemetry of one partition file, reading only `columns` (all if None)"""
+    usecols = None if columns is None else (lambda col: col in columns)
+    df = pd.read_csv(path, usecols=usecols, low_memory=False)
+    return preprocess_data(df)
+
+def partition_csv(file_path, directory, host_buckets=DEFAULT_HOST_BUCKETS, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Split an agent CSV export into date=YYYY-MM-DD/host-bucket=N/part-0000.csv
+    files under `directory`, bucketing hosts by a stable hash of the hostname.
+    Rows keep their relative order; rows without a valid timestamp are
+    dropped, as no detector window includes them. Returns the files written.
+    """
+    written = set()
+    for chunk in pd.read_csv(file_path, chunksize=chunksize, dtype=str):
+        days = pd.to_datetime(chunk['timestamp'], errors='coerce').dt.strftime('%Y-%m-%d')
+        buckets = shard_ids(chunk['hostname'], host_buckets)
+        keys = pd.DataFrame({'day': days.to_numpy(), 'bucket': buckets}, index=chunk.index)
+        for (day, bucket), rows in keys.groupby(['day', 'bucket'], sort=True).groups.items():
+            path = os.path.join(directory, f'date={day}', f'host-bucket={bucket}', 'part-0000.csv')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            chunk.loc[rows].to_csv(path, mode='a', header=path not in written, index=False)
+            written.add(path)
+    return sorted(written)
+
+class PartitionedDetectionEngine:
+    """
+    Run the incremental detectors over partitioned telemetry, one partition
+    at a time, pruning partitions outside every detector window and reading
+    only the columns of the detectors that need each partition.
+    """
+    def __init__(self, source, now=None, detectors=None, batch_rows=DEFAULT_CHUNKSIZE):
+        self.partitions = discover_partitions(source)
+        self.batch_rows = batch_rows
+        self.now = now if now is not None else datetime.now()
+        if detectors is None:
+            detectors = {name: detector_class() for name, detector_class in INCREMENTAL_DETECTORS}
+        self.detectors = detectors
+        self.stats = {}
+    
+    def lookback_start(self, name):
+        """Start of a detector's lookback window ending at the reference time"""
+        return self.now - timedelta(days=self.detectors[name].lookback_days)
+    
+    def plan(self, names=None):
+        """(partition, detectors reading it) of every partition that is read"""
+        names = names or list(self.detectors)
+        first_days = {name: pd.Timestamp(self.lookback_start(name)).normalize() for name in names}
+        plan = []
+        for partition in self.partitions:
+            readers = [name for name in names if partition.date is None or partition.date >= first_days[name]]
+            if readers:
+                plan.append((partition, readers))
+        return plan
+    
+    def columns(self, readers):
+        """Columns to read for a set of detectors (None reads every column)"""
+        if any(name not in DETECTOR_COLUMNS for name in readers):
+            return None
+        return set().union(*(DETECTOR_COLUMNS[name] for name in readers))
+    
+    def _update(self, pending, names):
+        """Fold the pending partitions into the detectors reading them, in reading order"""
+        for name in names:
+            frames = [batch for batch, readers in pending if name in readers]
+            if not frames:
+                continue
+            rows = time_ordered(pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0])
+            # The window start can cut into the first day; cut here, no rows are kept for it
+            rows = rows[rows['timestamp'] >= self.lookback_start(name)]
+            detector = self.detectors[name]
+            detector.fold(detector.summarize(rows), len(rows))
+    
+    def run(self, names=None):
+        """Alerts of the detectors (all of them unless `names` is given)"""
+        names = names or list(self.detectors)
+        plan = self.plan(names)
+        self.stats = {'partitions': len(self.partitions), 'partitions_read': len(plan),
+                      'rows_read': 0, 'cells_read': 0}
+        
+        # Whole days are folded in, small ones together up to batch_rows rows at a time
+        # (the files outside the layout on their own)
+        pending = []
+        pending_rows = 0
+        pending_day = None
+        for partition, readers in plan:
+            if pending and partition.date != pending_day and (pending_rows >= self.batch_rows or pending_day is None):
+                self._update(pending, names)
+                pending = []
+                pending_rows = 0
+            pending_day = partition.date
+            batch = read_partition(partition.path, self.columns(readers))
+            self.stats['rows_read'] += len(batch)
+            self.stats['cells_read'] += batch.size
+            pending.append((batch, readers))
+            pending_rows += len(batch)
+        self._update(pending, names)
+        
+        results = {}
+        for name in names:
+            try:
+                results[name] = self.detectors[name].alerts(self.now)
+            except Exception as e:
+                print(f"Error in {name}: {str(e)}")
+                results[name] = pd.DataFrame()
+        return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the detectors over partitioned telemetry, out of core")
+    parser.add_argument('source', nargs='?', help="partition directory or glob")
+    parser.add_argument('--now', help="reference time (default: now)")
+    parser.add_argument('--split', nargs=2, metavar=('CSV', 'DIRECTORY'),
+                        help="split an agent CSV export into date=/host-bucket= partitions")
+    parser.add_argument('--host-buckets', type=int, default=DEFAULT_HOST_BUCKETS,
+                        help=f"host buckets of --split (default: {DEFAULT_HOST_BUCKETS})")
+    args = parser.parse_args()
+    
+    if args.split:
+        files = partition_csv(*args.split, host_buckets=args.host_buckets)
+        print(f"Wrote {len(files)} partitions under {args.split[1]}")
+        return
+    if not args.source:
+        parser.error("a partition directory or glob is required")
+    
+    now = pd.Timestamp(args.now).to_pydatetime() if args.now else None
+    engine = PartitionedDetectionEngine(args.source, now=now)
+    start_time = datetime.now()
+    results = engine.run()
+    execution_time = (datetime.now() - start_time).total_seconds()
+    
+    print("\n===== RESULTS =====")
+    for name, alerts in results.items():
+        print(f"{name}: {len(alerts)} alerts")
+    print(f"\nPartitions read: {engine.stats['partitions_read']} of {engine.stats['partitions']}, "
+          f"rows: {engine.stats['rows_read']}, cells: {engine.stats['cells_read']}")
+    print(f"Execution time: {execution_time:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
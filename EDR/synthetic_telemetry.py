@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+synthetic_telemetry.py - Seeded synthetic EDR telemetry with embedded attack scenarios
+
+Writes agent telemetry in the column schema of synthetic_data.csv at any size
+(10k to 50M rows; rows are generated and written in chunks): background
+activity of a fleet of hosts and users, plus instances of the six attacks the
+detectors in full_detect.py look for (long-dwell APT, beaconing, weekend
+exfiltration, distributed recon, service-account misuse and a cross-system
+attack chain). The embedded scenarios are written next to the CSV as JSON
+ground truth, and scenario_recall() scores detector results against it.
+
+Background activity carries none of the scenario signals (recon command
+lines, service accounts, initial-access flags, dormant svchost binaries), so
+an alert on a scenario key comes from the embedded attack.
+
+Usage:
+    python synthetic_telemetry.py telemetry.csv --rows 1000000 [--seed 7] [--now 2025-04-30]
+"""
+import argparse
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Columns of the agent CSV export (as in synthetic_data.csv)
+TELEMETRY_COLUMNS = [
+    'hostname', 'endpoint_id', 'os_type', 'os_version', 'ip_address', 'domain', 'timestamp',
+    'collector_version', 'pid', 'ppid', 'name', 'exe_path', 'cmdline', 'user', 'start_time',
+    'runtime_secs', 'rss', 'vms', 'cpu_percent', 'num_threads', 'status', 'exe_hash',
+    'exe_signature_valid', 'exe_signer', 'exe_mismatch', 'mapped_files_count', 'anonymous_mem_size',
+    'rwx_segments_count', 'integrity_level', 'session_id', 'is_service', 'service_name', 'vad_count',
+    'remote_mem_operations', 'token_manipulation', 'credential_access', 'cgroup', 'capabilities',
+    'namespaces', 'container_id', 'file_writes', 'file_reads', 'sensitive_file_access',
+    'listening_ports', 'conn_count', 'dns_queries', 'outbound_bytes', 'inbound_bytes', 'remote_ips',
+    'registry_writes', 'registry_persistence_access', 'registry_keys_modified', 'script_execution',
+    'script_type', 'script_content_hash', 'obfuscated_script', 'task_created', 'service_created',
+    'task_name', 'logon_type', 'child_processes', 'loaded_modules', 'loaded_module_count'
+]
+
+# Flag columns that stay 0 in background activity
+FLAG_COLUMNS = ['exe_mismatch', 'credential_access', 'registry_persistence_access',
+                'script_execution', 'obfuscated_script', 'token_manipulation', 'remote_mem_operations']
+
+DEFAULT_SEED = 7
+
+# Rows generated and written per chunk
+CHUNK_ROWS = 250000
+
+# Days of background activity (the longest detector lookback: 90-day baseline + 30 days)
+HISTORY_DAYS = 120
+
+# Background rows per host, and the share of hosts running Linux
+ROWS_PER_HOST = 4000
+LINUX_SHARE = 0.2
+
+# Share of background rows with network connections, and of those with a bulk transfer
+CONNECTION_RATE = 0.4
+BULK_TRANSFER_RATE = 0.01
+
+# Relative activity per hour of day (office hours, little at night)
+HOUR_WEIGHTS = np.array([1, 1, 1, 1, 1, 1, 2, 4, 8, 10, 10, 10, 8, 10, 10, 10, 8, 6, 4, 3, 2, 2, 1, 1], dtype=float)
+HOUR_WEIGHTS /= HOUR_WEIGHTS.sum()
+
+# Benign processes: (name, exe_path, cmdline, signer), Windows ones first
+WINDOWS_PROCESSES = [
+    ('svchost.exe', r'C:\Windows\System32\svchost.exe', r'C:\Windows\System32\svchost.exe -k netsvcs -p',
+     'Microsoft Windows'),
+    ('explorer.exe', r'C:\Windows\explorer.exe', r'C:\Windows\explorer.exe', 'Microsoft Windows'),
+    ('chrome.exe', r'C:\Program Files\Google\Chrome\Application\chrome.exe',
+     r'"C:\Program Files\Google\Chrome\Application\chrome.exe" --type=renderer', 'Google LLC'),
+    ('OUTLOOK.EXE', r'C:\Program Files\Microsoft Office\root\Office16\OUTLOOK.EXE',
+     r'"C:\Program Files\Microsoft Office\root\Office16\OUTLOOK.EXE" /recycle', 'Microsoft Corporation'),
+    ('Teams.exe', r'C:\Users\Default\AppData\Local\Microsoft\Teams\current\Teams.exe',
+     'Teams.exe --system-initiated', 'Microsoft Corporation'),
+    ('OneDrive.exe', r'C:\Program Files\Microsoft OneDrive\OneDrive.exe', 'OneDrive.exe /background',
+     'Microsoft Corporation'),
+]
+LINUX_PROCESSES = [
+    ('sshd', '/usr/sbin/sshd', '/usr/sbin/sshd -D', ''),
+    ('python3', '/usr/bin/python3', 'python3 /opt/app/worker.py --queue jobs', ''),
+    ('java', '/usr/bin/java', 'java -Xmx2g -jar /opt/app/service.jar', ''),
+    ('nginx', '/usr/sbin/nginx', 'nginx -g daemon off;', ''),
+]
+PROCESSES = WINDOWS_PROCESSES + LINUX_PROCESSES
+
+# Hostname prefixes; sensitive ones (see full_detect.SENSITIVE_HOST_KEYWORDS) every 25th host
+HOST_PREFIXES = ['WS', 'WS', 'WS', 'LT', 'SRV']
+SENSITIVE_HOST_PREFIXES = ['FINANCE-DB', 'HR-APP', 'PAYMENT-SQL']
+DOMAIN = 'corp.local'
+
+# Recon command lines per category (see full_detect.RECON_COMMAND_CATEGORIES)
+RECON_CAMPAIGN_COMMANDS = {
+    'network_discovery': [r'net view \\fs01', 'nslookup dc01.corp.local', 'ping -n 1 10.0.0.5'],
+    'permission_enum': [r'Get-Acl C:\Finance', r'Get-Acl \\fs01\hr', r'Get-Acl C:\Users\Public'],
+    'account_enum': ['net group "Domain Admins" /domain', 'Get-ADUser -Filter *', 'Get-ADGroup -Filter *'],
+}
+
+def _midnight(ts):
+    return pd.Timestamp(ts).normalize()
+
+def build_fleet(n_rows, rng):
+    """Hosts (with OS, address and primary user) for a data set of `n_rows` rows"""
+    n_hosts = max(50, n_rows // ROWS_PER_HOST)
+    ids = np.arange(n_hosts)
+    prefixes = np.array(HOST_PREFIXES, dtype=object)[ids % len(HOST_PREFIXES)]
+    sensitive = ids % 25 == 24
+    prefixes[sensitive] = np.array(SENSITIVE_HOST_PREFIXES, dtype=object)[(ids[sensitive] // 25) % 3]
+    is_linux = (rng.random(n_hosts) < LINUX_SHARE) & (prefixes == 'SRV')
+    
+    return {
+        'hostname': np.array([f'{p}-{i:05d}.{DOMAIN}' for p, i in zip(prefixes, ids)], dtype=object),
+        'endpoint_id': np.array([f'EP-{i:05d}-{h:08x}' for i, h in zip(ids, rng.integers(0, 2**32, n_hosts))],
+                                dtype=object),
+        'is_linux': is_linux,
+        'is_sensitive': sensitive,
+        'os_type': np.where(is_linux, 'Linux', 'Windows').astype(object),
+        'os_version': np.where(is_linux, 'Ubuntu 22.04 LTS', 'Windows 10 Enterprise 21H2').astype(object),
+        'ip_address': np.array([f'10.{16 + i // 65536}.{(i // 256) % 256}.{i % 256}' for i in ids], dtype=object),
+        'user': np.array([f'user{i:05d}@{DOMAIN}' for i in ids], dtype=object),
+        'ip_pool': _ip_pool(rng),
+    }
+
+def _process_table():
+    """Per-process columns of the PROCESSES catalog as object arrays"""
+    names, paths, cmdlines, signers = (np.array(col, dtype=object) for col in zip(*PROCESSES))
+    hashes = np.array([hashlib.sha256(path.encode('utf-8')).hexdigest() for path in paths], dtype=object)
+    return {'name': names, 'exe_path': paths, 'cmdline': cmdlines, 'exe_signer': signers, 'exe_hash': hashes}
+
+def _ip_pool(rng):
+    internal = [f'10.0.{i // 250}.{i % 250 + 1}' for i in range(200)]
+    external = [f'{a}.{b}.{c}.{d}' for a, b, c, d in rng.integers(1, 223, (300, 4))]
+    return np.array(internal + external, dtype=object)
+
+def _json_lists(first, second, counts):
+    """JSON array text of 0, 1 or 2 items per row"""
+    text = np.full(len(counts), '[]', dtype=object)
+    one, two = counts == 1, counts == 2
+    text[one] = '["' + first[one] + '"]'
+    text[two] = '["' + first[two] + '", "' + second[two] + '"]'
+    return text
+
+def background_chunk(fleet, n, now, rng):
+    """`n` rows of benign fleet activity over the HISTORY_DAYS days before `now`"""
+    processes = _process_table()
+    n_hosts = len(fleet['hostname'])
+    host = rng.integers(0, n_hosts, n)
+    is_linux = fleet['is_linux'][host]
+    n_windows = len(WINDOWS_PROCESSES)
+    proc = np.where(is_linux, n_windows + rng.integers(0, len(LINUX_PROCESSES), n),
+                    rng.integers(0, n_windows, n))
+    
+    # Office-hours weighted times on the previous HISTORY_DAYS days
+    day = rng.integers(1, HISTORY_DAYS + 1, n)
+    seconds = rng.choice(24, n, p=HOUR_WEIGHTS) * 3600 + rng.integers(0, 3600, n)
+    timestamps = _midnight(now) - pd.to_timedelta(day, unit='D') + pd.to_timedelta(seconds, unit='s')
+    
+    # Mostly the host's primary user
+    users = np.where(rng.random(n) < 0.85, fleet['user'][host], fleet['user'][rng.integers(0, n_hosts, n)])
+    users[np.array([PROCESSES[p][0] == 'svchost.exe' for p in range(len(PROCESSES))])[proc]] = 'SYSTEM'
+    
+    # Network activity
+    has_conn = rng.random(n) < CONNECTION_RATE
+    ip_pool = fleet['ip_pool']
+    ip_counts = np.where(has_conn, rng.integers(1, 3, n), 0)
+    outbound = np.where(has_conn, rng.integers(200, 40000, n), 0)
+    bulk = has_conn & (rng.random(n) < BULK_TRANSFER_RATE)
+    outbound[bulk] = rng.integers(1000000, 5000000, int(bulk.sum()))
+    
+    data = {col: fleet[col][host] for col in ('hostname', 'endpoint_id', 'os_type', 'os_version', 'ip_address')}
+    data.update({col: processes[col][proc] for col in ('name', 'exe_path', 'cmdline', 'exe_signer', 'exe_hash')})
+    data.update({
+        'domain': DOMAIN,
+        'timestamp': timestamps,
+        'collector_version': '1.2.4',
+        'pid': 1000 + (host * 13 + proc * 7919) % 64000,
+        'ppid': np.where(is_linux, 1, 700),
+        'user': users,
+        'runtime_secs': rng.integers(1, 86400, n),
+        'rss': rng.integers(5, 500, n) * 1048576,
+        'cpu_percent': np.round(rng.random(n) * 5, 1),
+        'num_threads': rng.integers(1, 64, n),
+        'status': 'Running',
+        'exe_signature_valid': 1,
+        'integrity_level': 'Medium',
+        'conn_count': np.where(has_conn, rng.integers(1, 9, n), 0),
+        'remote_ips': _json_lists(ip_pool[rng.integers(0, len(ip_pool), n)],
+                                  ip_pool[rng.integers(0, len(ip_pool), n)], ip_counts),
+        'dns_queries': '[]',
+        'outbound_bytes': outbound,
+        'inbound_bytes': np.where(has_conn, rng.integers(200, 200000, n), 0),
+    })
+    for col in FLAG_COLUMNS:
+        data[col] = 0
+    return pd.DataFrame(data, columns=TELEMETRY_COLUMNS)
+
+# --------------------------------------------------------------------------------------------
+# ATTACK SCENARIOS
+# --------------------------------------------------------------------------------------------
+
+class ScenarioBuilder:
+    """Collects scenario rows (with fleet host attributes) and their ground truth"""
+    def __init__(self, fleet, now, rng):
+        self.fleet = fleet
+        self.now = pd.Timestamp(now)
+        self.midnight = _midnight(now)
+        self.rng = rng
+        self.rows = []
+        self.truth = []
+        windows = np.flatnonzero(~fleet['is_linux'] & ~fleet['is_sensitive'])
+        self._hosts = iter(rng.permutation(windows))
+        self._sensitive = iter(rng.permutation(np.flatnonzero(fleet['is_sensitive'])))
+    
+    def host(self, sensitive=False):
+        """A Windows host not used by another scenario instance (hosts are reused once exhausted)"""
+        try:
+            return int(next(self._sensitive if sensitive else self._hosts))
+        except StopIteration:
+            return int(self.rng.integers(0, len(self.fleet['hostname'])))
+    
+    def at(self, days_ago, hours=0.0):
+        """Timestamp `days_ago` days before today's midnight plus `hours`"""
+        return self.midnight - timedelta(days=days_ago) + timedelta(hours=hours)
+    
+    def add(self, host, timestamp, **fields):
+        row = {col: self.fleet[col][host] for col in ('hostname', 'endpoint_id', 'os_type', 'os_version', 'ip_address')}
+        row.update(domain=DOMAIN, timestamp=timestamp, collector_version='1.2.4', ppid=700, status='Running',
+                   exe_signature_valid=1, conn_count=0, outbound_bytes=0, inbound_bytes=0,
+                   remote_ips='[]', dns_queries='[]', user=self.fleet['user'][host])
+        row.update({col: 0 for col in FLAG_COLUMNS})
+        row.update(fields)
+        self.rows.append(row)
+    
+    def long_dwell(self, i):
+        """A svchost look-alike dropped 60-80 days ago and first run 10-25 days ago"""
+        host = self.host()
+        path = rf'C:\ProgramData\Microsoft\Windows\SystemData\cache{i:03d}\svchost.dll'
+        self.add(host, self.at(int(self.rng.integers(60, 81)), 9.3), pid=0, ppid=0, name='svchost.dll',
+                 exe_path=path, status='Created')
+        first_run = int(self.rng.integers(12, 26))
+        for k in range(3):
+            self.add(host, self.at(first_run - k, 2.5), pid=40000 + i * 10 + k, name='svchost.exe',
+                     exe_path=path, cmdline=path, user='SYSTEM')
+        self.truth.append({'detector': 'long_dwell', 'hostname': self.fleet['hostname'][host],
+                           'associated_file': path})
+    
+    def beaconing(self, i):
+        """One small off-hours connection to the same address on each of the last 45 days"""
+        host = self.host()
+        pid, ip = 50000 + i, f'185.220.{i // 250}.{i % 250 + 1}'
+        for days_ago in range(1, 46):
+            self.add(host, self.at(days_ago, 2 + self.rng.random() * 3), pid=pid, name='updater.exe',
+                     exe_path=r'C:\Users\Public\Libraries\updater.exe', cmdline='updater.exe /silent',
+                     conn_count=1, outbound_bytes=int(self.rng.integers(200, 900)), remote_ips=f'["{ip}"]')
+        self.truth.append({'detector': 'beaconing', 'hostname': self.fleet['hostname'][host],
+                           'pid': pid, 'destination': ip})
+    
+    def weekend_exfil(self, i):
+        """Bulk uploads on weekends and small syncs on weekdays over the last 8 weeks"""
+        host = self.host()
+        pid, ip = 51000 + i, f'45.83.{i // 250}.{i % 250 + 1}'
+        for days_ago in range(1, 57):
+            timestamp = self.at(days_ago, 14)
+            weekend = timestamp.dayofweek >= 5
+            outbound = int(self.rng.integers(40, 80)) * 1048576 if weekend else int(self.rng.integers(2000, 5000))
+            self.add(host, timestamp, pid=pid, name='syncsvc.exe', exe_path=r'C:\ProgramData\SyncSvc\syncsvc.exe',
+                     cmdline='syncsvc.exe --upload', conn_count=2, outbound_bytes=outbound, remote_ips=f'["{ip}"]')
+        self.truth.append({'detector': 'weekend_exfil', 'hostname': self.fleet['hostname'][host],
+                           'pid': pid, 'destination': ip})
+    
+    def recon(self, i, category):
+        """Two accounts running the same recon commands on four hosts within a few hours"""
+        hosts = [self.host() for _ in range(4)]
+        users = [f'helpdesk{i:02d}a@{DOMAIN}', f'helpdesk{i:02d}b@{DOMAIN}']
+        for j, host in enumerate(hosts):
+            for k, cmdline in enumerate(RECON_CAMPAIGN_COMMANDS[category]):
+                self.add(host, self.at(5, 10 + j * 0.5 + k * 0.1), pid=52000 + i * 10 + j, name='cmd.exe',
+                         exe_path=r'C:\Windows\System32\cmd.exe', cmdline=cmdline, user=users[j % 2])
+        self.truth.append({'detector': 'recon', 'category': category,
+                           'hostnames': [self.fleet['hostname'][host] for host in hosts]})
+    
+    def service_account(self, i):
+        """A backup service account seen on two hosts for months, then on four new ones"""
+        account = f'svc_backup{i:02d}'
+        baseline = [self.host() for _ in range(2)]
+        recent = [self.host() for _ in range(4)]
+        fields = dict(name='backup.exe', exe_path=r'C:\Program Files\Backup\backup.exe',
+                      cmdline='backup.exe --incremental', user=account)
+        for days_ago in (100, 75, 50, 35):
+            for host in baseline:
+                self.add(host, self.at(days_ago, 1), pid=53000 + i, **fields)
+        for j, host in enumerate(recent):
+            self.add(host, self.at(12 - 2 * j, 1), pid=53000 + i, **fields)
+        self.truth.append({'detector': 'service_account', 'account': account})
+    
+    def attack_chain(self, i):
+        """Script-based initial access, then low-volume activity across four more hosts over 25 days"""
+        user = f'contractor{i:02d}@{DOMAIN}'
+        hosts = [self.host() for _ in range(4)] + [self.host(sensitive=True)]
+        self.add(hosts[0], self.at(40, 11), pid=54000 + i, name='powershell.exe',
+                 exe_path=r'C:\Windows\System32\WindowsPowerShell\v1.0\powershell.exe',
+                 cmdline='powershell.exe -nop -enc SQBFAFgAIAAoAE4AZQB3AC0ATwBiAGoAZQBjAHQA', user=user,
+                 script_execution=1, obfuscated_script=1, script_type='powershell')
+        for j, host in enumerate(hosts[1:], start=1):
+            for k in range(2):
+                self.add(host, self.at(40 - j * 6 - k, 15), pid=54100 + i * 10 + j, name='rundll32.exe',
+                         exe_path=r'C:\Windows\System32\rundll32.exe',
+                         cmdline=r'rundll32.exe C:\Users\Public\Libraries\msupd.dll,Start', user=user,
+                         credential_access=int(k == 0), conn_count=6,
+                         remote_ips=f'["{self.fleet["ip_address"][hosts[j - 1]]}"]')
+        self.truth.append({'detector': 'attack_chain', 'user': user,
+                           'hostnames': [self.fleet['hostname'][host] for host in hosts]})
+    
+    def frame(self):
+        return pd.DataFrame(self.rows, columns=TELEMETRY_COLUMNS)
+
+def scenario_instances(n_rows):
+    """Instances of each scenario embedded in a data set of `n_rows` rows"""
+    return int(np.clip(n_rows // 250000, 1, 20))
+
+def build_scenarios(fleet, now, rng, instances):
+    """Rows and ground truth of `instances` instances of each attack scenario"""
+    builder = ScenarioBuilder(fleet, now, rng)
+    categories = list(RECON_CAMPAIGN_COMMANDS)
+    for i in range(instances):
+        builder.long_dwell(i)
+        builder.beaconing(i)
+        builder.weekend_exfil(i)
+        builder.service_account(i)
+        builder.attack_chain(i)
+        # Recon alerts are per command category, so one campaign per category
+        if i < len(categories):
+            builder.recon(i, categories[i])
+    return builder.frame(), builder.truth
+
+def truth_path(csv_path):
+    """Path of the ground-truth JSON written next to a generated CSV"""
+    return f"{csv_path}.truth.json"
+
+def load_truth(csv_path):
+    with open(truth_path(csv_path)) as f:
+        return json.load(f)
+
+def generate_telemetry(csv_path, n_rows, seed=DEFAULT_SEED, now=None, chunk_rows=CHUNK_ROWS):
+    """
+    Write `n_rows` rows of telemetry (background plus embedded scenarios) to
+    `csv_path` and the ground truth next to it. The same seed and `now` give
+    the same file. Returns the ground truth.
+    """
+    now = _midnight(datetime.now()) if now is None else pd.Timestamp(now)
+    rng = np.random.default_rng(seed)
+    fleet = build_fleet(n_rows, rng)
+    scenarios, truth = build_scenarios(fleet, now, rng, scenario_instances(n_rows))
+    
+    remaining = max(0, n_rows - len(scenarios))
+    first = True
+    with open(csv_path, 'w', newline='') as f:
+        while first or remaining > 0:
+            size = min(chunk_rows, remaining)
+            chunk = background_chunk(fleet, size, now, rng)
+            if first:
+                # Scenario rows are mixed into the first chunk
+                chunk = pd.concat([chunk, scenarios], ignore_index=True)
+                chunk = chunk.iloc[rng.permutation(len(chunk))]
+            chunk.to_csv(f, header=first, index=False, date_format='%Y-%m-%d %H:%M:%S')
+            remaining -= size
+            first = False
+    
+    truth = {'rows': max(n_rows, len(scenarios)), 'seed': seed, 'now': now.isoformat(), 'scenarios': truth}
+    with open(truth_path(csv_path), 'w') as f:
+        json.dump(truth, f, indent=2)
+    return truth
+
+# --------------------------------------------------------------------------------------------
+# RECALL AGAINST THE GROUND TRUTH
+# --------------------------------------------------------------------------------------------
+
+def _same(alerts, column, value):
+    return alerts[column] == value
+
+def _detected(alerts, scenario):
+    """Whether any alert of the scenario's detector matches the scenario"""
+    if alerts is None or alerts.empty:
+        return False
+    kind = scenario['detector']
+    if kind == 'long_dwell':
+        return bool((_same(alerts, 'hostname', scenario['hostname']) &
+                     _same(alerts, 'associated_file', scenario['associated_file'])).any())
+    if kind in ('beaconing', 'weekend_exfil'):
+        return bool((_same(alerts, 'hostname', scenario['hostname']) &
+                     _same(alerts, 'pid', scenario['pid']) &
+                     _same(alerts, 'destination', scenario['destination'])).any())
+    if kind == 'recon':
+        hosts = set(scenario['hostnames'])
+        return any(hosts <= set(systems.split(', ')) for systems in alerts['affected_systems'])
+    if kind == 'service_account':
+        return bool(_same(alerts, 'account', scenario['account']).any())
+    if kind == 'attack_chain':
+        return bool(_same(alerts, 'user', scenario['user']).any())
+    raise ValueError(f"Unknown scenario detector: {kind}")
+
+def scenario_recall(results, truth):
+    """
+    Per-detector recall of the embedded scenarios, from a dict of detector
+    name -> alerts (e.g. DetectionEngine.run()). Returns detector name ->
+    {'expected', 'detected', 'recall'}.
+    """
+    recall = {}
+    for scenario in truth['scenarios']:
+        entry = recall.setdefault(scenario['detector'], {'expected': 0, 'detected': 0})
+        entry['expected'] += 1
+        entry['detected'] += _detected(results.get(scenario['detector']), scenario)
+    for entry in recall.values():
+        entry['recall'] = entry['detected'] / entry['expected']
+    return recall
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic EDR telemetry with embedded attack scenarios")
+    parser.add_argument('csv_path', help="output CSV (the ground truth goes to <csv_path>.truth.json)")
+    parser.add_argument('--rows', type=int, default=10000, help="number of rows (default: 10000)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help=f"random seed (default: {DEFAULT_SEED})")
+    parser.add_argument('--now', help="reference time of the data set (default: today's midnight)")
+    args = parser.parse_args()
+    
+    truth = generate_telemetry(args.csv_path, args.rows, args.seed, args.now)
+    print(f"Wrote {truth['rows']:,} rows to {args.csv_path} with {len(truth['scenarios'])} scenarios "
+          f"(ground truth: {truth_path(args.csv_path)})")
+
+if __name__ == "__main__":
+    main()
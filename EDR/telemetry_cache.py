@@ -0,0 +1,210 @@
+"""
+telemetry_cache.py - Columnar on-disk cache of normalized EDR telemetry
+
+load_data() re-parses the agent CSV on every run (comment-row stripping,
+timestamp coercion, list decoding). This module stores the normalized frame
+as an uncompressed Feather (Arrow IPC) file keyed by the source path, mtime
+and size, and reads it back on the next run instead of re-parsing the CSV.
+The key also holds CACHE_VERSION, so files written before a change to the
+normalization are re-parsed rather than reused.
+
+The cache file is read whole, not memory-mapped: list and string columns are
+rebuilt as Python objects and the rest are copied into the pandas frame, so
+a mapping would only defer the same reads.
+Requires pyarrow; without it every call falls back to load_data().
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from full_detect import compact_frame, load_data
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+# Bump when a change to load_data() or to the cache format changes the cached frame
+CACHE_VERSION = 1
+
+# Directory (next to the source CSV) holding the cache files by default
+CACHE_DIR_NAME = '.edr_cache'
+
+# Schema metadata key describing how to restore the pandas frame
+CACHE_METADATA_KEY = b'edr_cache'
+
+def _source_id(file_path):
+    """Stable identifier of a source file, derived from its absolute path"""
+    return hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:12]
+
+def cache_key(file_path):
+    """
+    Key of the current version of a source file: changes whenever its path,
+    mtime or size, or CACHE_VERSION, changes
+    """
+    stat = os.stat(file_path)
+    raw = f"{CACHE_VERSION}|{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+def cache_dir_for(file_path, cache_dir=None):
+    """Cache directory used for a source file"""
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR_NAME)
+    return cache_dir
+
+def cache_path(file_path, cache_dir=None):
+    """Path of the cache file for the current version of a source file"""
+    name = f"{os.path.basename(file_path)}.{_source_id(file_path)}.{cache_key(file_path)}.feather"
+    return os.path.join(cache_dir_for(file_path, cache_dir), name)
+
+def _cache_files(file_path, cache_dir=None):
+    """All cache files (current or stale) written for a source file"""
+    directory = cache_dir_for(file_path, cache_dir)
+    if not os.path.isdir(directory):
+        return []
+    prefix = f"{os.path.basename(file_path)}.{_source_id(file_path)}."
+    return [os.path.join(directory, name) for name in os.listdir(directory)
+            if name.startswith(prefix) and name.endswith('.feather')]
+
+def invalidate_cache(file_path, cache_dir=None):
+    """
+    Remove every cached version of a source file. Returns the number of
+    cache files deleted.
+    """
+    removed = 0
+    for path in _cache_files(file_path, cache_dir):
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+def _json_default(value):
+    """Serialize numpy scalars left in object columns"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def frame_to_table(df):
+    """
+    Convert a normalized telemetry frame to an Arrow table.
+    
+    Columns Arrow can type natively (numbers, timestamps, strings, lists of a
+    single item type) are stored as such; mixed object columns, e.g. list
+    columns that also hold raw scalars, are stored as one JSON value per cell.
+    """
+    arrays = []
+    names = []
+    json_columns = []
+    list_columns = []
+    string_columns = []
+    
+    for col in df.columns:
+        values = df[col]
+        try:
+            array = pa.array(values, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, OverflowError):
+            array = pa.array([json.dumps(x, default=_json_default) for x in values], type=pa.string())
+            json_columns.append(col)
+        else:
+            if pa.types.is_list(array.type):
+                list_columns.append(col)
+            elif values.dtype == object and pa.types.is_string(array.type):
+                string_columns.append(col)
+        arrays.append(array)
+        names.append(str(col))
+    
+    # Keep the original (filtered) row index
+    arrays.append(pa.array(np.asarray(df.index)))
+    names.append('__index__')
+    
+    metadata = {
+        'columns': [str(col) for col in df.columns],
+        'index_name': df.index.name,
+        'json_columns': [str(col) for col in json_columns],
+        'list_columns': [str(col) for col in list_columns],
+        'string_columns': [str(col) for col in string_columns],
+    }
+    table = pa.Table.from_arrays(arrays, names=names)
+    return table.replace_schema_metadata({CACHE_METADATA_KEY: json.dumps(metadata).encode('utf-8')})
+
+def table_to_frame(table):
+    """Restore the pandas frame written by frame_to_table()"""
+    metadata = json.loads(table.schema.metadata[CACHE_METADATA_KEY])
+    special = set(metadata['json_columns']) | set(metadata['list_columns'])
+    
+    plain = [col for col in metadata['columns'] if col not in special]
+    df = table.select(plain).to_pandas() if plain else pd.DataFrame(index=range(table.num_rows))
+    
+    for col in metadata['string_columns']:
+        # Arrow nulls come back as None, the CSV loader produces NaN
+        values = df[col].to_numpy(dtype=object, copy=True)
+        values[pd.isna(values)] = np.nan
+        df[col] = values
+    for col in metadata['list_columns']:
+        df[col] = pd.Series(table.column(col).to_pylist(), dtype=object)
+    for col in metadata['json_columns']:
+        df[col] = pd.Series([json.loads(x) for x in table.column(col).to_pylist()], dtype=object)
+    
+    df = df[metadata['columns']]
+    df.index = pd.Index(table.column('__index__').to_numpy(), name=metadata['index_name'])
+    return df
+
+def write_cache(df, file_path, cache_dir=None):
+    """Write the normalized frame for the current version of a source file"""
+    path = cache_path(file_path, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    
+    # Write to a temporary file first so readers never see a partial cache
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(frame_to_table(df), tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+    return path
+
+def read_cache(path):
+    """Read a cache file and restore the normalized frame"""
+    return table_to_frame(feather.read_table(path))
+
+def load_data_cached(file_path, cache_dir=None, refresh=False, compact=False):
+    """
+    Load the normalized telemetry frame, reusing the columnar cache when it
+    matches the current source file.
+    
+    A missing or stale cache (the CSV changed since it was written) falls
+    back to parsing the CSV with load_data() and rewrites the cache; stale
+    versions are removed. `refresh=True` ignores any existing cache, and
+    `compact=True` returns the frame in compact storage (see compact_frame()).
+    """
+    if pa is None:
+        print("Warning: pyarrow is not installed, telemetry cache disabled")
+        return load_data(file_path, compact=compact)
+    
+    path = cache_path(file_path, cache_dir)
+    if refresh:
+        invalidate_cache(file_path, cache_dir)
+    elif os.path.exists(path):
+        try:
+            df = read_cache(path)
+            print(f"Loaded cached data for {file_path} from {path}. Shape: {df.shape}")
+            return compact_frame(df) if compact else df
+        except (OSError, KeyError, ValueError, pa.ArrowInvalid) as e:
+            print(f"Warning: Could not read cache file {path}: {e}")
+    else:
+        stale = [p for p in _cache_files(file_path, cache_dir) if p != path]
+        if stale:
+            print(f"Cache for {file_path} is stale, re-parsing CSV...")
+            invalidate_cache(file_path, cache_dir)
+    
+    df = load_data(file_path)
+    try:
+        write_cache(df, file_path, cache_dir)
+    except (OSError, TypeError, pa.ArrowException) as e:
+        # e.g. cells JSON cannot encode: the frame is still returned, just not cached
+        print(f"Warning: Could not write cache for {file_path}: {e}")
+    return compact_frame(df) if compact else df
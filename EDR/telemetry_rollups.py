@@ -0,0 +1,269 @@
+"""
+telemetry_rollups.py - Precomputed per-day rollups of the detector baselines
+
+The baseline-heavy detectors rebuild their baselines from raw rows on every
+run: the service-account detector scans 120 days for the hosts each account
+used, weekend exfiltration averages outbound bytes per process over 60 days.
+write_rollups() materializes compact per-day summaries once, the per-day
+tables of the incremental detectors (incremental_detect.py):
+
+    long_dwell       first seen / first active per (hostname, exe_path)
+    beaconing        connection and off-hours counts per (hostname, pid, name, remote_ip)
+    weekend_exfil    outbound bytes per (process, remote_ip) and per-process byte sums
+    recon            first/last seen per (category, hostname, user, cmdline)
+    service_account  first/last seen per (user, hostname): the account's host set
+    attack_chain     first/last access per (user, hostname, activity_type)
+
+stored as one Feather file per day and table under
+
+    rollups/date=2025-04-30/service_account.hosts.feather
+
+(pickles without pyarrow). With DetectionEngine(df, rollups=RollupStore(dir))
+the built-in detectors read the days of their window that have a rollup from
+it, so a 90-day raw scan becomes a scan of 90 small tables, and summarize
+the raw rows of the other days (the current day, or a first day the window
+only partly covers). Both are summarized in time order, the order the
+detectors read the telemetry in, so the alerts are those of
+DetectionEngine(df).run() whatever the order of the frame; a day's rollup
+replaces whatever the frame holds for that day.
+
+Usage:
+    python telemetry_rollups.py CSV DIRECTORY
+"""
+import argparse
+import json
+import os
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from full_detect import (
+    load_data,
+    time_ordered,
+    detect_long_dwell_time,
+    detect_beaconing,
+    detect_weekend_exfiltration,
+    detect_distributed_reconnaissance,
+    detect_service_account_anomaly,
+    detect_cross_system_attack_chain
+)
+from incremental_detect import (
+    IncrementalDwellTime,
+    IncrementalBeaconing,
+    IncrementalWeekendExfiltration,
+    IncrementalReconnaissance,
+    IncrementalServiceAccount,
+    IncrementalAttackChain,
+    shift_sequence
+)
+from telemetry_cache import frame_to_table, table_to_frame
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+# Rollup name and incremental detector of each detector function
+ROLLUP_DETECTORS = {
+    detect_long_dwell_time: ('long_dwell', IncrementalDwellTime),
+    detect_beaconing: ('beaconing', IncrementalBeaconing),
+    detect_weekend_exfiltration: ('weekend_exfil', IncrementalWeekendExfiltration),
+    detect_distributed_reconnaissance: ('recon', IncrementalReconnaissance),
+    detect_service_account_anomaly: ('service_account', IncrementalServiceAccount),
+    detect_cross_system_attack_chain: ('attack_chain', IncrementalAttackChain),
+}
+
+# Per-day file listing the rollup tables and the rows they summarize
+MANIFEST_NAME = 'manifest.json'
+
+def _day_dir(directory, day):
+    return os.path.join(directory, f"date={day.strftime('%Y-%m-%d')}")
+
+def _write_table(table, path):
+    """Write a rollup table (Feather, or a pickle without pyarrow); returns the file name"""
+    if feather is not None:
+        path += '.feather'
+        feather.write_feather(frame_to_table(table), path, compression='uncompressed')
+    else:
+        path += '.pkl'
+        table.to_pickle(path)
+    return os.path.basename(path)
+
+def _read_tables(paths):
+    """
+    Concatenated rollup tables of several days, converted to pandas once
+    (day by day if their columns were stored differently)
+    """
+    if not paths[0].endswith('.feather'):
+        return pd.concat([pd.read_pickle(path) for path in paths], ignore_index=True)
+    
+    # Days without rows add nothing (and have no column types to match)
+    tables = [feather.read_table(path, memory_map=True) for path in paths]
+    tables = [table for table in tables if table.num_rows] or tables[:1]
+    metadata = tables[0].schema.metadata
+    if all(table.schema.metadata == metadata for table in tables):
+        try:
+            table = pa.concat_tables(tables, promote_options='permissive')
+            return table_to_frame(table.replace_schema_metadata(metadata)).reset_index(drop=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    return pd.concat([table_to_frame(table) for table in tables], ignore_index=True)
+
+def write_rollups(df, directory, days=None):
+    """
+    Materialize the per-day rollups of a normalized frame under `directory`,
+    for every day it holds (or only `days`), replacing existing rollups of
+    those days. Returns the days written.
+    """
+    df = df[df['timestamp'].notna()]
+    if days is not None:
+        df = df[df['timestamp'].dt.normalize().isin(pd.DatetimeIndex(days).normalize())]
+    
+    # Rows in time order, as the detectors read them (see time_ordered()), summarized in one pass per detector
+    rows = time_ordered(df)
+    day_values, day_starts, day_rows = np.unique(rows['timestamp'].dt.normalize().to_numpy(),
+                                                 return_index=True, return_counts=True)
+    summaries = {}
+    for name, detector_class in ROLLUP_DETECTORS.values():
+        for table_name, table in detector_class().summarize(rows).items():
+            # Sequence numbers count from the first row of each day
+            positions = table.groupby('day', sort=False, observed=True).indices
+            day_index = np.searchsorted(day_values, table['day'].to_numpy())
+            table = shift_sequence(table, -day_starts[day_index])
+            summaries[f'{name}.{table_name}'] = (table, positions)
+    
+    written = []
+    for day, n_rows in zip(day_values, day_rows):
+        day = pd.Timestamp(day)
+        day_dir = _day_dir(directory, day)
+        os.makedirs(day_dir, exist_ok=True)
+        
+        files = {}
+        for key, (table, positions) in summaries.items():
+            day_table = table.iloc[positions.get(day, [])].reset_index(drop=True)
+            files[key] = {'file': _write_table(day_table, os.path.join(day_dir, key)), 'rows': len(day_table)}
+        
+        # The manifest goes last, so a day without one has no complete rollup
+        tmp_path = os.path.join(day_dir, f'{MANIFEST_NAME}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'rows': int(n_rows), 'tables': files}, f)
+        os.replace(tmp_path, os.path.join(day_dir, MANIFEST_NAME))
+        written.append(day)
+    return written
+
+class RollupStore:
+    """Per-day rollups under a directory, read by the detectors of a DetectionEngine"""
+    def __init__(self, directory):
+        self.directory = directory
+    
+    def days(self):
+        """Days with a complete rollup"""
+        if not os.path.isdir(self.directory):
+            return []
+        days = []
+        for entry in os.listdir(self.directory):
+            if entry.startswith('date=') and os.path.exists(os.path.join(self.directory, entry, MANIFEST_NAME)):
+                days.append(pd.Timestamp(entry[len('date='):]))
+        return sorted(days)
+    
+    def manifest(self, day):
+        with open(os.path.join(_day_dir(self.directory, day), MANIFEST_NAME)) as f:
+            return json.load(f)
+    
+    def tables(self, days, name):
+        """
+        Rollup tables of a detector over consecutive days, as a dict of table
+        name -> DataFrame, with the sequence numbers of each day moved past the
+        rows of the days before it; and the number of rows they summarize
+        """
+        manifests = [self.manifest(day) for day in days]
+        offsets = np.cumsum([0] + [manifest['rows'] for manifest in manifests])
+        tables = {}
+        for key in dict.fromkeys(key for manifest in manifests for key in manifest['tables']):
+            table_name = key[len(name) + 1:]
+            if key != f'{name}.{table_name}':
+                continue
+            parts = [(os.path.join(_day_dir(self.directory, day), manifest['tables'][key]['file']),
+                      manifest['tables'][key]['rows'], offset)
+                     for day, manifest, offset in zip(days, manifests, offsets) if key in manifest['tables']]
+            table = _read_tables([path for path, _, _ in parts])
+            tables[table_name] = shift_sequence(table, np.repeat([offset for _, _, offset in parts],
+                                                                 [rows for _, rows, _ in parts]))
+        return tables, int(offsets[-1])
+    
+    def detector_for(self, detector):
+        """Rollup-backed version of a detector function (None if it has no rollups)"""
+        if detector not in ROLLUP_DETECTORS:
+            return None
+        
+        def detect(df, engine=None, **params):
+            return self.detect(detector, df, engine, **params)
+        return detect
+    
+    def detect(self, detector, df, engine, **params):
+        """
+        Alerts of a detector at the engine's reference time, from the rollups
+        of the days its window covers entirely and the raw rows of the others
+        """
+        name, detector_class = ROLLUP_DETECTORS[detector]
+        try:
+            incremental = detector_class(**params)
+            start = engine.now - pd.Timedelta(days=incremental.lookback_days)
+            
+            # Days covered by a rollup (the first one only if the window starts at its midnight)
+            rollup_days = [day for day in self.days() if day >= start]
+            if not rollup_days:
+                return detector(df, engine=engine, **params)
+            
+            # Raw rows of the other days in the window (without building the whole window)
+            timestamps = df['timestamp']
+            day_keys = timestamps.dt.normalize()
+            is_raw = ((timestamps >= start) & ~day_keys.isin(rollup_days)).to_numpy()
+            raw = df[is_raw]
+            raw_days = day_keys[is_raw]
+            engine.stage('raw', raw)
+            
+            # Raw days and runs of consecutive rollup days in day order, each numbered on after the previous ones
+            raw_positions = {pd.Timestamp(day): positions
+                             for day, positions in raw_days.groupby(raw_days.to_numpy()).indices.items()}
+            runs = []
+            for day in sorted(set(rollup_days) | set(raw_positions)):
+                if day in raw_positions or not runs or runs[-1][0] != 'rollups':
+                    runs.append(('raw' if day in raw_positions else 'rollups', []))
+                runs[-1][1].append(day)
+            
+            tables = {}
+            rows = 0
+            for kind, days in runs:
+                if kind == 'raw':
+                    run_tables = incremental.summarize(raw.iloc[raw_positions[days[0]]])
+                    run_rows = len(raw_positions[days[0]])
+                else:
+                    run_tables, run_rows = self.tables(days, name)
+                for table_name, table in run_tables.items():
+                    tables.setdefault(table_name, []).append(shift_sequence(table, rows))
+                rows += run_rows
+            incremental.fold({table_name: pd.concat(parts, ignore_index=True) for table_name, parts in tables.items()},
+                             rows)
+            engine.stage('rollups', pd.RangeIndex(incremental.state_rows()))
+            return incremental.alerts(engine.now)
+        except Exception as e:
+            print(f"Error in {name} rollups: {str(e)}")
+            traceback.print_exc()
+            return pd.DataFrame()
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize per-day rollups of the detector baselines")
+    parser.add_argument('csv', help="agent CSV export")
+    parser.add_argument('directory', help="rollup directory")
+    args = parser.parse_args()
+    
+    df = load_data(args.csv)
+    days = write_rollups(df, args.directory)
+    print(f"Wrote rollups of {len(days)} days under {args.directory}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+telemetry_store.py - Time-indexed store of normalized EDR telemetry
+
+The detectors slice the loaded frame by lookback window, and every slice of
+an unsorted frame is a boolean scan of the whole timestamp column plus a
+copy of the selected rows. TelemetryStore keeps the telemetry sorted by
+timestamp (stable, so rows with equal timestamps keep their order; rows
+without a timestamp last), and answers
+
+    window(start, end)                  rows with start <= timestamp < end
+    split(rows, at)                     rows of a time-sorted slice up to `at`, and after it
+    host_window(hostname, start, end)   one host's rows of a window (with by_host=True,
+                                        or built on first use)
+
+with binary searches. Windows are row slices of the sorted frame, i.e.
+views sharing its memory, so they must be treated as read-only like the
+other shared frames of the DetectionEngine. A frame that is already in time
+order is kept as it is.
+
+With DetectionEngine(TelemetryStore(df)) the detectors take their lookback
+windows from the store; their alerts are those of DetectionEngine.run()
+over the telemetry in time order.
+"""
+import numpy as np
+import pandas as pd
+
+class TelemetryStore:
+    """Telemetry sorted by timestamp, answering time-window queries by binary search"""
+    def __init__(self, df, by_host=False):
+        timestamps = df['timestamp']
+        valid = int(timestamps.notna().sum())
+        if timestamps.iloc[:valid].is_monotonic_increasing and timestamps.iloc[valid:].isna().all():
+            self.df = df
+        else:
+            order = np.argsort(timestamps.to_numpy(), kind='stable')  # NaT sorts last
+            self.df = df.take(order).reset_index(drop=True)
+        self.valid_rows = valid
+        self._timestamps = self.df['timestamp'].iloc[:valid]
+        self._hosts = None
+        if by_host:
+            self.host_positions()
+    
+    def __len__(self):
+        return len(self.df)
+    
+    def position(self, time, side='left'):
+        """Row position of `time` among the timestamps (after equal ones with side='right')"""
+        if time is None:
+            return 0 if side == 'left' else self.valid_rows
+        return int(self._timestamps.searchsorted(pd.Timestamp(time), side=side))
+    
+    def window(self, start=None, end=None):
+        """Rows with start <= timestamp < end (unbounded when None), as a view"""
+        stop = self.valid_rows if end is None else self.position(end)
+        return self.df.iloc[self.position(start):stop]
+    
+    def split(self, rows, at):
+        """Rows of a time-sorted slice with a timestamp up to `at` (inclusive), and those after it"""
+        cut = int(rows['timestamp'].searchsorted(pd.Timestamp(at), side='right'))
+        return rows.iloc[:cut], rows.iloc[cut:]
+    
+    def host_positions(self):
+        """Row positions of each hostname, in time order"""
+        if self._hosts is None:
+            hostnames = self.df['hostname'].iloc[:self.valid_rows]
+            self._hosts = hostnames.groupby(hostnames.to_numpy(), sort=False).indices
+        return self._hosts
+    
+    def host_window(self, hostname, start=None, end=None):
+        """Rows of one host with start <= timestamp < end"""
+        positions = self.host_positions().get(hostname, np.array([], dtype=np.intp))
+        timestamps = self._timestamps.iloc[positions]
+        first = 0 if start is None else int(timestamps.searchsorted(pd.Timestamp(start)))
+        last = len(positions) if end is None else int(timestamps.searchsorted(pd.Timestamp(end)))
+        return self.df.iloc[positions[first:last]]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+test_attack_chain_flags.py - Regression test for the attack-chain flag rules
+
+Checks initial_access_mask(), access_types() and activity_types() on flag
+columns mixing numbers, bools, strings and missing values, in plain and
+compact frames, against the values the original row-wise checks gave.
+
+Usage:
+    python test_attack_chain_flags.py
+"""
+import numpy as np
+import pandas as pd
+
+from full_detect import compact_frame, initial_access_mask, access_types, activity_types
+
+ROWS = pd.DataFrame({
+    'script_execution': [1, '1', '1.0', 0, None, True, 'no', 0],
+    'credential_access': [0, 0, 0, ' 1 ', 1.0, 0, np.nan, 0],
+    'registry_persistence_access': [0, 0, 0, 0, 0, 0, '1', 0],
+    'name': ['bash', 'cmd.exe', 'bash', 'PowerShell.exe', 'npm', 'bash', None, 'cmd.exe'],
+    'cmdline': ['ls', 'curl -O x', 'ls', 'Invoke-Download', 'npm install x', 'ls', None, 'dir'],
+    'conn_count': [0, 0, 9, 0, 0, 6, 0, 0]
+}, index=[10, 11, 12, 13, 14, 15, 16, 17])
+
+# '1.0' and ' 1 ' only count as set for the access/activity types, 'cmd.exe'
+# with curl and 'PowerShell.exe' with a download are initial access
+EXPECTED_MASK = [True, True, False, True, True, True, True, False]
+EXPECTED_ACCESS = ['script_execution', 'script_execution', 'script_execution', 'credential_theft',
+                   'credential_theft', 'script_execution', 'registry_persistence', 'other']
+EXPECTED_ACTIVITY = ['script_execution', 'script_execution', 'script_execution', 'credential_access',
+                     'credential_access', 'script_execution', 'persistence', 'other']
+
+def test_flag_rules():
+    for rows in (ROWS, compact_frame(ROWS)):
+        mask = initial_access_mask(rows)
+        assert list(mask.index) == list(rows.index)
+        assert mask.tolist() == EXPECTED_MASK
+        assert access_types(rows).tolist() == EXPECTED_ACCESS
+        assert activity_types(rows).tolist() == EXPECTED_ACTIVITY
+    
+    # Missing flag columns set nothing; busy connections are network activity
+    rows = ROWS[['name', 'cmdline', 'conn_count']]
+    assert initial_access_mask(rows).tolist() == [False, True, False, True, True, False, False, False]
+    assert activity_types(rows).tolist() == ['other', 'other', 'network_activity', 'other', 'other',
+                                             'network_activity', 'other', 'other']
+
+if __name__ == "__main__":
+    test_flag_rules()
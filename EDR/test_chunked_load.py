@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+test_chunked_load.py - Regression test for the chunked CSV loader
+
+Requires the chunks of load_data_chunked(), concatenated, to equal
+load_data() on synthetic_data.csv at chunk sizes that cut the file in many
+places, and on a file whose column types drift between chunks (integers
+that become floats, flags or numbers that become text, columns empty in
+the first chunks).
+
+Usage:
+    python test_chunked_load.py
+"""
+import contextlib
+import io
+import os
+import tempfile
+
+import pandas as pd
+
+from full_detect import infer_csv_dtypes, load_data, load_data_chunked
+from testing_helpers import SYNTHETIC_FILE
+
+def assert_chunks_match(path, chunksizes):
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = load_data(path)
+        for chunksize in chunksizes:
+            chunks = list(load_data_chunked(path, chunksize=chunksize))
+            assert all(len(chunk) <= chunksize for chunk in chunks)
+            pd.testing.assert_frame_equal(pd.concat(chunks), expected, obj=f'chunksize={chunksize}')
+
+def test_matches_load_data():
+    assert_chunks_match(SYNTHETIC_FILE, [1, 7, 50, len(pd.read_csv(SYNTHETIC_FILE)) + 1])
+
+def test_dtype_drift():
+    rows = []
+    for i in range(40):
+        rows.append({
+            'hostname': '# comment row' if i == 3 else f'host{i % 4}',
+            'timestamp': f'2025-04-{1 + i % 28:02d} 10:00:00' if i != 5 else 'not a time',
+            'pid': i if i < 30 else i + 0.5,
+            'conn_count': '' if i < 25 else i,
+            'script_execution': i % 2 if i < 35 else 'yes',
+            'rss': i * 1000 if i != 33 else 'unknown',
+            'remote_ips': '["10.0.0.1"]' if i % 3 else '',
+            'outbound_bytes': f'[{i}, {i * 2}]' if i % 4 else '',
+            'cmdline': '' if i < 10 else f'cmd.exe /c {i}',
+        })
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'drift.csv')
+        pd.DataFrame(rows).to_csv(path, index=False)
+        
+        dtypes = infer_csv_dtypes(path, chunksize=4)
+        assert dtypes['pid'] == 'float64' and dtypes['rss'] == 'object', dtypes
+        assert_chunks_match(path, [4, 9, 13])
+
+if __name__ == "__main__":
+    test_matches_load_data()
+    test_dtype_drift()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+test_compact_frame.py - Regression test for the compact frame storage
+
+Runs every detector over synthetic_data.csv (extended with the network
+scenarios of testing_helpers.py) loaded normally and in compact
+storage, and requires the same alerts from both, with the string columns
+stored as categoricals, the flag columns as bools and a smaller frame.
+
+Usage:
+    python test_compact_frame.py
+"""
+import contextlib
+import io
+from datetime import timedelta
+
+import pandas as pd
+
+from full_detect import load_data, compact_frame, DetectionEngine
+from testing_helpers import SYNTHETIC_FILE, network_scenarios, assert_same_alerts
+
+def test_flag_columns():
+    flags = pd.DataFrame({
+        'script_execution': [1, '1', 0, '0', None],
+        'credential_access': [True, False, 1, 0, None],
+        'exe_mismatch': ['yes', 'no', '1', '0', None]
+    })
+    compact = compact_frame(flags)
+    assert compact['script_execution'].tolist() == [True, True, False, False, False]
+    assert compact['credential_access'].tolist() == [True, False, True, False, False]
+    
+    # Anything but 0/1 values is left as it is
+    assert compact['exe_mismatch'].equals(flags['exe_mismatch'])
+
+def test_matches_plain_frame():
+    with contextlib.redirect_stdout(io.StringIO()):
+        base = load_data(SYNTHETIC_FILE)
+    now = (base['timestamp'].max() + timedelta(days=1)).to_pydatetime()
+    df = network_scenarios(base, now)
+    compact = compact_frame(df)
+    
+    for col in ('hostname', 'user', 'name', 'os_type'):
+        assert isinstance(compact[col].dtype, pd.CategoricalDtype), col
+    assert compact['script_execution'].dtype == bool
+    assert compact.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum() / 2
+    
+    expected = DetectionEngine(df, now=now).run()
+    actual = DetectionEngine(compact, now=now).run()
+    assert list(actual) == list(expected)
+    for name, alerts in expected.items():
+        assert_same_alerts(name, alerts, actual[name])
+    
+    # The scenario rows must actually raise alerts, otherwise the check is vacuous
+    raised = {name: len(alerts) for name, alerts in expected.items() if len(alerts)}
+    assert len(raised) >= 2
+
+if __name__ == "__main__":
+    test_flag_columns()
+    test_matches_plain_frame()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+test_detection_backends.py - Parity test of the detector aggregation backends
+
+Runs every detector over synthetic_data.csv extended with the network
+scenarios of testing_helpers.py, and over a generated data set
+raising every alert type, in plain and compact storage, on each installed
+backend (detection_backends.py), and requires the alerts of the pandas
+backend, dtypes included. Backends whose package is missing are reported
+and skipped.
+
+Usage:
+    python test_detection_backends.py
+"""
+import contextlib
+import io
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from detection_backends import BACKENDS, available_backends, get_backend
+from full_detect import load_data, compact_frame, DetectionEngine
+from testing_helpers import SYNTHETIC_FILE, network_scenarios, assert_same_alerts, generated_frame
+
+def data_sets():
+    with contextlib.redirect_stdout(io.StringIO()):
+        base = load_data(SYNTHETIC_FILE)
+    now = (base['timestamp'].max() + timedelta(days=1)).to_pydatetime()
+    yield network_scenarios(base, now), now
+    yield generated_frame()
+
+def test_aggregate():
+    # Missing keys, categorical keys, empty groups and all-missing values
+    events = pd.DataFrame({
+        'host': pd.Categorical(['b', 'a', None, 'b', 'c', 'a'], categories=['c', 'b', 'a', 'unused']),
+        'user': ['u1', None, 'u2', 'u1', 'u3', None],
+        'value': [1.0, np.nan, 3.0, 4.0, np.nan, 6.0],
+        'flag': [True, False, True, False, False, False],
+        'ts': pd.to_datetime(['2025-01-02', '2025-01-01', None, '2025-01-03', '2025-01-05', '2025-01-04'])
+    })
+    aggregations = {
+        'rows': ('value', 'size'),
+        'values': ('value', 'count'),
+        'total': ('value', 'sum'),
+        'average': ('value', 'mean'),
+        'first': ('ts', 'min'),
+        'last': ('ts', 'max'),
+        'users': ('user', 'nunique'),
+        'flagged': ('flag', 'any'),
+        'flags': ('flag', 'sum')
+    }
+    pandas_backend = get_backend('pandas')
+    for name in available_backends():
+        backend = get_backend(name)
+        for keys, sort, dropna in ((['host'], True, True), (['host', 'user'], False, False),
+                                   (['user', 'host'], True, False)):
+            expected = pandas_backend.aggregate(events, keys, aggregations, sort, dropna)
+            actual = backend.aggregate(events, keys, aggregations, sort, dropna)
+            pd.testing.assert_frame_equal(actual, expected)
+        assert backend.aggregate(events.iloc[:0], ['host'], aggregations).empty
+
+def test_backends_match_pandas():
+    missing = [name for name in BACKENDS if name not in available_backends()]
+    if missing:
+        print(f"Skipped (not installed): {', '.join(missing)}")
+    
+    raised = set()
+    for df, now in data_sets():
+        expected = DetectionEngine(df, now=now).run()
+        raised |= {name for name, alerts in expected.items() if len(alerts)}
+        for frame in (df, compact_frame(df)):
+            for name in available_backends():
+                actual = DetectionEngine(frame, now=now, backend=name).run()
+                assert list(actual) == list(expected)
+                for detector, alerts in expected.items():
+                    assert_same_alerts(f"{detector} ({name})", alerts, actual[detector])
+                    assert list(actual[detector].dtypes) == list(alerts.dtypes), (detector, name)
+    
+    # Every detector must actually raise alerts, otherwise the check is vacuous
+    assert raised == set(expected), raised
+
+def test_unknown_backend():
+    try:
+        DetectionEngine(pd.DataFrame(), backend='spark')
+    except ValueError:
+        return
+    raise AssertionError("unknown backend accepted")
+
+if __name__ == "__main__":
+    test_aggregate()
+    test_backends_match_pandas()
+    test_unknown_backend()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+test_detection_rules.py - Regression test for the declarative detection rules
+
+Runs the built-in rules (detection_rules.yaml) over synthetic_data.csv
+extended with the network scenarios of testing_helpers.py, and over
+a generated data set raising every alert type, in plain and compact storage,
+and requires the alerts of DetectionEngine.run(). Tenant rules extending the
+built-in ones must match the detectors run with the same parameters while
+sharing the steps they have in common.
+
+Usage:
+    python test_detection_rules.py
+"""
+import contextlib
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+
+from full_detect import (
+    load_data,
+    compact_frame,
+    DetectionEngine,
+    detect_beaconing,
+    detect_long_dwell_time,
+    detect_service_account_anomaly
+)
+from detection_rules import RuleDetectionEngine, compile_rules, load_rules
+from testing_helpers import SYNTHETIC_FILE, network_scenarios, assert_same_alerts, generated_frame
+
+def scenario_frame():
+    with contextlib.redirect_stdout(io.StringIO()):
+        base = load_data(SYNTHETIC_FILE)
+    now = (base['timestamp'].max() + timedelta(days=1)).to_pydatetime()
+    return network_scenarios(base, now), now
+
+def test_builtin_rules_match_detectors():
+    raised = set()
+    for df, now in (scenario_frame(), generated_frame()):
+        expected = DetectionEngine(df, now=now).run()
+        for frame in (df, compact_frame(df)):
+            engine = RuleDetectionEngine(frame, now=now)
+            actual = engine.run()
+            assert list(actual) == list(expected)
+            for name, alerts in expected.items():
+                assert_same_alerts(name, alerts, actual[name])
+            
+            # Rules sharing a window, filter and explode compute them once
+            assert engine.stats['steps_reused'] > 0
+        raised |= {name for name, alerts in expected.items() if len(alerts)}
+    
+    # Every rule must actually raise alerts, otherwise the check is vacuous
+    assert raised == set(expected), raised
+
+def test_tenant_rules():
+    df, now = generated_frame()
+    tenant_rules = [
+        {'name': 'tenant_a_beaconing', 'extends': 'beaconing', 'params': {'active_days_threshold': 5}},
+        {'name': 'tenant_b_beaconing', 'extends': 'beaconing', 'params': {'consistency_threshold': 0.5}},
+        {'name': 'tenant_a_dwell', 'extends': 'long_dwell', 'params': {'days_threshold': 10}},
+        {'name': 'tenant_a_service', 'extends': 'service_account', 'params': {'recent_days': 20}}
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'tenant_rules.json')
+        with open(path, 'w') as f:
+            json.dump({'rules': tenant_rules}, f)
+        engine = RuleDetectionEngine(df, now=now, rules=load_rules(path))
+    actual = engine.run()
+    
+    expected = DetectionEngine(df, now=now)
+    expected.register('tenant_a_beaconing', detect_beaconing, active_days_threshold=5)
+    expected.register('tenant_b_beaconing', detect_beaconing, consistency_threshold=0.5)
+    expected.register('tenant_a_dwell', detect_long_dwell_time, days_threshold=10)
+    expected.register('tenant_a_service', detect_service_account_anomaly, recent_days=20)
+    for name, alerts in expected.run().items():
+        assert_same_alerts(name, alerts, actual[name])
+    
+    # Both beaconing variants share everything up to their thresholds
+    assert engine.stats['steps_reused'] >= 7, engine.stats
+
+def test_invalid_rules():
+    invalid = [
+        {'name': 'unknown_function', 'steps': [{'where': 'no_such(pid)'}], 'alert': {'fields': {'a': 1}}},
+        {'name': 'unknown_step', 'steps': [{'scan': 'pid'}], 'alert': {'fields': {'a': 1}}},
+        {'name': 'aggregate_outside_group', 'steps': [{'where': 'max(pid) > 1'}], 'alert': {'fields': {'a': 1}}},
+        {'name': 'no_base', 'extends': 'missing', 'params': {}}
+    ]
+    for rule in invalid:
+        try:
+            compile_rules([rule])
+        except ValueError:
+            continue
+        raise AssertionError(f"{rule['name']} compiled")
+
+if __name__ == "__main__":
+    test_builtin_rules_match_detectors()
+    test_tenant_rules()
+    test_invalid_rules()
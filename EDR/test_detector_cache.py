@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+test_detector_cache.py - Regression test for the detector result cache
+
+Runs the detectors over a generated data set raising every alert type with
+a DetectorResultCache and requires the alerts of an uncached run, both when
+computed and when read back. A changed threshold, or a changed row in a
+detector's window and columns, must recompute that detector alone, and the
+least recently used entries are evicted past the size bound.
+
+Usage:
+    python test_detector_cache.py
+"""
+import os
+import tempfile
+from datetime import timedelta
+
+import pandas as pd
+
+from detector_cache import DetectorResultCache
+from full_detect import DetectionEngine, compact_frame, detect_cross_system_attack_chain
+from testing_helpers import generated_frame
+
+def assert_same_results(expected, actual):
+    assert list(expected) == list(actual)
+    for name, alerts in expected.items():
+        pd.testing.assert_frame_equal(alerts, actual[name])
+
+def test_cached_results_match():
+    df, now = generated_frame()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        expected = DetectionEngine(df, now=now).run()
+        raised = {name for name, alerts in expected.items() if len(alerts)}
+        assert raised == set(expected), raised
+        
+        cache = DetectorResultCache(os.path.join(tmp_dir, 'results'))
+        assert_same_results(expected, DetectionEngine(df, now=now, result_cache=cache).run())
+        assert cache.stats == {'hits': 0, 'misses': 6, 'evictions': 0}, cache.stats
+        
+        # Read back, also for the compact frame and with the detection time of the new run
+        assert_same_results(expected, DetectionEngine(df, now=now, result_cache=cache).run())
+        assert_same_results(expected, DetectionEngine(compact_frame(df), now=now, result_cache=cache).run())
+        later = now + timedelta(seconds=1)
+        alerts = DetectionEngine(df, now=later, result_cache=cache).run(['recon'])['recon']
+        assert cache.stats['hits'] == 13 and (alerts['detection_time'] == later).all()
+        
+        # A changed threshold recomputes its detector alone
+        engine = DetectionEngine(df, now=now, result_cache=cache).register_defaults()
+        engine.register('attack_chain', detect_cross_system_attack_chain, min_hosts=4)
+        results = engine.run()
+        assert cache.stats['hits'] == 18 and cache.stats['misses'] == 7
+        assert_same_results(DetectionEngine(df, now=now).register_defaults().register(
+            'attack_chain', detect_cross_system_attack_chain, min_hosts=4).run(), results)
+        
+        # A changed command line invalidates the detectors reading command lines
+        changed = df.copy()
+        changed.loc[changed['timestamp'].idxmax(), 'cmdline'] = 'whoami /all'
+        DetectionEngine(changed, now=now, result_cache=cache).run()
+        assert cache.stats['hits'] == 22 and cache.stats['misses'] == 9, cache.stats
+
+def test_lru_eviction():
+    alerts = pd.DataFrame({'hostname': [f'WS-{i:04d}' for i in range(200)]})
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DetectorResultCache(tmp_dir)
+        cache.put('a', alerts)
+        entry_bytes = cache.entries()[0][1]
+        cache.max_bytes = 2 * entry_bytes
+        cache.put('b', alerts)
+        
+        # Reading 'a' makes 'b' the least recently used entry
+        os.utime(os.path.join(tmp_dir, 'b.pkl'), ns=(1, 1))
+        os.utime(os.path.join(tmp_dir, 'a.pkl'), ns=(2, 2))
+        assert cache.get('a') is not None
+        cache.put('c', alerts)
+        assert cache.get('b') is None and cache.get('a') is not None and cache.get('c') is not None
+        assert cache.stats['evictions'] == 1
+        assert cache.clear() == 2
+
+if __name__ == "__main__":
+    test_cached_results_match()
+    test_lru_eviction()
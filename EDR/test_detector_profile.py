@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+test_detector_profile.py - Regression test for the per-detector profiles
+
+Profiles one DetectionEngine run over a generated data set raising every
+alert type and requires each detector's record to hold its stages in order,
+row counts matching the frames it read and returned, stage timings within
+the detector's time, and to_json() to give that structure. The
+--profile-json and --profile-table flags of test_full_detect.py must write
+the same structure and print one table line per detector and stage.
+
+Usage:
+    python test_detector_profile.py
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from full_detect import DEFAULT_DETECTORS, DetectionEngine, DetectorProfile
+from testing_helpers import generated_frame, generated_telemetry
+import test_full_detect
+
+# Stages the built-in detectors mark on a data set raising their alerts
+EXPECTED_STAGES = {
+    'long_dwell': ['window', 'summarize', 'alerts'],
+    'beaconing': ['explode', 'summarize', 'alerts'],
+    'weekend_exfil': ['traffic', 'baseline', 'summarize', 'alerts'],
+    'recon': ['window', 'classify', 'summarize', 'alerts'],
+    'service_account': ['window', 'service_rows', 'summarize', 'alerts'],
+    'attack_chain': ['window', 'initial_access', 'activity', 'summarize', 'alerts'],
+}
+
+RECORD_KEYS = {'detector', 'input_rows', 'output_rows', 'seconds', 'stages',
+               'tracemalloc_peak_bytes', 'rss_peak_bytes'}
+
+def assert_profile_structure(profile):
+    """The JSON profile of a run of the built-in detectors, parsed and checked"""
+    data = json.loads(profile if isinstance(profile, str) else profile.to_json())
+    assert set(data) == {'detectors', 'total_seconds'}
+    assert [record['detector'] for record in data['detectors']] == [name for name, _ in DEFAULT_DETECTORS]
+    for record in data['detectors']:
+        assert set(record) == RECORD_KEYS, record
+        assert record['stages'] and record['stages'][-1]['stage'] == 'alerts', record
+        assert record['stages'][-1]['rows'] == record['output_rows']
+        for stage in record['stages']:
+            assert set(stage) == {'stage', 'rows', 'seconds'} and stage['rows'] >= 0
+        assert sum(stage['seconds'] for stage in record['stages']) <= record['seconds'] + 1e-9
+    assert abs(data['total_seconds'] - sum(record['seconds'] for record in data['detectors'])) < 1e-9
+    return data
+
+def test_engine_profile():
+    df, now = generated_frame()
+    profile = DetectorProfile()
+    results = DetectionEngine(df, now=now, profile=profile).run()
+    
+    data = assert_profile_structure(profile)
+    for record in data['detectors']:
+        name = record['detector']
+        assert [stage['stage'] for stage in record['stages']] == EXPECTED_STAGES[name], record['stages']
+        assert record['input_rows'] == len(df)
+        assert record['output_rows'] == len(results[name]) > 0
+        assert record['tracemalloc_peak_bytes'] is None
+    
+    # One table line per detector and per stage under the header
+    lines = profile.summary_table().splitlines()
+    assert len(lines) == 1 + sum(1 + len(stages) for stages in EXPECTED_STAGES.values())
+    
+    # With trace_memory the call's allocations are traced, and tracing stops afterwards
+    profile = DetectorProfile(trace_memory=True)
+    DetectionEngine(df, now=now, profile=profile).run(['recon'])
+    assert profile.records[0]['tracemalloc_peak_bytes'] > 0
+    assert not tracemalloc.is_tracing()
+    
+    # Detectors run outside a profile mark nothing
+    DetectionEngine(df, now=now).run(['recon'])
+    assert len(profile.records) == 1
+
+def test_profile_flags():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shutil.copy(generated_telemetry()[0], os.path.join(tmp_dir, 'attack_file.csv'))
+        json_path = os.path.join(tmp_dir, 'profile.json')
+        output = io.StringIO()
+        cwd, argv = os.getcwd(), sys.argv
+        try:
+            os.chdir(tmp_dir)
+            sys.argv = ['test_full_detect.py', '--profile-json', json_path, '--profile-table']
+            with contextlib.redirect_stdout(output):
+                test_full_detect.main()
+        finally:
+            os.chdir(cwd)
+            sys.argv = argv
+        
+        with open(json_path) as f:
+            data = assert_profile_structure(f.read())
+    
+    table = output.getvalue().split('===== PROFILE =====', 1)[1]
+    for record in data['detectors']:
+        assert f"\n{record['detector']} " in table
+        for stage in record['stages']:
+            assert f"\n  {stage['stage']} " in table
+
+if __name__ == "__main__":
+    test_engine_profile()
+    test_profile_flags()
@@ -1,32 +1,137 @@
 #!/usr/bin/env python3
 """
 run_detections.py - Execute all detection functions from full_detect.py
+
+Usage:
+    python test_full_detect.py [--compact] [--backend NAME] [--rules PATH] [--rollups DIR]
+                               [--result-cache DIR] [--result-cache-mb N] [--time-index]
+                               [--profile-json PATH] [--profile-table] [--trace-memory]
+    python test_full_detect.py --partitions SOURCE
+
+--profile-json writes per-detector stage timings, row counts and memory
+peaks as JSON ('-' for stdout); --profile-table prints them as a table.
+--compact stores string and flag columns as categoricals and bools.
+--backend runs the detectors' grouped aggregations on pandas (default),
+polars or duckdb.
+--rules also runs the detection rules of a YAML/JSON rule file (see
+detection_rules.py), which may extend the built-in detectors.
+--rollups reads the days with precomputed daily summaries (written by
+telemetry_rollups.py) from those instead of the raw rows.
+--result-cache reads back the alerts of detectors whose input window and
+parameters are unchanged since an earlier run (see detector_cache.py),
+keeping at most --result-cache-mb megabytes of results.
+--time-index keeps the telemetry sorted by timestamp and takes the lookback
+windows as binary-searched views of it (see telemetry_store.py).
+--partitions runs the detectors out of core over a directory or glob of
+date=YYYY-MM-DD/host-bucket=N partitions instead (see partitioned_detect.py).
 """
+import argparse
 import pandas as pd
 from datetime import datetime
 
 # Import all detection functions from full_detect.py
 from full_detect import (
-    load_data,
     detect_long_dwell_time,
     detect_beaconing,
     detect_weekend_exfiltration,
     detect_distributed_reconnaissance,
     detect_service_account_anomaly,
-    detect_cross_system_attack_chain
+    detect_cross_system_attack_chain,
+    DetectionEngine,
+    DetectorProfile
 )
+from detection_backends import BACKENDS
+from detector_cache import DEFAULT_MAX_BYTES, DetectorResultCache
+from detection_rules import RuleDetectionEngine, load_rules
+from partitioned_detect import PartitionedDetectionEngine
+from telemetry_rollups import RollupStore
+from telemetry_store import TelemetryStore
+from telemetry_cache import load_data_cached
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Execute all detection functions from full_detect.py")
+    parser.add_argument('--compact', action='store_true',
+                        help="store string columns as categoricals and flag columns as bools")
+    parser.add_argument('--backend', choices=list(BACKENDS), default='pandas',
+                        help="backend of the detectors' grouped aggregations (default: pandas)")
+    parser.add_argument('--rules', metavar='PATH',
+                        help="also run the detection rules of a YAML/JSON rule file")
+    parser.add_argument('--rollups', metavar='DIR',
+                        help="read the days with per-day rollups from this directory")
+    parser.add_argument('--result-cache', metavar='DIR',
+                        help="cache detector results in this directory, keyed by input window and parameters")
+    parser.add_argument('--result-cache-mb', type=int, default=DEFAULT_MAX_BYTES >> 20,
+                        help=f"size bound of the result cache (default: {DEFAULT_MAX_BYTES >> 20} MB)")
+    parser.add_argument('--time-index', action='store_true',
+                        help="sort the telemetry by timestamp and binary-search the lookback windows")
+    parser.add_argument('--partitions', metavar='SOURCE',
+                        help="run out of core over a directory or glob of date=/host-bucket= partitions")
+    parser.add_argument('--profile-json', metavar='PATH',
+                        help="write per-detector timings, row counts and memory peaks as JSON ('-' for stdout)")
+    parser.add_argument('--profile-table', action='store_true',
+                        help="print the per-detector profile as a table")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also record tracemalloc peaks (slower)")
+    return parser.parse_args()
+
+def print_results(results, start_time):
+    """Print the alert counts of every detector and the execution time since `start_time`"""
+    # Calculate execution time
+    end_time = datetime.now()
+    execution_time = (end_time - start_time).total_seconds()
+    
+    # Print results summary
+    print("\n===== RESULTS =====")
+    total_alerts = 0
+    
+    for name, result in results.items():
+        alert_count = len(result) if isinstance(result, pd.DataFrame) and not result.empty else 0
+        total_alerts += alert_count
+        print(f"{name}: {alert_count} alerts")
+    
+    print(f"\nTotal alerts: {total_alerts}")
+    print(f"Execution time: {execution_time:.2f} seconds")
+
+def run_partitioned(source):
+    """Run the incremental detectors over partitioned telemetry, one partition at a time"""
+    print(f"Reading partitions from {source}...")
+    start_time = datetime.now()
+    engine = PartitionedDetectionEngine(source)
+    results = engine.run()
+    print(f"Partitions read: {engine.stats['partitions_read']} of {engine.stats['partitions']} "
+          f"({engine.stats['rows_read']} rows)")
+    print_results(results, start_time)
 
 def main():
+    args = parse_args()
+    if args.partitions:
+        run_partitioned(args.partitions)
+        print("\nAnalysis completed!")
+        return
+    
     # Path to the CSV file
     file_path = "attack_file.csv"
     
-    # Load and preprocess data
+    # Load and preprocess data (reuses the columnar cache when the CSV is unchanged)
     print(f"Loading data from {file_path}...")
-    df = load_data(file_path)
+    df = load_data_cached(file_path, compact=args.compact)
+    
+    # Time-sorted telemetry with binary-searched windows, if requested
+    telemetry = TelemetryStore(df) if args.time_index else df
+    if args.time_index:
+        df = telemetry.df
     
     # Record start time
     start_time = datetime.now()
     
+    # Shared lookback windows and exploded tables, computed once for all detectors
+    profile = DetectorProfile(trace_memory=args.trace_memory)
+    rollups = RollupStore(args.rollups) if args.rollups else None
+    result_cache = (DetectorResultCache(args.result_cache, max_bytes=args.result_cache_mb << 20)
+                    if args.result_cache else None)
+    engine = DetectionEngine(telemetry, profile=profile, backend=args.backend, rollups=rollups,
+                             result_cache=result_cache)
+    
     # Run all detection functions with error handling
     print("\nRunning all detection functions...")
     results = {}
@@ -35,63 +140,74 @@ def main():
     print("\nScenario 1: Advanced Persistent Threat")
     try:
         print("  Running long dwell time detection...")
-        results["long_dwell"] = detect_long_dwell_time(df)
+        detector = engine.detector_for(detect_long_dwell_time)
+        results["long_dwell"] = profile.run("long_dwell", detector, df, engine=engine)
     except Exception as e:
         print(f"  Error in long dwell time detection: {e}")
         results["long_dwell"] = pd.DataFrame()
     
     try:
         print("  Running beaconing detection...")
-        results["beaconing"] = detect_beaconing(df)
+        detector = engine.detector_for(detect_beaconing)
+        results["beaconing"] = profile.run("beaconing", detector, df, engine=engine)
     except Exception as e:
         print(f"  Error in beaconing detection: {e}")
         results["beaconing"] = pd.DataFrame()
     
     try:
         print("  Running weekend exfiltration detection...")
-        results["weekend_exfil"] = detect_weekend_exfiltration(df)
+        detector = engine.detector_for(detect_weekend_exfiltration)
+        results["weekend_exfil"] = profile.run("weekend_exfil", detector, df, engine=engine)
     except Exception as e:
         print(f"  Error in weekend exfiltration detection: {e}")
         results["weekend_exfil"] = pd.DataFrame()
-
+    
     # Lateral Movement
     print("\nScenario 2: Lateral Movement")
     try:
         print("  Running distributed reconnaissance detection...")
-        results["recon"] = detect_distributed_reconnaissance(df)
+        detector = engine.detector_for(detect_distributed_reconnaissance)
+        results["recon"] = profile.run("recon", detector, df, engine=engine)
     except Exception as e:
         print(f"  Error in distributed reconnaissance detection: {e}")
         results["recon"] = pd.DataFrame()
     
     try:
         print("  Running service account anomaly detection...")
-        results["service_account"] = detect_service_account_anomaly(df)
+        detector = engine.detector_for(detect_service_account_anomaly)
+        results["service_account"] = profile.run("service_account", detector, df, engine=engine)
     except Exception as e:
         print(f"  Error in service account anomaly detection: {e}")
         results["service_account"] = pd.DataFrame()
     
     try:
         print("  Running cross-system attack chain detection...")
-        results["attack_chain"] = detect_cross_system_attack_chain(df)
+        detector = engine.detector_for(detect_cross_system_attack_chain)
+        results["attack_chain"] = profile.run("attack_chain", detector, df, engine=engine)
     except Exception as e:
         print(f"  Error in cross-system attack chain detection: {e}")
         results["attack_chain"] = pd.DataFrame()
     
-    # Calculate execution time
-    end_time = datetime.now()
-    execution_time = (end_time - start_time).total_seconds()
+    # Tenant rules, sharing their common steps in one pass
+    if args.rules:
+        print(f"\nRules: {args.rules}")
+        rule_engine = RuleDetectionEngine(df, now=engine.now, rules=load_rules(args.rules), profile=profile)
+        results.update(rule_engine.run())
     
-    # Print results summary
-    print("\n===== RESULTS =====")
-    total_alerts = 0
+    print_results(results, start_time)
+    if result_cache is not None:
+        print(f"Result cache: {result_cache.stats['hits']} hits, {result_cache.stats['misses']} misses")
     
-    for name, result in results.items():
-        alert_count = len(result) if isinstance(result, pd.DataFrame) and not result.empty else 0
-        total_alerts += alert_count
-        print(f"{name}: {alert_count} alerts")
+    if args.profile_table:
+        print("\n===== PROFILE =====")
+        print(profile.summary_table())
     
-    print(f"\nTotal alerts: {total_alerts}")
-    print(f"Execution time: {execution_time:.2f} seconds")
+    if args.profile_json == '-':
+        print(profile.to_json())
+    elif args.profile_json:
+        with open(args.profile_json, 'w') as f:
+            f.write(profile.to_json())
+        print(f"Profile written to {args.profile_json}")
     print("\nAnalysis completed!")
 
 if __name__ == "__main__":
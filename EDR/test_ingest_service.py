@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+test_ingest_service.py - Regression test for the streaming ingest service
+
+Streams a generated data set raising every alert type as NDJSON records
+(list columns as JSON arrays), in time order, into IngestService over TCP, through a small
+bounded queue, and requires the alerts of a full recompute over the same
+telemetry loaded with load_data(). Records posted over HTTP are batched the
+same way, malformed lines are rejected, and the queue never grows past its
+bound. HTTP bodies are queued while they arrive, requests beyond
+max_http_requests wait unread, and over-long lines are refused.
+
+Usage:
+    python test_ingest_service.py
+"""
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+
+from full_detect import LIST_COLUMNS, DetectionEngine
+from ingest_service import IngestService
+from testing_helpers import assert_same_alerts, generated_frame, generated_telemetry
+
+def ndjson_lines(path):
+    """NDJSON lines of the rows of a telemetry CSV in time order, as agents would send them"""
+    raw = pd.read_csv(path, low_memory=False)
+    raw = raw.iloc[np.argsort(pd.to_datetime(raw['timestamp']).to_numpy(), kind='stable')]
+    records = raw.astype(object).where(raw.notna(), None).to_dict('records')
+    for record in records:
+        for col in LIST_COLUMNS:
+            if isinstance(record.get(col), str):
+                try:
+                    record[col] = json.loads(record[col])
+                except ValueError:
+                    pass
+    return [json.dumps(record).encode('utf-8') + b'\n' for record in records]
+
+async def stream_lines(lines, service, chunk=1000):
+    address = await service.start(port=0)
+    _, writer = await asyncio.open_connection(*address['stream'])
+    for start in range(0, len(lines), chunk):
+        writer.write(b''.join(lines[start:start + chunk]))
+        await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+    return await service.stop()
+
+async def post(address, body):
+    reader, writer = await asyncio.open_connection(*address)
+    writer.write(f"POST /telemetry HTTP/1.1\r\nHost: edr\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = response.split(b'\r\n', 1)[0]
+    return status, json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+def test_stream_matches_full_recompute():
+    lines = ndjson_lines(generated_telemetry()[0])
+    df, now = generated_frame()
+    
+    service = IngestService(batch_size=2000, max_queue=500, detect_interval=3600,
+                            on_alerts=None, clock=lambda: now)
+    actual = asyncio.run(stream_lines(lines, service))
+    assert service.stats['rows'] == len(df) and service.stats['batches'] >= 10
+    assert service.stats['queue_high_water'] <= 500
+    
+    expected = DetectionEngine(df, now=now).run()
+    for name, alerts in expected.items():
+        assert_same_alerts(name, alerts, actual[name])
+    
+    # Every detector must actually raise alerts, otherwise the check is vacuous
+    raised = {name for name, alerts in expected.items() if len(alerts)}
+    assert raised == set(expected), raised
+
+def test_http_and_backpressure():
+    record = {'hostname': 'WS-01', 'timestamp': '2025-04-29 10:00:00', 'pid': 10, 'name': 'a.exe',
+              'remote_ips': ['10.0.0.1'], 'outbound_bytes': [100, 200]}
+    
+    async def run():
+        service = IngestService(batch_size=100, batch_interval=0.05, max_queue=50, on_alerts=None)
+        address = (await service.start(http_port=0))['http']
+        body = b''.join(json.dumps(dict(record, pid=pid)).encode() + b'\n' for pid in range(1000))
+        responses = await asyncio.gather(post(address, body), post(address, body + b'{"truncated": \n'))
+        await service.stop()
+        return service, responses
+    
+    service, responses = asyncio.run(run())
+    assert [status for status, _ in responses] == [b'HTTP/1.1 202 Accepted'] * 2
+    assert responses[1][1] == {'accepted': 1000, 'rejected': 1}
+    assert service.stats['rows'] == 2000 and service.stats['rejected'] == 1
+    assert service.stats['queue_high_water'] <= 50
+
+async def wait_for_records(service, count):
+    for _ in range(200):
+        if service.stats['records'] >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{service.stats['records']} records queued, expected {count}")
+
+def test_http_streaming_and_limits():
+    record = {'hostname': 'WS-01', 'timestamp': '2025-04-29 10:00:00', 'pid': 10, 'name': 'a.exe'}
+    body = b''.join(json.dumps(dict(record, pid=pid)).encode() + b'\n' for pid in range(100))
+    headers = f"POST /telemetry HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+    
+    async def run():
+        service = IngestService(batch_interval=0.05, max_http_requests=1, max_line_bytes=1000, on_alerts=None)
+        address = (await service.start(http_port=0))['http']
+        
+        # The first half of a body is queued before the rest arrives
+        reader, writer = await asyncio.open_connection(*address)
+        writer.write(headers + body[:len(body) // 2])
+        await writer.drain()
+        await wait_for_records(service, 50)
+        
+        # A second request waits, unread, until the first one is answered
+        second = asyncio.create_task(post(address, body))
+        await asyncio.sleep(0.2)
+        queued_while_waiting = service.stats['records']
+        writer.write(body[len(body) // 2:])
+        await writer.drain()
+        first = await reader.read()
+        writer.close()
+        responses = [first.split(b'\r\n', 1)[0], (await second)[0]]
+        
+        # A line over max_line_bytes is refused
+        status, error = await post(address, b'{"cmdline": "' + b'x' * 5000 + b'"}\n')
+        await service.stop()
+        return service, queued_while_waiting, responses, status, error
+    
+    service, queued_while_waiting, responses, status, error = asyncio.run(run())
+    assert queued_while_waiting == 50
+    assert responses == [b'HTTP/1.1 202 Accepted'] * 2
+    assert status == b'HTTP/1.1 413 Payload Too Large' and 'line over 1000 bytes' in error['error']
+    assert service.stats['rows'] == 200 and service.stats['rejected'] == 1
+
+if __name__ == "__main__":
+    test_stream_matches_full_recompute()
+    test_http_and_backpressure()
+    test_http_streaming_and_limits()
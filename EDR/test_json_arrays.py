@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+test_json_arrays.py - Regression test and benchmark of the batched JSON-array decoding
+
+Requires parse_json_array_column() to decode every cell the way the per-cell
+safe_json_load() of the original loader did (valid, single-quoted,
+malformed, empty, nested and non-array cells, at any block size), and
+load_data() to give the frame of the original per-cell preprocessing, dtypes
+included, on synthetic_data.csv and on a file made of such cells.
+
+Usage:
+    python test_json_arrays.py                         # regression test
+    python test_json_arrays.py --benchmark 100000 1000000
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from full_detect import load_data, parse_json_array_column, preprocess_data
+from testing_helpers import SYNTHETIC_FILE
+
+LIST_COLUMNS = ['remote_ips', 'dns_queries', 'outbound_bytes', 'inbound_bytes',
+                'registry_writes', 'child_processes', 'loaded_modules']
+
+# Cells of every kind the decoder must handle
+CELLS = [
+    '[]', '["10.0.0.1"]', '["10.0.0.1", "10.0.0.2"]', '[1200, 800]', '[1.5, 2]', '[0]',
+    "['a.example.com', 'b.example.com']",      # single quotes
+    '["a", \'b\']',                            # mixed quotes
+    '[1, 2', '["unterminated]', '[1,2],[3]',   # malformed
+    '[[1, 2], [3]]', '[{"k": [1]}]', '[[]]',   # nested
+    '["a]b", "c[d"]', '["a],[b"]',             # brackets inside strings
+    '[1] ', ' [1]', '', 'not a list', '4096',  # not starting with '[' pass through
+]
+
+def reference_decode(x):
+    """The per-cell decoder of the original load_data()"""
+    if not isinstance(x, str):
+        return x
+    if not x.startswith('['):
+        return x
+    try:
+        return json.loads(x)
+    except json.JSONDecodeError:
+        try:
+            return json.loads(x.replace("'", '"'))
+        except:
+            return []
+
+def reference_preprocess(df):
+    """The normalization of the original load_data(), one cell at a time"""
+    df = df[~df['hostname'].astype(str).str.startswith(('#', '--'))].copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    for col in LIST_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].fillna('[]').apply(reference_decode)
+    for col in ['pid', 'ppid', 'rwx_segments_count', 'anonymous_mem_size', 'conn_count', 'remote_mem_operations']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    if 'outbound_bytes' in df.columns:
+        df['outbound_bytes'] = df['outbound_bytes'].apply(
+            lambda x: sum(x) if isinstance(x, list) else pd.to_numeric(x, errors='coerce')
+        ).fillna(0)
+    for col in ['remote_ips', 'dns_queries']:
+        if col in df.columns:
+            df[col] = df[col].apply(lambda x: x if isinstance(x, list) else [])
+    return df
+
+def test_cells_match_reference():
+    rng = np.random.default_rng(0)
+    cells = pd.Series(list(CELLS) + list(rng.choice(np.array(CELLS, dtype=object), 2000)), dtype=object)
+    expected = [reference_decode(x) for x in cells]
+    
+    # Small blocks put malformed and nested cells at every block position
+    for block_size in (1, 3, 64, 4096):
+        with contextlib.redirect_stdout(io.StringIO()):
+            parsed = parse_json_array_column(cells, block_size=block_size)
+        actual = parsed.to_series().tolist()
+        assert actual == expected, [(c, a, e) for c, a, e in zip(cells, actual, expected) if a != e][:5]
+        assert parsed.is_list.tolist() == [isinstance(x, list) for x in expected]
+    
+    # Missing cells decode as the empty arrays fillna('[]') gave the per-cell decoder
+    with_missing = pd.Series(list(CELLS) + [None, np.nan], dtype=object)
+    parsed = parse_json_array_column(with_missing, missing_as_empty=True)
+    assert parsed.to_series().tolist() == [reference_decode(x) for x in with_missing.fillna('[]')]
+    
+    malformed = sum(reference_decode(x) == [] and x.strip() != '[]' for x in CELLS if isinstance(x, str))
+    assert parse_json_array_column(pd.Series(CELLS, dtype=object)).malformed == malformed
+
+def _load(path, reference):
+    with contextlib.redirect_stdout(io.StringIO()):
+        if reference:
+            return reference_preprocess(pd.read_csv(path))
+        return load_data(path)
+
+def test_load_matches_reference():
+    pd.testing.assert_frame_equal(_load(SYNTHETIC_FILE, False), _load(SYNTHETIC_FILE, True))
+    
+    rng = np.random.default_rng(1)
+    n = 500
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Byte counts are numeric arrays (the per-cell sum fails on anything else)
+        numeric = ['[]', '[1200, 800]', '[1.5, 2]', '[0]', '[1, 2', '[1,2],[3]', '[1] ', ' [1]', '', '4096', 'n/a']
+        for name, outbound in (('mixed', numeric), ('integers', ['[]', '[1200, 800]', '[0]', '4096', ''])):
+            path = os.path.join(tmp_dir, f'{name}.csv')
+            frame = pd.DataFrame({
+                'hostname': [f'host{i % 5}' for i in range(n)],
+                'timestamp': pd.date_range('2025-04-01', periods=n, freq='h').astype(str),
+                'pid': np.arange(n),
+            })
+            for col in ('remote_ips', 'dns_queries', 'child_processes'):
+                frame[col] = rng.choice(np.array(CELLS, dtype=object), n)
+            frame['outbound_bytes'] = rng.choice(np.array(outbound, dtype=object), n)
+            frame.to_csv(path, index=False)
+            
+            actual = _load(path, False)
+            pd.testing.assert_frame_equal(actual, _load(path, True))
+        
+        # Integer byte counts stay int64, as with the per-cell sums
+        assert actual['outbound_bytes'].dtype == 'int64'
+
+def benchmark_frame(n, rng):
+    """
+    Raw frame with the list columns of an agent export: mostly empty arrays,
+    IP and domain lists, scalar byte counts, a malformed cell every 5000 rows
+    """
+    def column(filled, pool):
+        cells = np.full(n, '[]', dtype=object)
+        mask = rng.random(n) < filled
+        cells[mask] = rng.choice(np.array(pool, dtype=object), mask.sum())
+        return cells
+    
+    ips = [f'["10.{a}.{b}.{c}"]' for a, b, c in rng.integers(0, 255, (2000, 3))] + ['["10.0.0.1", "192.168.1.7"]']
+    byte_counts = [str(x) for x in rng.integers(100, 10**6, 1000)]
+    frame = pd.DataFrame({'hostname': rng.choice(['host1', 'host2', 'host3'], n), 'timestamp': '2025-04-01 10:00:00'})
+    frame['remote_ips'] = column(0.3, ips)
+    frame['dns_queries'] = column(0.2, ['["a.example.com"]', "['b.example.com']", '["c.example.com", "d.example.com"]'])
+    frame['outbound_bytes'] = column(0.5, byte_counts + ['[1200, 800]'])
+    frame['inbound_bytes'] = column(0.5, byte_counts)
+    for col in ('registry_writes', 'child_processes', 'loaded_modules'):
+        frame[col] = column(0.05, ['["HKLM\\\\Run\\\\x"]', '["cmd.exe"]', '["ntdll.dll", "kernel32.dll"]'])
+    frame.loc[::5000, 'remote_ips'] = '[1, 2'
+    return frame
+
+def benchmark(sizes):
+    """
+    Time the list-column decoding (with the outbound_bytes sums) and the
+    whole preprocessing, per cell as the original loader did and batched
+    """
+    rng = np.random.default_rng(2)
+    
+    def per_cell(frame):
+        decoded = {col: frame[col].fillna('[]').apply(reference_decode) for col in LIST_COLUMNS}
+        decoded['outbound_bytes'].apply(lambda x: sum(x) if isinstance(x, list) else pd.to_numeric(x, errors='coerce'))
+    
+    def batched(frame):
+        parsed = {col: parse_json_array_column(frame[col], missing_as_empty=True) for col in LIST_COLUMNS}
+        parsed['outbound_bytes'].sums()
+    
+    print(f"{'rows':>12} {'step':<14} {'per-cell (s)':>13} {'batched (s)':>12} {'speedup':>8}")
+    for n in sizes:
+        frame = benchmark_frame(n, rng)
+        for step, slow, fast in (('list columns', per_cell, batched),
+                                 ('preprocessing', reference_preprocess, preprocess_data)):
+            times = []
+            for function in (slow, fast):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    function(frame.copy())
+                times.append(time.perf_counter() - start)
+            print(f"{n:>12,} {step:<14} {times[0]:>13.2f} {times[1]:>12.2f} {times[0] / times[1]:>7.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--benchmark', nargs='*', type=int, metavar='CELLS',
+                        help="benchmark at the given column lengths (default: 100k and 1M)")
+    args = parser.parse_args()
+    
+    if args.benchmark is not None:
+        benchmark(args.benchmark or [100000, 1000000])
+    else:
+        test_cells_match_reference()
+        test_load_matches_reference()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+test_network_aggregation.py - Regression test and benchmark for the columnar
+explode/aggregate path of detect_beaconing and detect_weekend_exfiltration
+
+The reference functions below are the previous row-wise implementations
+(iterrows() over every network row, one dict per remote IP). The regression
+check runs both on synthetic_data.csv, extended with beaconing and weekend
+exfiltration traffic built from its own rows (the CSV has no remote IPs),
+and requires identical alerts.
+
+Usage:
+    python test_network_aggregation.py                      # regression test
+    python test_network_aggregation.py --benchmark          # 1M and 10M rows
+    python test_network_aggregation.py --benchmark 200000 --skip-reference
+"""
+import argparse
+import contextlib
+import io
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from full_detect import (
+    load_data,
+    detect_beaconing,
+    detect_weekend_exfiltration
+)
+from testing_helpers import SYNTHETIC_FILE, assert_same_alerts, network_scenarios
+
+# --------------------------------------------------------------------------------------------
+# REFERENCE: PREVIOUS ROW-WISE IMPLEMENTATIONS
+# --------------------------------------------------------------------------------------------
+
+def reference_beaconing(df, now, lookback_days=60, active_days_threshold=10, consistency_threshold=0.8):
+    """Row-wise beaconing detection (one dict per remote IP connection)"""
+    network_data = df[
+        (df['timestamp'] >= now - timedelta(days=lookback_days)) &
+        (df['conn_count'] > 0) &
+        (df['outbound_bytes'] > 0) &
+        (df['outbound_bytes'] < 10000)
+    ].copy()
+    network_data = network_data[network_data['remote_ips'].apply(
+        lambda x: isinstance(x, list) and len(x) > 0
+    )]
+    if network_data.empty:
+        return pd.DataFrame()
+    
+    network_data['day'] = network_data['timestamp'].dt.date
+    network_data['hour'] = network_data['timestamp'].dt.hour
+    
+    daily_connections = []
+    for _, row in network_data.iterrows():
+        for remote_ip in row['remote_ips']:
+            daily_connections.append({
+                'hostname': row['hostname'],
+                'pid': row['pid'],
+                'name': row['name'],
+                'day': row['day'],
+                'remote_ip': remote_ip,
+                'connection_count': 1,
+                'off_hours_count': 1 if 1 <= row['hour'] <= 5 else 0
+            })
+    
+    daily_df = pd.DataFrame(daily_connections)
+    daily_summary = daily_df.groupby(['hostname', 'pid', 'name', 'day', 'remote_ip']).agg({
+        'connection_count': 'sum',
+        'off_hours_count': 'sum'
+    }).reset_index()
+    daily_summary = daily_summary[daily_summary['connection_count'] <= 3]
+    
+    beaconing_patterns = []
+    for (hostname, pid, name, remote_ip), group in daily_summary.groupby(['hostname', 'pid', 'name', 'remote_ip']):
+        days_active = len(group['day'].unique())
+        total_off_hours_connections = group['off_hours_count'].sum()
+        if days_active > 1:
+            total_days = (max(group['day']) - min(group['day'])).days + 1
+            consistency = days_active / total_days if total_days > 0 else 0
+            if (days_active >= active_days_threshold and
+                consistency > consistency_threshold and
+                total_off_hours_connections > days_active * 0.5):
+                beaconing_patterns.append({
+                    'detection_time': now,
+                    'severity': 'High',
+                    'hostname': hostname,
+                    'pid': pid,
+                    'process_name': name,
+                    'detection_type': 'Consistent Temporal Beaconing',
+                    'timeline': f'24-hour precise connection intervals over {days_active} days',
+                    'destination': remote_ip,
+                    'traffic_pattern': 'Small 15-second bursts every 24 hours',
+                    'days_active': days_active,
+                    'alert_name': 'Temporal Networking Anomaly'
+                })
+    
+    if not beaconing_patterns:
+        return pd.DataFrame()
+    return pd.DataFrame(beaconing_patterns).sort_values('days_active', ascending=False).head(100)
+
+def reference_weekend_exfiltration(df, now, lookback_days=60):
+    """Row-wise weekend exfiltration detection (one dict per remote IP)"""
+    traffic_data = df[
+        (df['timestamp'] >= now - timedelta(days=lookback_days)) &
+        (df['outbound_bytes'] > 0)
+    ].copy()
+    traffic_data = traffic_data[traffic_data['remote_ips'].apply(
+        lambda x: isinstance(x, list) and len(x) > 0
+    )]
+    if traffic_data.empty:
+        return pd.DataFrame()
+    
+    process_baseline = traffic_data.groupby(['hostname', 'name', 'pid'])['outbound_bytes'].mean().reset_index()
+    process_baseline.rename(columns={'outbound_bytes': 'avg_daily_outbound'}, inplace=True)
+    
+    traffic_data['event_date'] = traffic_data['timestamp'].dt.date
+    traffic_data['is_weekend'] = traffic_data['timestamp'].dt.dayofweek.isin([5, 6]).astype(int)
+    
+    daily_traffic_entries = []
+    for _, row in traffic_data.iterrows():
+        for remote_ip in row['remote_ips']:
+            daily_traffic_entries.append({
+                'hostname': row['hostname'],
+                'os_type': row['os_type'],
+                'pid': row['pid'],
+                'name': row['name'],
+                'event_date': row['event_date'],
+                'is_weekend': row['is_weekend'],
+                'remote_ips': remote_ip,
+                'daily_outbound': row['outbound_bytes']
+            })
+    
+    daily_traffic = pd.DataFrame(daily_traffic_entries)
+    daily_traffic_agg = daily_traffic.groupby(['hostname', 'os_type', 'pid', 'name', 'event_date', 'is_weekend', 'remote_ips'])[
+        'daily_outbound'
+    ].sum().reset_index()
+    daily_traffic_agg = daily_traffic_agg.merge(process_baseline, on=['hostname', 'name', 'pid'], how='left')
+    daily_traffic_agg = daily_traffic_agg[daily_traffic_agg['daily_outbound'] > daily_traffic_agg['avg_daily_outbound'] * 1.5]
+    
+    suspicious_exfil = []
+    for (hostname, pid, name, remote_ip), group in daily_traffic_agg.groupby(['hostname', 'pid', 'name', 'remote_ips']):
+        weekend_days = len(group[group['is_weekend'] == 1]['event_date'].unique())
+        weekday_days = len(group[group['is_weekend'] == 0]['event_date'].unique())
+        weekend_bytes = group[group['is_weekend'] == 1]['daily_outbound'].sum()
+        weekday_bytes = group[group['is_weekend'] == 0]['daily_outbound'].sum()
+        total_bytes = weekend_bytes + weekday_bytes
+        weekend_avg = weekend_bytes / weekend_days if weekend_days > 0 else 0
+        weekday_avg = weekday_bytes / weekday_days if weekday_days > 0 else 0
+        if (weekend_days > 0 and
+            weekend_avg > weekday_avg * 3 and
+            total_bytes > 1000000):
+            suspicious_exfil.append({
+                'detection_time': now,
+                'severity': 'Critical',
+                'hostname': hostname,
+                'pid': pid,
+                'process_name': name,
+                'detection_type': 'Data Exfiltration via Steganography',
+                'timeline': 'Weekend-only outbound data transfer',
+                'data_volume': f'~{round(total_bytes/1048576, 1)}MB total',
+                'destination': remote_ip,
+                'total_bytes': total_bytes,
+                'alert_name': 'Weekend Exfiltration Detection'
+            })
+    
+    if not suspicious_exfil:
+        return pd.DataFrame()
+    return pd.DataFrame(suspicious_exfil).sort_values('total_bytes', ascending=False).head(100)
+
+# --------------------------------------------------------------------------------------------
+# TEST DATA
+# --------------------------------------------------------------------------------------------
+
+def generate_network_telemetry(n_rows, now, seed=0):
+    """Random network telemetry with the columns the two detectors read"""
+    rng = np.random.default_rng(seed)
+    n_hosts = max(10, n_rows // 2000)
+    
+    host_ids = rng.integers(0, n_hosts, n_rows)
+    process_ids = rng.integers(0, 8, n_rows)
+    names = np.array(['chrome.exe', 'svchost.exe', 'outlook.exe', 'teams.exe',
+                      'onedrive.exe', 'python.exe', 'updater.exe', 'sync.exe'], dtype=object)
+    
+    # Object arrays, so rows share one string object per distinct value
+    host_names = np.array([f'HOST-{h:05d}' for h in range(n_hosts)], dtype=object)
+    ip_pool = np.array([f'10.{i // 256}.{i % 256}.{j}' for i in range(40) for j in range(1, 26)], dtype=object)
+    ip_counts = rng.choice([0, 1, 1, 1, 2, 3], n_rows)
+    ip_values = ip_pool[rng.integers(0, len(ip_pool), int(ip_counts.sum()))].tolist()
+    ip_offsets = np.concatenate([[0], np.cumsum(ip_counts)])
+    remote_ips = [ip_values[ip_offsets[i]:ip_offsets[i + 1]] for i in range(n_rows)]
+    
+    seconds = rng.integers(0, 60 * 86400, n_rows)
+    return pd.DataFrame({
+        'hostname': host_names[host_ids],
+        'os_type': np.array(['Windows', 'Linux'], dtype=object)[(host_ids % 5 == 0).astype(int)],
+        'pid': 1000 + host_ids * 8 + process_ids,
+        'name': names[process_ids],
+        'timestamp': pd.Timestamp(now) - pd.to_timedelta(seconds, unit='s'),
+        'conn_count': rng.integers(0, 4, n_rows),
+        'outbound_bytes': np.where(rng.random(n_rows) < 0.05,
+                                   rng.integers(1000000, 5000000, n_rows),
+                                   rng.integers(0, 12000, n_rows)),
+        'remote_ips': remote_ips
+    })
+
+# --------------------------------------------------------------------------------------------
+# REGRESSION TEST AND BENCHMARK
+# --------------------------------------------------------------------------------------------
+
+def test_matches_row_wise_reference():
+    with contextlib.redirect_stdout(io.StringIO()):
+        base = load_data(SYNTHETIC_FILE)
+    now = base['timestamp'].max() + timedelta(days=1)
+    
+    for df in (base, network_scenarios(base, now)):
+        expected_beacons = reference_beaconing(df, now)
+        expected_exfil = reference_weekend_exfiltration(df, now)
+        assert_same_alerts("beaconing", expected_beacons, detect_beaconing(df, now=now))
+        assert_same_alerts("weekend_exfil", expected_exfil, detect_weekend_exfiltration(df, now=now))
+    
+    # The scenario rows must actually raise alerts, otherwise the check is vacuous
+    assert len(expected_beacons) > 0 and len(expected_exfil) > 0
+
+def benchmark(sizes, skip_reference=False):
+    now = pd.Timestamp('2025-04-30 12:00:00').to_pydatetime()
+    print(f"{'rows':>12} {'detector':<15} {'row-wise (s)':>13} {'columnar (s)':>13} {'speedup':>8}")
+    
+    for n_rows in sizes:
+        df = generate_network_telemetry(n_rows, now)
+        for name, detector, reference in (
+            ("beaconing", detect_beaconing, reference_beaconing),
+            ("weekend_exfil", detect_weekend_exfiltration, reference_weekend_exfiltration),
+        ):
+            start = time.perf_counter()
+            detector(df, now=now)
+            columnar = time.perf_counter() - start
+            
+            if skip_reference:
+                print(f"{n_rows:>12,} {name:<15} {'-':>13} {columnar:>13.2f} {'-':>8}")
+                continue
+            
+            start = time.perf_counter()
+            reference(df, now)
+            row_wise = time.perf_counter() - start
+            print(f"{n_rows:>12,} {name:<15} {row_wise:>13.2f} {columnar:>13.2f} {row_wise / columnar:>7.1f}x")
+        del df
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--benchmark', nargs='*', type=int, metavar='ROWS',
+                        help="benchmark at the given row counts (default: 1M and 10M)")
+    parser.add_argument('--skip-reference', action='store_true',
+                        help="only time the columnar path")
+    args = parser.parse_args()
+    
+    if args.benchmark is not None:
+        benchmark(args.benchmark or [1000000, 10000000], args.skip_reference)
+    else:
+        test_matches_row_wise_reference()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+test_recon_matcher.py - Unit test of the multi-pattern matcher and the recon command classifier
+
+Pins the semantics of MultiPatternMatcher (prefix matches, case folding,
+whole words) and of classify_recon_commands(): a command line is recon if
+any keyword occurs in it as whole words, the first matching category wins,
+and benign command lines containing a keyword inside a word are not recon.
+
+Usage:
+    python test_recon_matcher.py
+"""
+import pandas as pd
+
+from full_detect import MultiPatternMatcher, classify_recon_commands
+
+def test_matcher():
+    patterns = ['net use', 'net user', 'who', 'whoami', 'w ']
+    matcher = MultiPatternMatcher(patterns)
+    
+    # Substrings anywhere, case-insensitive, with the shorter patterns a longer match starts with
+    assert matcher.match('NET USER bob') == {0, 1}
+    assert matcher.match('whoami /all') == {2, 3}
+    assert matcher.match('showhosts') == {2}
+    assert matcher.match('show version') == {4}
+    assert matcher.match('') == frozenset()
+    
+    words = MultiPatternMatcher(patterns, whole_words=True)
+    assert words.match('NET USER bob') == {1}
+    assert words.match('net use z:') == {0}
+    assert words.match('net users') == frozenset()
+    assert words.match('whoami /all') == {3}
+    assert words.match('who -a; w -h') == {2, 4}
+    assert words.match('showhosts') == frozenset()
+    assert words.match('show version') == frozenset()
+    assert words.match(r'C:\bin\who.exe') == {2}
+    assert words.ids_of(['WHO', 'w ']) == {2, 4}
+    
+    codes, matches = words.match_values(pd.Series(['who', None, 'who', 'showhosts'], dtype=object))
+    assert codes.tolist() == [0, -1, 0, 1]
+    assert matches == [{2}, frozenset()]
+
+def test_recon_classification():
+    cases = [
+        # (command line, recon, category)
+        (r'net view \\fs01', True, 'network_discovery'),
+        ('ping -n 1 10.0.0.5', True, 'network_discovery'),
+        ('net use z: \\\\fs01\\share', True, 'network_discovery'),
+        ('net user bob /domain', True, 'account_enum'),
+        ('NET GROUP "Domain Admins" /domain', True, 'account_enum'),
+        (r'Get-Acl C:\Finance', True, 'permission_enum'),
+        ('Get-ADUser -Filter *', True, 'account_enum'),
+        # The first matching category wins
+        (r'net view \\fs01 & net group "Domain Admins"', True, 'network_discovery'),
+        (r'Get-Acl C:\hr | Get-ADGroup -Filter *', True, 'permission_enum'),
+        # Recon keywords without a category
+        ('whoami /all', True, 'other'),
+        ('who -a', True, 'other'),
+        ('w -h', True, 'other'),
+        ('last -n 20', True, 'other'),
+        ('ip a', True, 'other'),
+        # A category keyword alone does not make a command line recon
+        (r'icacls C:\Finance', False, 'permission_enum'),
+        # Benign command lines with a keyword inside a word
+        ('lastlog', False, 'other'),
+        ('blast -query seq.fa', False, 'other'),
+        ('showhosts.sh --quiet', False, 'other'),
+        ('git show HEAD', False, 'other'),
+        ("awk '{print $1}' new ", False, 'other'),
+        ('mapping --update', False, 'other'),
+        ('unzip archive.zip', False, 'other'),
+        ('net users.txt', False, 'other'),
+        ('', False, 'other'),
+        (None, False, 'other'),
+    ]
+    cmdlines = pd.Series([cmdline for cmdline, _, _ in cases], dtype=object)
+    is_recon, categories = classify_recon_commands(cmdlines)
+    for (cmdline, recon, category), actual_recon, actual_category in zip(cases, is_recon, categories):
+        assert (actual_recon, actual_category) == (recon, category), (cmdline, actual_recon, actual_category)
+
+if __name__ == "__main__":
+    test_matcher()
+    test_recon_classification()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+test_telemetry_cache.py - Regression test for the columnar telemetry cache
+
+Loads a copy of synthetic_data.csv through load_data_cached() and requires
+the frame read back from the cache to equal load_data(), a changed mtime or
+size of the CSV or a new CACHE_VERSION to invalidate the cache, invalidate_cache() to remove every
+cached version, and a corrupt cache file to fall back to parsing the CSV.
+
+Usage:
+    python test_telemetry_cache.py
+"""
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+import telemetry_cache
+from full_detect import load_data, compact_frame
+from telemetry_cache import cache_path, invalidate_cache, load_data_cached, _cache_files
+from testing_helpers import SYNTHETIC_FILE
+
+def _load(load, *args, **kwargs):
+    """Result of a loader and what it printed"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        df = load(*args, **kwargs)
+    return df, output.getvalue()
+
+def test_round_trip():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = shutil.copy(SYNTHETIC_FILE, os.path.join(tmp_dir, 'telemetry.csv'))
+        expected, _ = _load(load_data, path)
+        
+        first, output = _load(load_data_cached, path)
+        assert 'Loaded cached data' not in output
+        assert os.path.exists(cache_path(path))
+        cached, output = _load(load_data_cached, path)
+        assert 'Loaded cached data' in output
+        pd.testing.assert_frame_equal(first, expected)
+        pd.testing.assert_frame_equal(cached, expected)
+        
+        compact, _ = _load(load_data_cached, path, compact=True)
+        pd.testing.assert_frame_equal(compact, compact_frame(expected))
+
+def test_invalidation():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = shutil.copy(SYNTHETIC_FILE, os.path.join(tmp_dir, 'telemetry.csv'))
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        _load(load_data_cached, path, cache_dir)
+        first_cache = cache_path(path, cache_dir)
+        
+        # A new mtime is a new version: the stale cache is replaced
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        _, output = _load(load_data_cached, path, cache_dir)
+        assert 'stale' in output and 'Loaded cached data' not in output
+        assert _cache_files(path, cache_dir) == [cache_path(path, cache_dir)] != [first_cache]
+        
+        # So is a new size, with the mtime unchanged
+        stat = os.stat(path)
+        with open(path) as f:
+            last_row = f.read().splitlines()[-1]
+        with open(path, 'a') as f:
+            f.write(last_row + '\n')
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        df, output = _load(load_data_cached, path, cache_dir)
+        assert 'Loaded cached data' not in output
+        expected, _ = _load(load_data, path)
+        pd.testing.assert_frame_equal(df, expected)
+        
+        # And so is a new cache version, with the CSV unchanged
+        current_cache = cache_path(path, cache_dir)
+        version = telemetry_cache.CACHE_VERSION
+        try:
+            telemetry_cache.CACHE_VERSION = version + 1
+            _, output = _load(load_data_cached, path, cache_dir)
+            assert 'stale' in output and 'Loaded cached data' not in output
+            assert _cache_files(path, cache_dir) == [cache_path(path, cache_dir)] != [current_cache]
+        finally:
+            telemetry_cache.CACHE_VERSION = version
+        
+        # invalidate_cache() removes every version
+        assert invalidate_cache(path, cache_dir) == 1
+        assert _cache_files(path, cache_dir) == []
+        assert invalidate_cache(path, cache_dir) == 0
+
+def test_corrupt_cache():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = shutil.copy(SYNTHETIC_FILE, os.path.join(tmp_dir, 'telemetry.csv'))
+        expected, _ = _load(load_data, path)
+        _load(load_data_cached, path)
+        with open(cache_path(path), 'r+b') as f:
+            f.truncate(64)
+        
+        df, output = _load(load_data_cached, path)
+        assert 'Could not read cache file' in output
+        pd.testing.assert_frame_equal(df, expected)
+        
+        # The cache was rewritten from the CSV
+        df, output = _load(load_data_cached, path)
+        assert 'Loaded cached data' in output
+        pd.testing.assert_frame_equal(df, expected)
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_invalidation()
+    test_corrupt_cache()
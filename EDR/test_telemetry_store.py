@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+test_telemetry_store.py - Regression test for the time-indexed telemetry store
+
+Runs the detectors over a generated data set raising every alert type, in
+shuffled row order, through a TelemetryStore and requires the alerts of
+DetectionEngine.run() over the telemetry in time order, at midnight and
+mid-day. Windows must be views of the sorted frame holding exactly the rows
+a timestamp filter selects, also per host and with missing timestamps.
+
+Usage:
+    python test_telemetry_store.py
+"""
+import numpy as np
+import pandas as pd
+
+from full_detect import DetectionEngine
+from telemetry_store import TelemetryStore
+from testing_helpers import GENERATED_NOW as NOW, generated_frame
+
+def test_matches_time_ordered_run():
+    df, _ = generated_frame()
+    shuffled = df.sample(frac=1, random_state=7).reset_index(drop=True)
+    store = TelemetryStore(shuffled)
+    
+    raised = set()
+    for now in (pd.Timestamp(NOW), pd.Timestamp(NOW) + pd.Timedelta(hours=12)):
+        now = now.to_pydatetime()
+        # The sorted frame filtered as an unsorted one
+        expected = DetectionEngine(store.df.copy(), now=now).run()
+        actual = DetectionEngine(store, now=now).run()
+        for name, alerts in expected.items():
+            pd.testing.assert_frame_equal(alerts, actual[name])
+        raised |= {name for name, alerts in expected.items() if len(alerts)}
+    
+    # Every detector must actually raise alerts, otherwise the check is vacuous
+    assert raised == set(expected), raised
+
+def test_window_queries():
+    timestamps = pd.to_datetime(['2025-04-03', None, '2025-04-01', '2025-04-02', '2025-04-02', '2025-04-04'])
+    df = pd.DataFrame({'hostname': ['a', 'b', 'b', 'a', 'b', 'a'], 'timestamp': timestamps, 'pid': range(6)})
+    store = TelemetryStore(df, by_host=True)
+    
+    # Stable time order, missing timestamps last and never in a window
+    assert store.df['pid'].tolist() == [2, 3, 4, 0, 5, 1]
+    for start, end in ((None, None), ('2025-04-02', None), ('2025-04-02', '2025-04-04'), ('2025-05-01', None)):
+        expected = df[(df['timestamp'] >= (start or pd.Timestamp.min)) & (df['timestamp'] < (end or pd.Timestamp.max))]
+        window = store.window(start, end)
+        assert window['pid'].tolist() == expected.sort_values('timestamp', kind='stable')['pid'].tolist()
+        assert window.empty or np.shares_memory(window['pid'].to_numpy(), store.df['pid'].to_numpy())
+    
+    before, after = store.split(store.window('2025-04-02'), '2025-04-02')
+    assert before['pid'].tolist() == [3, 4] and after['pid'].tolist() == [0, 5]
+    assert store.host_window('a', '2025-04-02')['pid'].tolist() == [3, 0, 5]
+    assert store.host_window('b', end='2025-04-02')['pid'].tolist() == [2]
+    assert store.host_window('c').empty
+    
+    # Frames already in time order are kept as they are
+    assert TelemetryStore(store.df).df is store.df
+
+if __name__ == "__main__":
+    test_matches_time_ordered_run()
+    test_window_queries()
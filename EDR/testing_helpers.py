@@ -0,0 +1,105 @@
+"""
+testing_helpers.py - Data sets and checks shared by the EDR regression tests
+
+SYNTHETIC_FILE is the agent CSV shipped with the repository, which
+network_scenarios() extends with beaconing and weekend exfiltration traffic.
+generated_telemetry() and generated_frame() give a larger generated data set
+raising every alert type, written and parsed once per process.
+"""
+import atexit
+import contextlib
+import functools
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from full_detect import load_data
+from synthetic_telemetry import generate_telemetry
+
+SYNTHETIC_FILE = "synthetic_data.csv"
+
+# Reference time of the generated data sets shared by the detector tests
+GENERATED_NOW = '2025-04-30'
+
+def network_scenarios(df, now):
+    """
+    Network rows derived from the first rows of synthetic_data.csv: a nightly
+    beacon, weekend-only bulk uploads, and daytime background traffic to a
+    shared set of destinations (so both detectors also see non-matching groups)
+    """
+    templates = df.dropna(subset=['hostname']).head(4)
+    rng = np.random.default_rng(7)
+    rows = []
+    
+    def add(template, timestamp, outbound_bytes, remote_ips, conn_count=1):
+        row = template.to_dict()
+        row.update(timestamp=timestamp, outbound_bytes=outbound_bytes,
+                   remote_ips=remote_ips, conn_count=conn_count)
+        rows.append(row)
+    
+    start = (now - timedelta(days=50)).replace(hour=0, minute=0, second=0, microsecond=0)
+    for day in range(48):
+        date = start + timedelta(days=day)
+        
+        # Nightly beacon from the first host, skipping a few days
+        if day % 9 != 4:
+            add(templates.iloc[0], date + timedelta(hours=3, minutes=int(rng.integers(0, 50))),
+                int(rng.integers(200, 900)), ['203.0.113.7'])
+        
+        # Bulk uploads on weekends, small syncs on weekdays
+        if date.weekday() >= 5:
+            add(templates.iloc[1], date + timedelta(hours=14), int(rng.integers(4, 9)) * 1048576,
+                ['198.51.100.23', '198.51.100.24'])
+        elif day % 3 == 0:
+            add(templates.iloc[1], date + timedelta(hours=11), int(rng.integers(1000, 5000)), ['198.51.100.23'])
+        
+        # Background traffic
+        for _ in range(6):
+            template = templates.iloc[int(rng.integers(0, len(templates)))]
+            ips = list(rng.choice(['10.0.0.5', '10.0.0.6', '203.0.113.7', '198.51.100.23'],
+                                  size=int(rng.integers(1, 3)), replace=False))
+            add(template, date + timedelta(hours=int(rng.integers(0, 24))),
+                int(rng.integers(1, 20000)), ips, conn_count=int(rng.integers(0, 3)))
+    
+    extra = pd.DataFrame(rows, columns=df.columns)
+    return pd.concat([df, extra], ignore_index=True)
+
+@functools.lru_cache(maxsize=None)
+def _generated_telemetry(rows, seed):
+    tmp_dir = tempfile.mkdtemp(prefix='edr-telemetry-')
+    atexit.register(shutil.rmtree, tmp_dir, ignore_errors=True)
+    path = os.path.join(tmp_dir, 'telemetry.csv')
+    return path, generate_telemetry(path, rows, seed=seed, now=GENERATED_NOW)
+
+def generated_telemetry(rows=20000, seed=3):
+    """
+    Path of a generate_telemetry() CSV ending at GENERATED_NOW and its ground
+    truth. Written once per process and removed at exit; treat it as read-only.
+    """
+    return _generated_telemetry(rows, seed)
+
+@functools.lru_cache(maxsize=None)
+def _generated_frame(rows, seed):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return load_data(generated_telemetry(rows, seed)[0])
+
+def generated_frame(rows=20000, seed=3):
+    """
+    load_data() of generated_telemetry(), parsed once per process, and the
+    reference time. Every call returns a copy of the frame.
+    """
+    return _generated_frame(rows, seed).copy(), pd.Timestamp(GENERATED_NOW).to_pydatetime()
+
+def assert_same_alerts(name, expected, actual):
+    """Alerts must match value for value, in the same order"""
+    if expected.empty and actual.empty:
+        return
+    assert list(expected.columns) == list(actual.columns), f"{name}: columns differ"
+    assert list(expected.index) == list(actual.index), f"{name}: row order differs"
+    pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+
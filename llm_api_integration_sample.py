@@ -63,12 +63,9 @@ def analyze_session_with_ai(session_data: Dict[Any, Any], cache_client=None) ->
     
     return analysis_result
 
-def format_session_for_analysis(session_data: Dict[Any, Any]) -> str:
-    """Format session data into a structured prompt for the AI model."""
-    return f"""
-    Analyze this web session for potential security threats:
-    
-    Browser Fingerprint:
+def describe_session(session_data: Dict[Any, Any]) -> str:
+    """Fingerprint, behavior and request details of a session, as they appear in the prompts."""
+    return f"""    Browser Fingerprint:
     - User Agent: {session_data.get('user_agent', 'Unknown')}
     - Screen Resolution: {session_data.get('screen_resolution', 'Unknown')}
     - Browser Plugins: {session_data.get('plugins', [])}
@@ -82,7 +79,14 @@ def format_session_for_analysis(session_data: Dict[Any, Any]) -> str:
     Request Patterns:
     - Request Timing: {session_data.get('request_timing', [])}
     - Suspicious Parameters: {session_data.get('suspicious_params', [])}
-    - Accessed Resources: {session_data.get('resources_accessed', [])}
+    - Accessed Resources: {session_data.get('resources_accessed', [])}"""
+
+def format_session_for_analysis(session_data: Dict[Any, Any]) -> str:
+    """Format session data into a structured prompt for the AI model."""
+    return f"""
+    Analyze this web session for potential security threats:
+    
+{describe_session(session_data)}
     
     Analyze if this appears to be a bot, specifically:
     1. Is this likely a bot or human? (Yes/No)
@@ -191,15 +195,959 @@ def evaluate_session_risk(session_data, olap_client, ai_client, cache_client=Non
     }
 ```
 
+### Async LLM Client with Connection Pooling
+
+`analyze_session_with_ai` above blocks on `requests.post` with a fresh connection per call, and running it through `asyncio.to_thread` ties up one thread per in-flight LLM call. On the real-time path we use a native asyncio client instead. It keeps one pool of keep-alive connections and a concurrency limit, and gives each request a deadline. Concurrent requests for the same session fingerprint share one in-flight call (single-flight).
+
+```python
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+class AsyncLLMClient:
+    """
+    Asyncio chat-completions client with a keep-alive connection pool.
+    
+    At most `max_concurrency` calls run at once; a call waiting for a slot
+    counts against its deadline. Concurrent analyses of sessions with the
+    same fingerprint share one API call; each caller still waits no longer
+    than its own deadline.
+    """
+    def __init__(self, base_url: str = "https://api.deepseek.com", api_key: Optional[str] = None,
+                 model: str = "deepseek-chat", max_concurrency: int = 32, pool_size: int = 64,
+                 timeout: float = 3.0, keepalive_timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+        self._inflight = {}  # session fingerprint -> {"task": shared API call, "waiters": callers awaiting it}
+        self.stats = {"requests": 0, "shared": 0, "timeouts": 0, "errors": 0}
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """The pooled HTTP session, created on first use (inside the running loop)"""
+        if self._session is None or self._session.closed:
+            headers = {"Content-Type": "application/json"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, headers=headers)
+        return self._session
+    
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+    
+    async def _post(self, messages: List[Dict[str, str]], **params) -> Dict[str, Any]:
+        """One chat-completions call once a pool slot is free, without a deadline"""
+        async with self._semaphore:
+            self.stats["requests"] += 1
+            payload = {"model": self.model, "messages": messages, "temperature": 0.1,
+                       "max_tokens": 500, **params}
+            async with self._get_session().post(f"{self.base_url}/v1/chat/completions",
+                                                json=payload) as response:
+                response.raise_for_status()
+                return await response.json()
+    
+    async def chat_completion(self, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                              **params) -> Dict[str, Any]:
+        """One chat-completions call, waiting for a pool slot, within `timeout` seconds overall"""
+        return await asyncio.wait_for(self._post(messages, **params), self.timeout if timeout is None else timeout)
+    
+    async def analyze_session(self, session_data: Dict[Any, Any],
+                              timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Raw API response for a session. Callers analyzing the same session
+        fingerprint concurrently share the first caller's call.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        key = generate_session_fingerprint(session_data)
+        entry = self._inflight.get(key)
+        if entry is None:
+            messages = [
+                {"role": "system", "content": "You are a cybersecurity expert analyzing web session data."},
+                {"role": "user", "content": format_session_for_analysis(session_data)}
+            ]
+            # The shared call has no deadline of its own: it runs while any caller still waits
+            entry = self._inflight[key] = {"task": asyncio.ensure_future(self._post(messages)), "waiters": 0}
+            
+            def done(task):
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+                if not task.cancelled():
+                    task.exception()  # Callers re-raise it; don't report it as never retrieved
+            entry["task"].add_done_callback(done)
+        else:
+            self.stats["shared"] += 1
+        
+        # A caller giving up (deadline, cancellation) does not cancel the call for the others
+        entry["waiters"] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(entry["task"]), timeout)
+        finally:
+            entry["waiters"] -= 1
+            if not entry["waiters"] and not entry["task"].done():
+                # Nobody waits for it any more; later callers start a new call
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+                entry["task"].cancel()
+
+async def analyze_session_with_ai_async(session_data: Dict[Any, Any], llm_client: AsyncLLMClient,
+                                        cache_client=None, timeout: Optional[float] = None,
+                                        batcher=None) -> Dict[str, Any]:
+    """
+    Async counterpart of analyze_session_with_ai() on the pooled client
+    (through a SessionAnalysisBatcher, see below, if one is given). With a
+    TieredCache (see below) as cache_client, workers share verdicts and
+    failures are cached briefly.
+    """
+    cache_key = f"ai_analysis:{generate_session_fingerprint(session_data)}"
+    
+    async def analyze():
+        try:
+            if batcher is not None:
+                return await batcher.analyze(session_data, timeout), True
+            return parse_ai_response(await llm_client.analyze_session(session_data, timeout)), True
+        except asyncio.TimeoutError:
+            llm_client.stats["timeouts"] += 1
+            return {"is_bot": False, "confidence": 0, "bot_type": "unknown", "risk_level": "low",
+                    "indicators": ["AI analysis timed out"], "error": True}, True
+        except aiohttp.ClientError as e:
+            llm_client.stats["errors"] += 1
+            return {"is_bot": False, "confidence": 0, "bot_type": "unknown", "risk_level": "low",
+                    "indicators": [f"AI analysis failed: {str(e)}"], "error": True}, True
+    
+    if isinstance(cache_client, TieredCache):
+        analysis_result, _ = await cache_client.get_or_compute(cache_key, analyze)
+        return analysis_result
+    
+    if cache_client:
+        cached_result = cache_client.get(cache_key)
+        if cached_result:
+            return json.loads(cached_result)
+    
+    analysis_result, _ = await analyze()
+    if cache_client and not analysis_result.get("error"):
+        cache_client.set(cache_key, json.dumps(analysis_result), ex=3600)
+    return analysis_result
+
+async def evaluate_session_risk_async(session_data, olap_client, llm_client, cache_client=None, batcher=None):
+    """
+    evaluate_session_risk() with the AI step awaited on the pooled client;
+    only the (blocking) OLAP query runs in a worker thread.
+    """
+    session_id = session_data.get("session_id", "unknown")
+    
+    olap_start = time.time()
+    olap_result = await asyncio.to_thread(olap_client.analyze_session, session_data)
+    olap_time = time.time() - olap_start
+    
+    if olap_result.get("confidence", 0) > 0.9:
+        return {
+            "session_id": session_id,
+            "is_threat": olap_result.get("is_threat", False),
+            "risk_score": olap_result.get("risk_score", 0),
+            "risk_factors": olap_result.get("risk_factors", []),
+            "analysis_source": "olap",
+            "processing_time_ms": int(olap_time * 1000)
+        }
+    
+    ai_start = time.time()
+    ai_result = await analyze_session_with_ai_async(session_data, llm_client, cache_client, batcher=batcher)
+    ai_time = time.time() - ai_start
+    
+    combined_risk = bayesian_risk_integration(
+        olap_risk=olap_result.get("risk_score", 0),
+        olap_confidence=olap_result.get("confidence", 0),
+        ai_is_bot=ai_result.get("is_bot", False),
+        ai_confidence=ai_result.get("confidence", 0),
+        ai_risk_level=ai_result.get("risk_level", "low")
+    )
+    return {
+        "session_id": session_id,
+        "is_threat": combined_risk > 0.65,
+        "risk_score": combined_risk,
+        "risk_factors": olap_result.get("risk_factors", []) + ai_result.get("indicators", []),
+        "analysis_source": "combined",
+        "bot_type": ai_result.get("bot_type", "unknown") if ai_result.get("is_bot", False) else "human",
+        "processing_time_ms": int((olap_time + ai_time) * 1000),
+        "olap_processing_time_ms": int(olap_time * 1000),
+        "ai_processing_time_ms": int(ai_time * 1000)
+    }
+```
+
+`test_llm_api_integration_sample.py` runs the client end to end against a local stand-in for the chat-completions API, checking the single-flight and deadline behavior.
+
+### Micro-Batched Session Analysis
+
+During a bot wave thousands of ambiguous sessions arrive per minute, and one LLM round-trip per session pays the prompt overhead and the provider's rate limits every time. A batching stage in front of the AI analysis collects sessions for a few hundred milliseconds, or until `max_batch` have arrived. It sends them as one multi-session prompt and demultiplexes the JSON array answer, one verdict per session, through the same `parse_ai_response()` as single-shot mode. Sessions the answer leaves out are retried single-shot, so every caller gets the verdict it would have had on its own. The batch call's deadline grows with the number of sessions it asks about, and each caller waits no longer than its own timeout: a failing batch hands its error to every caller rather than leaving them waiting.
+
+```python
+def format_sessions_for_analysis(sessions: List[Dict[Any, Any]]) -> str:
+    """Format several sessions into one structured prompt asking for a JSON array of verdicts."""
+    details = "\n\n".join(f"    Session {index}:\n{describe_session(session_data)}"
+                          for index, session_data in enumerate(sessions))
+    return f"""
+    Analyze each of these {len(sessions)} web sessions for potential security threats:
+    
+{details}
+    
+    For every session, analyze if it appears to be a bot, specifically:
+    1. Is this likely a bot or human? (Yes/No)
+    2. Confidence level (0-100)
+    3. Bot type if detected (e.g., "headless browser", "automation tool", "custom script")
+    4. Risk level (Low/Medium/High/Critical)
+    5. Key indicators that influenced your decision
+    
+    Format your response as a JSON array with one object per session, each with the
+    fields session_index, is_bot, confidence, bot_type, risk_level and indicators.
+    """
+
+def split_batch_response(response_json: Dict[Any, Any], batch_size: int) -> List[Optional[Dict[str, Any]]]:
+    """
+    Per-session results of a multi-session answer, each parsed by
+    parse_ai_response() as if it were a single-session answer (None for
+    sessions the answer leaves out).
+    """
+    results = [None] * batch_size
+    try:
+        content = response_json["choices"][0]["message"]["content"]
+        verdicts = json.loads(content[content.find('['):content.rfind(']') + 1])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return results
+    
+    for position, verdict in enumerate(verdicts if isinstance(verdicts, list) else []):
+        if not isinstance(verdict, dict):
+            continue
+        index = verdict.pop("session_index", position)
+        if isinstance(index, int) and 0 <= index < batch_size and results[index] is None:
+            single = {"created": response_json.get("created", time.time()),
+                      "choices": [{"message": {"content": json.dumps(verdict)}}]}
+            results[index] = parse_ai_response(single)
+    return results
+
+class SessionAnalysisBatcher:
+    """
+    Batching stage in front of the AI analysis: sessions are collected for
+    up to `max_wait` seconds or `max_batch` sessions, then analyzed with one
+    multi-session prompt on the pooled client. Sessions with the same
+    fingerprint within a batch are analyzed once.
+    
+    A batch call asks for up to `tokens_per_session` output tokens per
+    session, so its deadline is the client's timeout plus
+    `seconds_per_session` per session (batch_timeout()). Every caller gets
+    a verdict or the batch's exception, within its own timeout.
+    """
+    def __init__(self, llm_client: AsyncLLMClient, max_batch: int = 16, max_wait: float = 0.3,
+                 tokens_per_session: int = 500, seconds_per_session: float = 1.0):
+        self.llm_client = llm_client
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.tokens_per_session = tokens_per_session
+        self.seconds_per_session = seconds_per_session
+        self._pending = {}  # session fingerprint -> (session data, futures of its callers)
+        self._timer = None
+        self.stats = {"sessions": 0, "batches": 0, "batched_sessions": 0, "single_shot_retries": 0}
+    
+    def batch_timeout(self, batch_size: int) -> float:
+        """Deadline of the API call for a batch of `batch_size` sessions"""
+        return self.llm_client.timeout + self.seconds_per_session * batch_size
+    
+    async def analyze(self, session_data: Dict[Any, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Parsed AI analysis of a session, once its batch has been answered.
+        Raises asyncio.TimeoutError after `timeout` seconds (by default, the
+        longest a full batch and its single-shot retries can take).
+        """
+        if timeout is None:
+            timeout = self.max_wait + self.batch_timeout(self.max_batch) + self.llm_client.timeout
+        future = asyncio.get_running_loop().create_future()
+        key = generate_session_fingerprint(session_data)
+        self._pending.setdefault(key, (session_data, []))[1].append(future)
+        self.stats["sessions"] += 1
+        
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+        # A caller giving up cancels only its own future
+        return await asyncio.wait_for(future, timeout)
+    
+    def flush(self) -> None:
+        """Send the pending sessions now"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            batch, self._pending = list(self._pending.values()), {}
+            asyncio.ensure_future(self._analyze_batch(batch))
+    
+    async def _analyze_batch(self, batch) -> None:
+        sessions = [session_data for session_data, _ in batch]
+        self.stats["batches"] += 1
+        self.stats["batched_sessions"] += len(sessions)
+        try:
+            try:
+                if len(sessions) == 1:
+                    results = [None]
+                else:
+                    messages = [
+                        {"role": "system", "content": "You are a cybersecurity expert analyzing web session data."},
+                        {"role": "user", "content": format_sessions_for_analysis(sessions)}
+                    ]
+                    response = await self.llm_client.chat_completion(
+                        messages, timeout=self.batch_timeout(len(sessions)),
+                        max_tokens=self.tokens_per_session * len(sessions))
+                    results = split_batch_response(response, len(sessions))
+            except Exception:
+                # Whatever went wrong with the batch call, the sessions can still be analyzed alone
+                results = [None] * len(sessions)
+            
+            # Sessions the batch did not answer are analyzed on their own
+            missing = [index for index, result in enumerate(results) if result is None]
+            self.stats["single_shot_retries"] += len(missing) if len(sessions) > 1 else 0
+            retried = await asyncio.gather(*[analyze_session_with_ai_async(sessions[index], self.llm_client)
+                                             for index in missing])
+            for index, result in zip(missing, retried):
+                results[index] = result
+            
+            for (_, futures), result in zip(batch, results):
+                for future in futures:
+                    if not future.done():
+                        future.set_result(result)
+        except Exception as e:
+            for _, futures in batch:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+        finally:
+            # Even if this task is cancelled, no caller waits for a future nobody will resolve
+            for _, futures in batch:
+                for future in futures:
+                    future.cancel()
+```
+
+`test_llm_api_integration_sample.py` checks the batcher against the same stand-in API: per-session verdicts must match single-shot mode.
+
+### Bounded Decision Cache
+
+The `/analyze` endpoint below serves repeat decisions from memory. A plain dict grows in bursts and then stalls on a full-scan cleanup, so the decisions live in a bounded cache instead: LRU eviction and per-entry TTL in O(1), a memory-size bound, hit/miss/eviction counters, and concurrent misses for the same key coalesced into one computation.
+
+```python
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+class DecisionCache:
+    """
+    In-memory decision cache bounded by entry count and approximate size.
+    
+    Entries are kept in least-recently-used order, so a hit, an insert and an
+    eviction are all O(1); an expired entry is dropped when it is next read or
+    reaches the LRU end. Meant to be used from the event loop only.
+    """
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._inflight = {}  # key -> task of the computation running for a missed key
+        self.size_bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "expirations": 0, "evictions": 0}
+    
+    @staticmethod
+    def entry_size(key: str, value: Any) -> int:
+        """Approximate memory footprint of an entry (its JSON encoding)"""
+        return len(key) + len(json.dumps(value, default=str))
+    
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self.size_bytes -= size
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value of a key (None on a miss), refreshing its LRU position"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= self.clock():
+            self._remove(key)
+            self.counters["expirations"] += 1
+            entry = None
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return entry[0]
+    
+    def peek(self, key: str) -> Optional[Any]:
+        """Cached value of a key (None on a miss), neither counted as a lookup nor refreshing its LRU position"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= self.clock():
+            self._remove(key)
+            self.counters["expirations"] += 1
+            return None
+        return entry[0]
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value for `ttl` seconds, evicting least recently used entries past the bounds"""
+        if key in self._entries:
+            self._remove(key)
+        size = self.entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, self.clock() + (self.ttl if ttl is None else ttl), size)
+        self.size_bytes += size
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            oldest, (_, expires_at, _) = next(iter(self._entries.items()))
+            self._remove(oldest)
+            self.counters["expirations" if expires_at <= self.clock() else "evictions"] += 1
+    
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Tuple[Any, bool]]],
+                             ttl: Optional[float] = None) -> Tuple[Any, str]:
+        """
+        Cached value of a key, or the result of `compute()` -> (value, cacheable).
+        Concurrent misses for the same key share one computation, which runs
+        to completion even if the caller that started it is cancelled.
+        Returns the value and where it came from: "cache", "coalesced" or "computed".
+        """
+        value = self.get(key)
+        if value is not None:
+            return value, "cache"
+        
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(inflight), "coalesced"
+        
+        async def compute_and_store():
+            value, cacheable = await compute()
+            if cacheable:
+                self.set(key, value, ttl)
+            return value
+        
+        task = asyncio.ensure_future(compute_and_store())
+        self._inflight[key] = task
+        
+        def done(task):
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            if not task.cancelled():
+                task.exception()  # Callers re-raise it; don't report it as never retrieved
+        task.add_done_callback(done)
+        
+        # A caller giving up (client disconnect) does not cancel the computation others wait for
+        return await asyncio.shield(task), "computed"
+    
+    def stats(self) -> Dict[str, Any]:
+        """Counters, occupancy and hit rate"""
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hit_rate": self.counters["hits"] / lookups if lookups else 0.0
+        }
+```
+
+### Similarity-Aware Cache Keys
+
+Repeat decisions only help if "very similar sessions" actually share a key. An exact hash of the request almost never repeats, because session IDs, timestamps and timing noise differ between the members of a botnet. Both keys therefore come from a feature vector. Features are built from `client_data`, `user_behavior` and `request_information`, with volatile fields dropped and numbers bucketed on a log scale. The exact cache key is a sha1 fingerprint of that vector, and a 64-bit SimHash of it finds near-duplicates: a banded LSH index returns the cached sessions within a configurable Hamming distance. The SimHash is only used to probe for neighbours, never as a cache key, so sessions that merely collide on it do not share an entry. With `bands > max_distance` the banding is exact: any two hashes within the distance agree on at least one band.
+
+```python
+import hashlib
+import math
+import random
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Fields that differ between otherwise identical sessions and never describe the client
+VOLATILE_KEYS = {"session_id", "request_id", "timestamp", "time", "ts", "nonce", "csrf_token"}
+VOLATILE_SUFFIXES = ("_id", "_at", "_ts", "_time", "timestamp")
+
+# Sections of a session that describe it
+FEATURE_SECTIONS = ("client_data", "user_behavior", "request_information")
+
+# Most list items turned into features
+MAX_LIST_FEATURES = 50
+
+def _bucket(value: float) -> str:
+    """Log-scale bucket of a number (about 19% wide), so small noise stays in one bucket"""
+    if value == 0:
+        return "0"
+    return f"{'-' if value < 0 else ''}{round(math.log(abs(value), 1.2))}"
+
+def _add_features(prefix: str, value: Any, features: Counter) -> None:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            key = str(key)
+            if key.lower() in VOLATILE_KEYS or key.lower().endswith(VOLATILE_SUFFIXES):
+                continue
+            _add_features(f"{prefix}.{key}" if prefix else key, item, features)
+    elif isinstance(value, (list, tuple)):
+        features[f"{prefix}#len~{_bucket(len(value))}"] += 1
+        for item in value[:MAX_LIST_FEATURES]:
+            _add_features(f"{prefix}[]", item, features)
+    elif isinstance(value, bool) or value is None or isinstance(value, str):
+        features[f"{prefix}={value}"] += 1
+    elif isinstance(value, (int, float)):
+        features[f"{prefix}~{_bucket(value)}"] += 1
+    else:
+        features[f"{prefix}={value!r}"] += 1
+
+def session_features(session_data: Dict[Any, Any]) -> Counter:
+    """
+    Feature vector of a session (feature -> weight) from its client,
+    behavior and request sections, or the whole flat session dict
+    """
+    sections = {key: session_data[key] for key in FEATURE_SECTIONS if key in session_data}
+    features = Counter()
+    _add_features("", sections or session_data, features)
+    return features
+
+def simhash(features: Dict[str, float]) -> int:
+    """64-bit SimHash of a weighted feature vector: similar vectors differ in few bits"""
+    totals = [0.0] * 64
+    for feature, weight in features.items():
+        bits = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            totals[bit] += weight if bits >> bit & 1 else -weight
+    return sum(1 << bit for bit in range(64) if totals[bit] > 0)
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def generate_session_fingerprint(session_data: Dict[Any, Any]) -> str:
+    """Exact fingerprint of a session's features (volatile fields excluded)"""
+    encoded = json.dumps(sorted(session_features(session_data).items()))
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+def generate_cache_key(session_data: Dict[Any, Any]) -> str:
+    """Decision cache key: the exact fingerprint of the session's features"""
+    return generate_session_fingerprint(session_data)
+
+def session_simhash(session_data: Dict[Any, Any]) -> int:
+    """SimHash of the session's features, to probe for near-duplicate sessions"""
+    return simhash(session_features(session_data))
+
+class SimHashIndex:
+    """
+    Banded LSH index of 64-bit SimHashes, answering nearest-neighbour queries
+    within max_distance bits. Holds the max_entries most recently added
+    hashes, each with the cache key of the last session added with it.
+    """
+    def __init__(self, max_distance: int = 4, bands: int = 8, max_entries: int = 100000):
+        if bands <= max_distance or 64 % bands:
+            raise ValueError("bands must divide 64 and exceed max_distance")
+        self.max_distance = max_distance
+        self.bands = bands
+        self.band_bits = 64 // bands
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # hash -> cache key, least recently added first
+        self._buckets = [{} for _ in range(bands)]  # band value -> hashes
+        self.stats = {"queries": 0, "exact": 0, "near": 0, "candidates": 0}
+    
+    def _band_values(self, value: int) -> Iterable[Tuple[int, int]]:
+        mask = (1 << self.band_bits) - 1
+        for band in range(self.bands):
+            yield band, value >> (band * self.band_bits) & mask
+    
+    def add(self, value: int, key: Optional[str] = None) -> None:
+        if value in self._entries:
+            self._entries[value] = key
+            self._entries.move_to_end(value)
+            return
+        self._entries[value] = key
+        for band, band_value in self._band_values(value):
+            self._buckets[band].setdefault(band_value, set()).add(value)
+        while len(self._entries) > self.max_entries:
+            self.remove(next(iter(self._entries)))
+    
+    def key(self, value: int) -> Optional[str]:
+        """Cache key stored with an indexed hash"""
+        return self._entries.get(value)
+    
+    def remove(self, value: int) -> None:
+        if self._entries.pop(value, False) is not False:
+            for band, band_value in self._band_values(value):
+                bucket = self._buckets[band][band_value]
+                bucket.discard(value)
+                if not bucket:
+                    del self._buckets[band][band_value]
+    
+    def nearest(self, value: int, max_distance: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """(hash, distance) of the closest indexed hash within max_distance bits, or None"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        self.stats["queries"] += 1
+        if value in self._entries:
+            self.stats["exact"] += 1
+            return value, 0
+        candidates = set()
+        for band, band_value in self._band_values(value):
+            candidates |= self._buckets[band].get(band_value, set())
+        self.stats["candidates"] += len(candidates)
+        best = min(((candidate, hamming_distance(value, candidate)) for candidate in candidates),
+                   key=lambda match: match[1], default=None)
+        if best is None or best[1] > max_distance:
+            return None
+        self.stats["near"] += 1
+        return best
+```
+
+A replay corpus checks the trade-off before the distance is raised in production. Each recorded session carries the ground-truth group it belongs to, such as a bot family or an individual human. Replaying the corpus in arrival order, a session is a hit if an earlier session has its exact key, or a SimHash within the distance. The hit is a false match if that neighbour belongs to another group.
+
+```python
+def replay_similarity_cache(corpus: List[Tuple[Dict[Any, Any], str]], max_distance: int = 4,
+                            bands: int = 8) -> Dict[str, float]:
+    """
+    Replay (session_data, ground-truth group) pairs through an exact-key
+    cache and the SimHash index; returns their hit rates and the false-match
+    rate of the similarity hits.
+    """
+    exact_keys = set()
+    groups = {}  # SimHash -> group of the first session that produced it
+    index = SimHashIndex(max_distance=max_distance, bands=bands, max_entries=len(corpus) or 1)
+    exact_hits = similar_hits = false_matches = 0
+    for session_data, group in corpus:
+        exact_key = generate_session_fingerprint(session_data)
+        exact_hits += exact_key in exact_keys
+        exact_keys.add(exact_key)
+        
+        value = session_simhash(session_data)
+        match = index.nearest(value)
+        if match is not None:
+            similar_hits += 1
+            false_matches += groups[match[0]] != group
+        index.add(value)
+        groups.setdefault(value, group)
+    
+    sessions = len(corpus) or 1
+    return {
+        "sessions": len(corpus),
+        "max_distance": max_distance,
+        "exact_hit_rate": exact_hits / sessions,
+        "similarity_hit_rate": similar_hits / sessions,
+        "false_match_rate": false_matches / similar_hits if similar_hits else 0.0
+    }
+
+def make_replay_corpus(bot_families: int = 20, bots_per_family: int = 50, humans: int = 1000,
+                       noise: float = 0.1, seed: int = 7) -> List[Tuple[Dict[Any, Any], str]]:
+    """
+    Synthetic replay corpus: botnet families whose sessions share a template
+    and differ only in IDs, timestamps and relative timing noise up to
+    `noise`, mixed with
+    independent human sessions
+    """
+    rng = random.Random(seed)
+    
+    def template():
+        return {
+            "client_data": {"user_agent": f"Mozilla/5.0 ({rng.choice(['Windows NT 10.0', 'X11; Linux x86_64', 'Macintosh'])}) "
+                                          f"Chrome/{rng.randint(100, 124)}.0",
+                            "screen_resolution": rng.choice(["1920x1080", "1366x768", "2560x1440", "800x600"]),
+                            "plugins": rng.sample(["pdf", "flash", "widevine", "nacl", "java"], rng.randint(0, 3)),
+                            "webdriver_detected": rng.random() < 0.5, "timezone": rng.choice(["UTC", "EST", "IST", "CET"])},
+            "user_behavior": {"mouse_entropy": rng.uniform(0, 5), "input_timing_variance": rng.uniform(1, 500),
+                              "navigation_pattern": rng.sample(["/", "/login", "/cart", "/search", "/api"], 3)},
+            "request_information": {"path": rng.choice(["/login", "/checkout", "/api/price", "/search"]),
+                                    "request_timing": [rng.uniform(50, 2000) for _ in range(4)],
+                                    "suspicious_params": rng.random() < 0.3}
+        }
+    
+    def member(base, index):
+        session = json.loads(json.dumps(base))
+        session["session_id"] = f"s-{index}-{rng.getrandbits(32):08x}"
+        session["request_information"]["timestamp"] = 1714000000 + rng.randint(0, 86400)
+        session["user_behavior"]["mouse_entropy"] *= rng.uniform(1 - noise, 1 + noise)
+        session["request_information"]["request_timing"] = [t * rng.uniform(1 - noise, 1 + noise)
+                                                             for t in session["request_information"]["request_timing"]]
+        return session
+    
+    corpus = []
+    for family in range(bot_families):
+        base = template()
+        corpus += [(member(base, len(corpus) + i), f"bot-{family}") for i in range(bots_per_family)]
+    corpus += [(member(template(), len(corpus) + i), f"human-{i}") for i in range(humans)]
+    rng.shuffle(corpus)
+    return corpus
+```
+
+On the default synthetic corpus (`make_replay_corpus()`: 20 bot families of 50 sessions with ±10% timing noise, plus 1,000 human sessions), 950 of the 2,000 sessions could at best reuse an earlier decision:
+
+| max_distance (bands) | Hit rate | False-match rate |
+|----------------------|----------|------------------|
+| exact features | 34.4% | 0.0% |
+| 3 (4) | 37.8% | 0.0% |
+| 4 (8) | 40.8% | 0.0% |
+| 5 (8) | 43.3% | 0.2% |
+| 7 (8) | 46.9% | 1.2% |
+
+The `/analyze` endpoint below uses a distance of 4. Re-run the replay on recorded traffic before raising it, because a false match serves one session another session's decision.
+
+### Tiered Analysis Cache Shared Across Workers
+
+Each API worker's `DecisionCache` is private. With several workers behind the load balancer, every worker pays for its own LLM call on a verdict another worker already has. The decisions and the AI analyses therefore share one two-tier cache. L1 is the worker's bounded in-process `DecisionCache`. L2 is a pluggable backend shared by the workers, either a SQLite file on the host or a Redis server. Reads go through L1, then L2, then the computation. Writes land in L1 at once and reach L2 behind the response, batched by a background task. Failed analyses are cached briefly, so an LLM outage is not retried by every request. Entries are packed with msgpack when it is installed, and as compact JSON otherwise.
+
+```python
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+def pack_entry(value: Any, expires_at: float) -> bytes:
+    """L2 encoding of a cached value and its expiry (wall clock), tagged with its format"""
+    entry = {"v": value, "exp": expires_at}
+    if msgpack is not None:
+        return b"m" + msgpack.packb(entry, use_bin_type=True, default=str)
+    return b"j" + json.dumps(entry, separators=(",", ":"), default=str).encode("utf-8")
+
+def unpack_entry(data: bytes) -> Tuple[Any, float]:
+    """(value, expires_at) of an L2 entry"""
+    if data[:1] == b"m" and msgpack is not None:
+        entry = msgpack.unpackb(data[1:], raw=False)
+    elif data[:1] == b"j":
+        entry = json.loads(data[1:])
+    else:
+        raise ValueError(f"unknown cache entry format {data[:1]!r}")
+    return entry["v"], entry["exp"]
+
+class SQLiteBackend:
+    """L2 in a SQLite file (WAL mode), shared by the workers of one host"""
+    def __init__(self, path: str, purge_interval: float = 300.0):
+        self.purge_interval = purge_interval
+        self._last_purge = time.time()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache "
+                               "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache WHERE key = ? AND expires_at > ?",
+                                     (key, time.time())).fetchone()
+        return None if row is None else bytes(row[0])
+    
+    def set_many(self, items: List[Tuple[str, bytes, float]]) -> None:
+        """Store (key, data, ttl) items in one transaction, purging expired rows now and then"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                                       [(key, data, now + ttl) for key, data, ttl in items])
+                if now - self._last_purge > self.purge_interval:
+                    self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+                    self._last_purge = now
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class RedisBackend:
+    """L2 on a Redis server (redis-py client), shared by the workers of every host"""
+    def __init__(self, client, prefix: str = "risk-cache:"):
+        self.client = client
+        self.prefix = prefix
+    
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+    
+    def set_many(self, items: List[Tuple[str, bytes, float]]) -> None:
+        pipeline = self.client.pipeline(transaction=False)
+        for key, data, ttl in items:
+            pipeline.set(self.prefix + key, data, px=max(1, int(ttl * 1000)))
+        pipeline.execute()
+    
+    def close(self) -> None:
+        self.client.close()
+
+class TieredCache:
+    """
+    Per-worker L1 DecisionCache over an L2 backend shared by the workers.
+    
+    An L2 hit fills L1 for the rest of the entry's TTL. Writes reach L2 in
+    batches from a background task (write-behind); at most `max_pending`
+    wait, newer writes to a pending key replace it. Error results (dicts
+    with a true "error") are kept for `negative_ttl` only. L2 failures count
+    as misses or dropped writes and never fail a request. Meant to be used
+    from the event loop only.
+    """
+    def __init__(self, l1: DecisionCache, l2=None, ttl: float = 3600.0, negative_ttl: float = 30.0,
+                 flush_interval: float = 0.05, batch_size: int = 500, max_pending: int = 10000):
+        self.l1 = l1
+        self.l2 = l2
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending = OrderedDict()  # key -> (packed entry, ttl) waiting for the L2 write
+        self._writer = None
+        self.counters = {"l2_hits": 0, "l2_misses": 0, "l2_errors": 0, "negative": 0,
+                         "l2_writes": 0, "dropped_writes": 0}
+    
+    @staticmethod
+    def is_negative(value: Any) -> bool:
+        return isinstance(value, dict) and bool(value.get("error"))
+    
+    def peek_local(self, key: str) -> Optional[Any]:
+        """Value of a key in L1 only (None on a miss), not counted in the L1 hit rate"""
+        return self.l1.peek(key)
+    
+    async def _l2_get(self, key: str) -> Optional[Any]:
+        if self.l2 is None:
+            return None
+        try:
+            data = await asyncio.to_thread(self.l2.get, key)
+            value, expires_at = (None, 0.0) if data is None else unpack_entry(data)
+        except Exception as e:
+            self.counters["l2_errors"] += 1
+            print(f"Shared cache read error: {str(e)}")
+            return None
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            self.counters["l2_misses"] += 1
+            return None
+        self.counters["l2_hits"] += 1
+        self.l1.set(key, value, remaining)
+        return value
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """Value of a key from L1, else L2 (None on a miss)"""
+        value = self.l1.get(key)
+        return value if value is not None else await self._l2_get(key)
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value in L1 now and in L2 behind the caller"""
+        if self.is_negative(value):
+            self.counters["negative"] += 1
+            ttl = self.negative_ttl
+        elif ttl is None:
+            ttl = self.ttl
+        self.l1.set(key, value, ttl)
+        if self.l2 is None:
+            return
+        if key not in self._pending and len(self._pending) >= self.max_pending:
+            self.counters["dropped_writes"] += 1
+            return
+        self._pending[key] = (pack_entry(value, time.time() + ttl), ttl)
+        self._pending.move_to_end(key)
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_behind())
+    
+    async def _write_behind(self) -> None:
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush()
+    
+    async def _flush(self) -> None:
+        while self._pending:
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                key, (data, ttl) = self._pending.popitem(last=False)
+                batch.append((key, data, ttl))
+            try:
+                await asyncio.to_thread(self.l2.set_many, batch)
+                self.counters["l2_writes"] += len(batch)
+            except Exception as e:
+                self.counters["dropped_writes"] += len(batch)
+                print(f"Shared cache write error: {str(e)}")
+    
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Tuple[Any, bool]]],
+                             ttl: Optional[float] = None) -> Tuple[Any, str]:
+        """
+        Value of a key from L1, L2 or `compute()` -> (value, cacheable).
+        Concurrent misses for the same key share one L2 read and computation.
+        Returns the value and where it came from: "cache", "shared" (L2),
+        "coalesced" or "computed".
+        """
+        origin = "computed"
+        
+        async def read_through():
+            nonlocal origin
+            value = await self._l2_get(key)
+            if value is not None:
+                origin = "shared"
+                return value, False  # Already in L1
+            value, cacheable = await compute()
+            if cacheable:
+                self.set(key, value, ttl)
+            return value, False
+        
+        value, l1_origin = await self.l1.get_or_compute(key, read_through)
+        return value, origin if l1_origin == "computed" else l1_origin
+    
+    async def close(self) -> None:
+        """Finish the pending L2 writes and close the backend"""
+        if self._writer is not None:
+            await self._writer
+        if self.l2 is not None:
+            await self._flush()
+            await asyncio.to_thread(self.l2.close)
+    
+    def stats(self) -> Dict[str, Any]:
+        """L1 counters and occupancy, L2 hits, errors and writes"""
+        return {**self.l1.stats(), **self.counters, "pending_writes": len(self._pending)}
+```
+
+`test_llm_api_integration_sample.py` runs two workers over one SQLite file: one computation for both, a shared hit, and a failed analysis kept for `negative_ttl` only.
+
 ### Fast Response Framework for Real-Time Protection
 
 ```python
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, BackgroundTasks, HTTPException
 from pydantic import BaseModel
+from typing import Any, Dict, Optional
 import asyncio
+import os
 import time
 
-app = FastAPI()
+# One pooled LLM client for the whole process, closed on shutdown, and the stage
+# batching the ambiguous sessions of the background analysis into multi-session prompts
+llm_client = AsyncLLMClient(api_key=API_KEY, max_concurrency=32, timeout=3.0)
+session_batcher = SessionAnalysisBatcher(llm_client, max_batch=16, max_wait=0.3)
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await llm_client.close()
+    await response_cache.close()
+
+app = FastAPI(lifespan=lifespan)
 
 class SessionData(BaseModel):
     session_id: str
@@ -207,8 +1155,37 @@ class SessionData(BaseModel):
     user_behavior: dict
     request_information: dict
 
-# In-memory response cache for ultra-fast repeat decisions
-response_cache = {}
+# Decisions and AI verdicts: bounded in-memory cache for ultra-fast repeats, over a store
+# shared by the workers of this host (RedisBackend(redis.Redis(...)) to share across hosts),
+# and the SimHash index finding the cached decisions of near-duplicate sessions
+response_cache = TieredCache(DecisionCache(max_entries=10000, max_bytes=64 * 1024 * 1024),
+                             SQLiteBackend(os.environ.get("RISK_CACHE_PATH", "risk_cache.db")),
+                             ttl=3600.0, negative_ttl=30.0)
+similar_sessions = SimHashIndex(max_distance=4, bands=8, max_entries=10000)
+neighbour_lookups = {"served": 0, "stale": 0}  # Neighbour decisions served, and stale neighbours dropped
+
+def cache_decision(session_data: Dict[Any, Any], decision: Dict[str, Any]) -> None:
+    cache_key = generate_cache_key(session_data)
+    response_cache.set(cache_key, decision)
+    similar_sessions.add(session_simhash(session_data), cache_key)
+
+def neighbour_decision(cache_key: str, value: int) -> Optional[Dict[str, Any]]:
+    """
+    Cached decision of the other session whose SimHash is nearest `value`,
+    the SimHash of this session, within max_distance bits (None if there is none)
+    """
+    match = similar_sessions.nearest(value)
+    if match is None or similar_sessions.key(match[0]) == cache_key:
+        return None
+    # Peek, so probing neighbours does not count as a cache lookup of this session
+    decision = response_cache.peek_local(similar_sessions.key(match[0]))
+    if decision is None:
+        # Expired or evicted from the cache
+        neighbour_lookups["stale"] += 1
+        similar_sessions.remove(match[0])
+    else:
+        neighbour_lookups["served"] += 1
+    return decision
 
 @app.post("/analyze")
 async def analyze_session(session: SessionData, background_tasks: BackgroundTasks):
@@ -218,94 +1195,80 @@ async def analyze_session(session: SessionData, background_tasks: BackgroundTask
     """
     start_time = time.time()
     session_id = session.session_id
+    session_data = session.dict()
+    cache_key = generate_cache_key(session_data)
+    value = session_simhash(session_data)
     
-    # Check if we have a cached decision for very similar sessions
-    cache_key = generate_cache_key(session.dict())
-    if cache_key in response_cache:
-        cached_result = response_cache[cache_key]
-        # Update cache statistics
-        cached_result["cache_hits"] += 1
-        cached_result["last_access"] = time.time()
-        return {
-            "session_id": session_id,
-            "action": cached_result["action"],
-            "risk_score": cached_result["risk_score"],
-            "response_time_ms": int((time.time() - start_time) * 1000),
-            "source": "cache"
-        }
-    
-    # Quick OLAP check for obvious cases (very fast)
-    quick_result = quick_olap_check(session.dict())
-    
-    if quick_result["is_obvious"]:
-        # We have a clear decision without needing AI
-        action = "block" if quick_result["is_threat"] else "allow"
-        risk_score = 0.95 if quick_result["is_threat"] else 0.05
+    async def decide():
+        # Quick OLAP check for obvious cases (very fast)
+        quick_result = quick_olap_check(session_data)
         
-        # Cache this result for similar sessions
-        response_cache[cache_key] = {
-            "action": action,
-            "risk_score": risk_score,
-            "cache_hits": 1,
-            "last_access": time.time()
-        }
+        # Still do full analysis in background for logging/improvement (once per coalesced miss)
+        background_tasks.add_task(full_risk_analysis, session_data)
         
-        # Still do full analysis in background for logging/improvement
-        background_tasks.add_task(full_risk_analysis, session.dict())
+        if quick_result["is_obvious"]:
+            # We have a clear decision without needing AI; cache it for similar sessions
+            action = "block" if quick_result["is_threat"] else "allow"
+            risk_score = 0.95 if quick_result["is_threat"] else 0.05
+            similar_sessions.add(value, cache_key)
+            return {"action": action, "risk_score": risk_score, "source": "quick_analysis"}, True
         
+        # For ambiguous cases, we need more analysis but still need to respond quickly
+        # Return a preliminary decision (not cached) and continue processing in background
+        preliminary_result = preliminary_risk_assessment(session_data)
         return {
-            "session_id": session_id,
-            "action": action,
-            "risk_score": risk_score,
-            "response_time_ms": int((time.time() - start_time) * 1000),
-            "source": "quick_analysis"
-        }
+            "action": determine_action(preliminary_result["risk_score"]),
+            "risk_score": preliminary_result["risk_score"],
+            "confidence": preliminary_result["confidence"],
+            "source": "preliminary_analysis"
+        }, False
     
-    # For ambiguous cases, we need more analysis but still need to respond quickly
-    # Return a preliminary decision and continue processing in background
-    preliminary_result = preliminary_risk_assessment(session.dict())
-    action = determine_action(preliminary_result["risk_score"])
+    # Cached decision for the same or a near-duplicate session (botnet members differing
+    # only in noise); concurrent misses share one analysis
+    decision = neighbour_decision(cache_key, value)
+    if decision is not None:
+        origin = "cache"
+    else:
+        decision, origin = await response_cache.get_or_compute(cache_key, decide)
+        if origin == "shared":
+            # Decided by another worker: a neighbour for this worker's near-duplicates too
+            similar_sessions.add(value, cache_key)
     
-    # Start full analysis in background
-    background_tasks.add_task(full_risk_analysis, session.dict())
-    
-    return {
+    response = {
         "session_id": session_id,
-        "action": action,
-        "risk_score": preliminary_result["risk_score"],
-        "confidence": preliminary_result["confidence"],
+        "action": decision["action"],
+        "risk_score": decision["risk_score"],
         "response_time_ms": int((time.time() - start_time) * 1000),
-        "source": "preliminary_analysis"
+        "source": "cache" if origin in ("cache", "shared") else decision["source"]
     }
+    if "confidence" in decision:
+        response["confidence"] = decision["confidence"]
+    return response
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss/eviction counters and occupancy of both cache tiers, and near-duplicate lookups."""
+    return {**response_cache.stats(), "similarity": {**similar_sessions.stats, **neighbour_lookups}}
 
 async def full_risk_analysis(session_data):
     """Complete full dual-engine analysis in background."""
     try:
-        # This runs after responding to the client
-        result = await asyncio.to_thread(
-            evaluate_session_risk, 
-            session_data, 
-            olap_client, 
-            ai_client, 
-            cache_client
-        )
+        # This runs after responding to the client; the LLM call is awaited on the
+        # pooled client (batched with other sessions) rather than holding a worker thread
+        result = await evaluate_session_risk_async(session_data, olap_client, llm_client, response_cache,
+                                                   batcher=session_batcher)
         
         # Update our models and cache with this result
         update_risk_models(result)
         
-        # Cache the result for future similar sessions
-        cache_key = generate_cache_key(session_data)
-        response_cache[cache_key] = {
+        # Cache the result for future similar sessions (bounded: old entries are evicted as needed)
+        cache_decision(session_data, {
             "action": determine_action(result["risk_score"]),
             "risk_score": result["risk_score"],
-            "cache_hits": 1,
-            "last_access": time.time()
-        }
-        
-        # Clean cache periodically to prevent memory issues
-        if len(response_cache) > 10000:
-            clean_old_cache_entries()
+            "source": "full_analysis"
+        })
             
     except Exception as e:
         # Log error but don't affect user experience
         print(f"Background analysis error: {str(e)}")
+```
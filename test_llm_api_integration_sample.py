@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+"""
+test_llm_api_integration_sample.py - Tests of the code in llm_api_integration_sample.py
+
+The sample is a Markdown document. Its ```python blocks are executed in
+order into one namespace (other lines blanked, so tracebacks give line
+numbers of the document). The decision cache must stay within its entry,
+size and TTL bounds and run one computation per missed key, which survives
+the cancellation of the caller that started it. The pooled LLM client is
+run against a local stand-in for the chat-completions API: concurrent
+analyses of a fingerprint share one call over the pooled connections,
+every caller waits for the shared call no longer than its own deadline,
+and the batcher gives the verdicts of single-shot mode in fewer calls,
+within a deadline growing with the batch, and answers or fails every
+caller within its timeout.
+SimHash keys ignore volatile fields and timing noise, and the banded index
+finds every indexed hash within its distance. Workers sharing the tiered
+cache compute a key once, L2 writes are batched behind the callers and L2
+failures never fail a lookup, and the endpoint's near-duplicate lookups
+stay out of the L1 hit rate.
+
+Usage:
+    python test_llm_api_integration_sample.py
+"""
+import asyncio
+import atexit
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+
+from aiohttp import web
+from fastapi import BackgroundTasks
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_api_integration_sample.py")
+
+def sample_source():
+    """Python code of the sample, with the Markdown lines blanked"""
+    lines, in_code = [], False
+    with open(SAMPLE_FILE) as f:
+        for line in f.read().splitlines():
+            fence = line.startswith("```")
+            lines.append(line if in_code and not fence else "")
+            if fence:
+                in_code = line.strip() == "```python"
+    return "\n".join(lines)
+
+def load_sample(**names):
+    """
+    Fresh namespace of the sample code, with `names` defined first (stand-ins
+    for the helpers the document leaves to the application). The cache file
+    of the endpoint goes to a temporary directory.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="llm-sample-")
+    atexit.register(shutil.rmtree, tmp_dir, ignore_errors=True)
+    previous = os.environ.get("RISK_CACHE_PATH")
+    os.environ["RISK_CACHE_PATH"] = os.path.join(tmp_dir, "risk_cache.db")
+    try:
+        namespace = {"__name__": "llm_api_integration_sample", "API_KEY": "test-key", **names}
+        exec(compile(sample_source(), SAMPLE_FILE, "exec"), namespace)
+    finally:
+        if previous is None:
+            del os.environ["RISK_CACHE_PATH"]
+        else:
+            os.environ["RISK_CACHE_PATH"] = previous
+    return namespace
+
+def make_session(index, webdriver=True, family=None):
+    """
+    Session in the endpoint's format, with the fields the prompts show at the
+    top level too; sessions of one `family` share every feature
+    """
+    variant = index if family is None else family
+    user_agent = f"Mozilla/5.0 agent-{variant}"
+    return {
+        "session_id": f"s{index}",
+        "user_agent": user_agent,
+        "webdriver_detected": webdriver,
+        "mouse_entropy": variant / 100,
+        "client_data": {"user_agent": user_agent, "webdriver_detected": webdriver},
+        "user_behavior": {"mouse_entropy": variant / 100},
+        "request_information": {"path": f"/page/{variant}"}
+    }
+
+def mock_verdict(session_text):
+    """Deterministic verdict of the stand-in API for the details of one session"""
+    webdriver = "WebDriver Detected: True" in session_text
+    return {"is_bot": webdriver, "confidence": 87 if webdriver else 15,
+            "bot_type": "headless browser" if webdriver else "none",
+            "risk_level": "High" if webdriver else "Low",
+            "indicators": ["webdriver flag"] if webdriver else []}
+
+async def start_mock_llm_server(delay=0.05):
+    """
+    Local stand-in for the chat-completions API: answers every call after
+    `delay` seconds with the mock_verdict() of the session in the prompt, or
+    a JSON array of verdicts for a multi-session prompt. Returns the runner,
+    its base URL and the list of (client address, request body) it received.
+    """
+    received = []
+    
+    async def chat_completions(request):
+        body = await request.json()
+        received.append((request.transport.get_extra_info("peername"), body))
+        await asyncio.sleep(delay)
+        sections = re.split(r"\n    Session (\d+):\n", body["messages"][-1]["content"])
+        if len(sections) > 1:
+            verdicts = [{"session_index": int(index), **mock_verdict(text)}
+                        for index, text in zip(sections[1::2], sections[2::2])]
+            content = "Here is the analysis:\n" + json.dumps(verdicts)
+        else:
+            content = json.dumps(mock_verdict(sections[0]))
+        return web.json_response({"created": time.time(), "choices": [{"message": {"content": content}}]})
+    
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}", received
+
+def test_decision_cache_bounds():
+    sample = load_sample()
+    now = [0.0]
+    cache = sample["DecisionCache"](max_entries=3, ttl=10.0, clock=lambda: now[0])
+    for key in "abc":
+        cache.set(key, {"action": key})
+    
+    # A hit makes "a" the most recently used entry, so "b" is evicted first
+    assert cache.get("a") == {"action": "a"}
+    cache.set("d", {"action": "d"})
+    assert cache.get("b") is None and cache.get("c") == {"action": "c"}
+    
+    # Expired entries are misses, dropped when read
+    cache.set("short", {"action": "e"}, ttl=1.0)
+    now[0] = 2.0
+    assert cache.get("short") is None and "short" not in cache._entries
+    now[0] = 11.0
+    assert cache.get("d") is None and "d" not in cache._entries
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (2, 3, 2, 2), stats
+    
+    # The size bound evicts too, and an entry larger than the whole cache is not stored
+    small = sample["DecisionCache"](max_bytes=200)
+    small.set("x", {"reason": "x" * 150})
+    small.set("y", {"reason": "y" * 150})
+    assert list(small._entries) == ["y"] and small.size_bytes <= 200
+    small.set("z", {"reason": "z" * 500})
+    assert small.get("z") is None and small.stats()["entries"] == 1
+
+def test_decision_cache_coalescing():
+    sample = load_sample()
+    
+    async def run():
+        cache = sample["DecisionCache"]()
+        calls = []
+        
+        async def compute(cacheable=True):
+            calls.append(cacheable)
+            await asyncio.sleep(0.05)
+            return {"action": "block"}, cacheable
+        
+        results = await asyncio.gather(*[cache.get_or_compute("k", compute) for _ in range(5)])
+        assert [origin for _, origin in results] == ["computed"] + ["coalesced"] * 4
+        assert await cache.get_or_compute("k", compute) == ({"action": "block"}, "cache")
+        assert len(calls) == 1 and not cache._inflight
+        
+        # Cancelling the caller that started the computation does not cancel it for the others
+        leader = asyncio.ensure_future(cache.get_or_compute("l", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.get_or_compute("l", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == ({"action": "block"}, "coalesced")
+        assert cache.get("l") == {"action": "block"} and not cache._inflight
+        
+        # Uncacheable results are returned but not stored; failures reach every caller
+        await cache.get_or_compute("u", lambda: compute(False))
+        assert cache.get("u") is None
+        
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("analysis failed")
+        
+        results = await asyncio.gather(cache.get_or_compute("f", fail), cache.get_or_compute("f", fail),
+                                       return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results) and not cache._inflight
+    
+    asyncio.run(run())
+
+def test_client_single_flight():
+    sample = load_sample()
+    
+    async def run():
+        runner, base_url, received = await start_mock_llm_server()
+        try:
+            async with sample["AsyncLLMClient"](base_url=base_url, max_concurrency=4, pool_size=4,
+                                                timeout=1.0) as client:
+                sessions = [make_session(i, family=i % 10) for i in range(50)]
+                results = await asyncio.gather(*[sample["analyze_session_with_ai_async"](s, client)
+                                                 for s in sessions])
+                assert all(r["is_bot"] and r["risk_level"] == "High" for r in results)
+                
+                # One call per distinct fingerprint, over at most pool_size kept-alive connections
+                assert len(received) == len({sample["generate_session_fingerprint"](s) for s in sessions}) == 10
+                assert len({peer for peer, _ in received}) <= 4
+                assert client.stats["shared"] == 40 and not client._inflight
+        finally:
+            await runner.cleanup()
+    
+    asyncio.run(run())
+
+def test_client_deadlines():
+    sample = load_sample()
+    
+    async def run():
+        runner, base_url, _ = await start_mock_llm_server(delay=0.3)
+        try:
+            async with sample["AsyncLLMClient"](base_url=base_url, timeout=1.0) as client:
+                # A deadline shorter than the API latency gives the fallback verdict
+                timed_out = await sample["analyze_session_with_ai_async"](make_session(0), client, timeout=0.05)
+                assert timed_out["error"] and client.stats["timeouts"] == 1
+                
+                # The first caller timing out does not cut the shared call short for the others
+                short = asyncio.ensure_future(client.analyze_session(make_session(1), timeout=0.1))
+                await asyncio.sleep(0)
+                long = asyncio.ensure_future(client.analyze_session(make_session(1), timeout=1.0))
+                try:
+                    await short
+                    raise AssertionError("the short deadline did not expire")
+                except asyncio.TimeoutError:
+                    pass
+                assert sample["parse_ai_response"](await long)["is_bot"]
+                assert client.stats["shared"] == 1
+                
+                # Once every caller has given up, the call is cancelled and the next caller starts anew
+                requests = client.stats["requests"]
+                try:
+                    await client.analyze_session(make_session(2), timeout=0.05)
+                except asyncio.TimeoutError:
+                    pass
+                assert not client._inflight
+                await client.analyze_session(make_session(2), timeout=1.0)
+                assert client.stats["requests"] == requests + 2 and client.stats["shared"] == 1
+        finally:
+            await runner.cleanup()
+    
+    asyncio.run(run())
+
+def test_split_batch_response():
+    sample = load_sample()
+    verdicts = [{"session_index": 2, "is_bot": True, "confidence": 90}, "not a verdict",
+                {"session_index": 0, "is_bot": False, "confidence": 20},
+                {"session_index": 0, "is_bot": True, "confidence": 99}, {"session_index": 7, "is_bot": True}]
+    response = {"created": time.time(),
+                "choices": [{"message": {"content": "Verdicts:\n" + json.dumps(verdicts) + "\nDone."}}]}
+    results = sample["split_batch_response"](response, 3)
+    
+    # Out-of-range, repeated and non-object entries are ignored; unanswered sessions are None
+    assert [result and (result["is_bot"], result["confidence"]) for result in results] == [(False, 0.2), None, (True, 0.9)]
+    assert sample["split_batch_response"]({"choices": []}, 2) == [None, None]
+    assert sample["split_batch_response"]({"choices": [{"message": {"content": "no JSON"}}]}, 1) == [None]
+
+def test_batcher_matches_single_shot():
+    sample = load_sample()
+    
+    def strip(result):
+        return {k: v for k, v in result.items() if k != "ai_processing_time"}
+    
+    async def run():
+        runner, base_url, received = await start_mock_llm_server()
+        try:
+            async with sample["AsyncLLMClient"](base_url=base_url, timeout=1.0) as client:
+                sessions = [make_session(i, webdriver=i % 3 == 0) for i in range(40)]
+                single = await asyncio.gather(*[sample["analyze_session_with_ai_async"](s, client) for s in sessions])
+                calls = len(received)
+                
+                # Same per-session verdicts in 3 calls (16 + 16 + 8 sessions) instead of 40
+                batcher = sample["SessionAnalysisBatcher"](client, max_batch=16, max_wait=0.2)
+                batched = await asyncio.gather(*[batcher.analyze(s) for s in sessions])
+                assert [strip(r) for r in batched] == [strip(r) for r in single]
+                assert len(received) - calls == 3 and batcher.stats["single_shot_retries"] == 0
+                
+                # Sessions with one fingerprint are analyzed once; sessions the answer leaves out are retried alone
+                answer = client.chat_completion
+                
+                async def drop_first_verdict(messages, **params):
+                    response = await answer(messages, **params)
+                    content = response["choices"][0]["message"]["content"]
+                    verdicts = json.loads(content[content.index("["):])
+                    response["choices"][0]["message"]["content"] = json.dumps(verdicts[1:])
+                    return response
+                
+                client.chat_completion = drop_first_verdict
+                calls = len(received)
+                twins = [make_session(100 + i, family=7) for i in range(3)]
+                batched = await asyncio.gather(*[batcher.analyze(s) for s in
+                                                 twins + [make_session(200), make_session(201, webdriver=False)]])
+                assert [strip(r) for r in batched] == [strip(r) for r in single[:1] * 4 + single[1:2]]
+                assert batcher.stats["batched_sessions"] == 40 + 3 and batcher.stats["single_shot_retries"] == 1
+                assert len(received) - calls == 2
+        finally:
+            await runner.cleanup()
+    
+    asyncio.run(run())
+
+def test_batcher_deadlines_and_failures():
+    sample = load_sample()
+    
+    async def run():
+        runner, base_url, received = await start_mock_llm_server(delay=0.3)
+        try:
+            async with sample["AsyncLLMClient"](base_url=base_url, timeout=0.4) as client:
+                # A batch slower than the client's timeout is still answered in one call
+                batcher = sample["SessionAnalysisBatcher"](client, max_batch=4, max_wait=0.05,
+                                                           seconds_per_session=0.1)
+                assert abs(batcher.batch_timeout(4) - 0.8) < 1e-9
+                answer = client._post
+                
+                async def slow_batch(messages, **params):
+                    # Multi-session prompts take longer to answer
+                    await asyncio.sleep(0.2 if params.get("max_tokens", 0) > batcher.tokens_per_session else 0)
+                    return await answer(messages, **params)
+                
+                client._post = slow_batch
+                sessions = [make_session(i) for i in range(4)]
+                batched = await asyncio.gather(*[batcher.analyze(s) for s in sessions])
+                assert all(r["is_bot"] for r in batched)
+                assert len(received) == 1 and batcher.stats["single_shot_retries"] == 0
+                client._post = answer
+                
+                # A caller's timeout bounds its wait, through the batcher too
+                try:
+                    await batcher.analyze(make_session(10), timeout=0.1)
+                    raise AssertionError("the caller's timeout did not expire")
+                except asyncio.TimeoutError:
+                    pass
+                timed_out = await sample["analyze_session_with_ai_async"](make_session(11), client, timeout=0.1,
+                                                                          batcher=batcher)
+                assert timed_out["error"] and client.stats["timeouts"] == 1
+                
+                # Any failure of the batch call falls back to single-shot analysis
+                async def broken(messages, **params):
+                    raise ValueError("malformed answer")
+                
+                client.chat_completion = broken
+                batched = await asyncio.gather(*[batcher.analyze(s) for s in sessions[:2]])
+                assert all(r["is_bot"] for r in batched) and batcher.stats["single_shot_retries"] == 2
+                
+                # A failure after that reaches every caller instead of leaving it waiting
+                async def failing_retry(session_data, llm_client, *args, **kwargs):
+                    raise RuntimeError("retry failed")
+                
+                sample["analyze_session_with_ai_async"] = failing_retry
+                results = await asyncio.gather(*[batcher.analyze(s, timeout=5.0) for s in sessions[:3]],
+                                               return_exceptions=True)
+                assert all(isinstance(result, RuntimeError) for result in results)
+                assert not batcher._pending
+        finally:
+            await runner.cleanup()
+    
+    asyncio.run(run())
+
+def test_similarity_keys():
+    sample = load_sample()
+    corpus = sample["make_replay_corpus"](bot_families=3, bots_per_family=10, humans=20)
+    
+    # Volatile fields do not change the features
+    session = corpus[0][0]
+    renamed = json.loads(json.dumps(session))
+    renamed["session_id"] = "other"
+    renamed["request_information"]["timestamp"] += 60
+    assert sample["session_features"](renamed) == sample["session_features"](session)
+    assert sample["generate_session_fingerprint"](renamed) == sample["generate_session_fingerprint"](session)
+    # The exact key is the fingerprint the replay and the LLM single-flight use; the SimHash only probes
+    assert sample["generate_cache_key"](renamed) == sample["generate_session_fingerprint"](session)
+    assert sample["session_simhash"](renamed) == sample["simhash"](sample["session_features"](session))
+    
+    # Members of a bot family, differing in timing noise, are closer on average than any two humans
+    families = {}
+    for session, group in corpus:
+        families.setdefault(group, []).append(sample["simhash"](sample["session_features"](session)))
+    distance = sample["hamming_distance"]
+    bots = [distance(a, b) for group, hashes in families.items() if group.startswith("bot-")
+            for a in hashes for b in hashes if a != b]
+    humans = [hashes[0] for group, hashes in families.items() if group.startswith("human-")]
+    assert sum(bots) / len(bots) < min(distance(a, b) for a in humans for b in humans if a != b)
+    
+    # No false matches at the endpoint's distance, and at least the exact-key hits
+    replay = sample["replay_similarity_cache"](corpus, max_distance=4, bands=8)
+    assert replay["false_match_rate"] == 0.0 and replay["similarity_hit_rate"] >= replay["exact_hit_rate"] > 0
+
+def test_simhash_index():
+    sample = load_sample()
+    SimHashIndex = sample["SimHashIndex"]
+    for max_distance, bands in ((4, 4), (3, 5)):
+        try:
+            SimHashIndex(max_distance=max_distance, bands=bands)
+            raise AssertionError(f"bands={bands} accepted for max_distance={max_distance}")
+        except ValueError:
+            pass
+    
+    # Banding is exact: every hash within max_distance bits of an indexed one is found
+    rng = random.Random(5)
+    index = SimHashIndex(max_distance=4, bands=8)
+    values = [rng.getrandbits(64) for _ in range(200)]
+    for value in values:
+        index.add(value)
+    for value in values:
+        flipped = value
+        for bit in rng.sample(range(64), rng.randint(1, 4)):
+            flipped ^= 1 << bit
+        assert index.nearest(flipped) == (value, sample["hamming_distance"](value, flipped))
+        assert index.nearest(value) == (value, 0)
+    far = values[0] ^ sum(1 << bit for bit in range(0, 64, 8))
+    assert index.nearest(far) is None and index.nearest(values[0] ^ 0b111, max_distance=2) is None
+    
+    # Removed and least recently added hashes are no longer found
+    index.remove(values[0])
+    assert index.nearest(values[0]) is None
+    small = SimHashIndex(max_entries=2)
+    for value in values[:3]:
+        small.add(value)
+    assert small.nearest(values[0]) is None and small.nearest(values[2]) == (values[2], 0)
+    # Buckets emptied by removals are dropped
+    assert all(all(bucket.values()) for bucket in small._buckets)
+    assert sum(len(bucket) for bucket in small._buckets) <= 2 * small.bands
+
+class RecordingBackend:
+    """In-memory L2 recording its write batches, failing while `failing` is set"""
+    def __init__(self):
+        self.data = {}
+        self.batches = []
+        self.failing = False
+    
+    def get(self, key):
+        if self.failing:
+            raise OSError("backend down")
+        return self.data.get(key)
+    
+    def set_many(self, items):
+        if self.failing:
+            raise OSError("backend down")
+        self.batches.append([key for key, _, _ in items])
+        self.data.update((key, data) for key, data, _ in items)
+    
+    def close(self):
+        pass
+
+def test_tiered_cache_across_workers():
+    sample = load_sample()
+    
+    def analysis(result, calls):
+        async def compute():
+            calls.append(result)
+            return result, True
+        return compute
+    
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "analysis_cache.db")
+            workers = [sample["TieredCache"](sample["DecisionCache"](), sample["SQLiteBackend"](path), negative_ttl=0.2)
+                       for _ in range(2)]
+            calls = []
+            try:
+                verdict = {"is_bot": True, "confidence": 0.9, "indicators": ["webdriver"]}
+                assert await workers[0].get_or_compute("ai_analysis:a", analysis(verdict, calls)) == (verdict, "computed")
+                await asyncio.sleep(workers[0].flush_interval * 4)
+                assert await workers[1].get_or_compute("ai_analysis:a", analysis(verdict, calls)) == (verdict, "shared")
+                assert await workers[1].get_or_compute("ai_analysis:a", analysis(verdict, calls)) == (verdict, "cache")
+                
+                # Failed analyses are cached for negative_ttl only
+                failure = {"is_bot": False, "confidence": 0, "error": True}
+                await workers[0].get_or_compute("ai_analysis:b", analysis(failure, calls))
+                assert (await workers[0].get_or_compute("ai_analysis:b", analysis(failure, calls)))[1] == "cache"
+                await asyncio.sleep(0.3)
+                assert (await workers[0].get_or_compute("ai_analysis:b", analysis(failure, calls)))[1] == "computed"
+                assert len(calls) == 3, calls
+                assert workers[0].stats()["negative"] == 2 and workers[1].stats()["l2_hits"] == 1
+            finally:
+                for worker in workers:
+                    await worker.close()
+    
+    asyncio.run(run())
+
+def test_tiered_cache_write_behind():
+    sample = load_sample()
+    TieredCache, DecisionCache = sample["TieredCache"], sample["DecisionCache"]
+    
+    async def run():
+        backend = RecordingBackend()
+        cache = TieredCache(DecisionCache(), backend, flush_interval=0.01, batch_size=2, max_pending=3)
+        
+        # Writes are batched; a newer write replaces a pending one, and writes past max_pending are dropped
+        for key, version in (("a", 1), ("b", 1), ("c", 1), ("a", 2), ("d", 1)):
+            cache.set(key, {"action": "block", "version": version})
+        assert cache.stats()["pending_writes"] == 3 and cache.counters["dropped_writes"] == 1
+        await asyncio.sleep(0.05)
+        assert backend.batches == [["b", "c"], ["a"]] and cache.counters["l2_writes"] == 3
+        assert sample["unpack_entry"](backend.data["a"])[0] == {"action": "block", "version": 2}
+        
+        # Another worker reads L2 into its L1; expired L2 entries are misses
+        other = TieredCache(DecisionCache(), backend)
+        assert await other.get("a") == {"action": "block", "version": 2}
+        assert other.peek_local("a") == {"action": "block", "version": 2}
+        backend.data["old"] = sample["pack_entry"]({"action": "allow"}, time.time() - 1)
+        assert await other.get("old") is None and other.peek_local("old") is None
+        assert (other.counters["l2_hits"], other.counters["l2_misses"]) == (1, 1)
+        
+        # A failing L2 counts errors and dropped writes, and the value is still computed and served
+        backend.failing = True
+        
+        async def compute():
+            return {"action": "allow"}, True
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert await other.get_or_compute("x", compute) == ({"action": "allow"}, "computed")
+            await other.close()
+        assert other.counters["l2_errors"] == 1 and other.counters["dropped_writes"] == 1
+        assert await other.get_or_compute("x", compute) == ({"action": "allow"}, "cache")
+        backend.failing = False
+        await cache.close()
+        
+        # Entries round-trip through the L2 encoding, and unknown formats are rejected
+        value = {"action": "block", "indicators": ["webdriver"], "risk_score": 0.95}
+        assert sample["unpack_entry"](sample["pack_entry"](value, 123.5)) == (value, 123.5)
+        try:
+            sample["unpack_entry"](b"x{}")
+            raise AssertionError("unknown entry format accepted")
+        except ValueError:
+            pass
+    
+    asyncio.run(run())
+
+def test_neighbour_decisions():
+    sample = load_sample(
+        quick_olap_check=lambda session: {"is_obvious": True,
+                                          "is_threat": session["client_data"]["webdriver_detected"]},
+        preliminary_risk_assessment=lambda session: {"risk_score": 0.5, "confidence": 0.3},
+        determine_action=lambda risk_score: "block" if risk_score > 0.7 else "allow")
+    corpus = sample["make_replay_corpus"](bot_families=3, bots_per_family=20, humans=0)
+    
+    async def run():
+        cache = sample["response_cache"]
+        try:
+            sources = []
+            for session, _ in corpus:
+                response = await sample["analyze_session"](sample["SessionData"](**session), BackgroundTasks())
+                sources.append(response["source"])
+            stats = await sample["cache_stats"]()
+            
+            # Neighbour decisions are served from L1 without counting as its lookups
+            served = stats["similarity"]["served"]
+            assert served > 0 and sources.count("cache") >= served
+            assert stats["hits"] + stats["misses"] == len(corpus) - served, stats
+            
+            # A session's own entry is not its neighbour: exact repeats are cache lookups
+            index = sample["similar_sessions"]
+            value = next(value for value in index._entries if cache.peek_local(index.key(value)))
+            key = index.key(value)
+            assert len(key) == 40 and sample["neighbour_decision"](key, value) is None
+            
+            # A neighbour whose decision left L1 is dropped from the index
+            assert sample["neighbour_decision"]("other", value ^ 1) is not None
+            cache.l1._remove(key)
+            assert sample["neighbour_decision"]("other", value ^ 1) is None
+            assert value not in index._entries
+            stats = await sample["cache_stats"]()
+            assert stats["similarity"]["stale"] == 1 and stats["similarity"]["served"] == served + 1
+            assert stats["hits"] + stats["misses"] == len(corpus) - served
+        finally:
+            await cache.close()
+    
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_decision_cache_bounds()
+    test_decision_cache_coalescing()
+    test_client_single_flight()
+    test_client_deadlines()
+    test_split_batch_response()
+    test_batcher_matches_single_shot()
+    test_batcher_deadlines_and_failures()
+    test_similarity_keys()
+    test_simhash_index()
+    test_tiered_cache_across_workers()
+    test_tiered_cache_write_behind()
+    test_neighbour_decisions()